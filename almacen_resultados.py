@@ -0,0 +1,290 @@
+# Description: Almacén SQLite de los valores extraídos (cliente, formulario, periodo, código) para consultar sin volver a leer PDFs
+import os
+import time
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+from extraccion_paralela import ResultadoExtraccion, agrupar_resultados, generar_trabajos, extraer_en_paralelo
+from deduplicacion import DatosDeclaracion, datos_declaracion
+from instrumentacion import medido
+
+version_esquema = 2
+
+esquema = """
+CREATE TABLE IF NOT EXISTS valores (
+    cliente     TEXT NOT NULL,
+    formulario  TEXT NOT NULL,
+    anio        INTEGER,
+    mes         INTEGER NOT NULL,
+    periodo     TEXT NOT NULL,       -- 'AAAA-MM' ('0000-MM' si no se conoce el año)
+    seccion     TEXT NOT NULL,       -- casillero | retenciones | compras
+    codigo      TEXT NOT NULL,
+    base        REAL,
+    valor       REAL,
+    texto       TEXT,                -- valor original cuando no se pudo convertir a número
+    ruta_pdf    TEXT NOT NULL,
+    pagina      INTEGER,             -- página de la que salió el valor (1 = primera; NULL si no se leyó del PDF)
+    extraido_en REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS valores_cliente_periodo_codigo ON valores (cliente, periodo, codigo);
+CREATE INDEX IF NOT EXISTS valores_ruta ON valores (ruta_pdf, formulario);
+
+-- Datos de la declaración de cada PDF, para elegir entre versiones del mismo mes sin volver a leerlo
+CREATE TABLE IF NOT EXISTS declaraciones (
+    ruta_pdf    TEXT NOT NULL,
+    formulario  TEXT NOT NULL,
+    ruc         TEXT,
+    tipo        TEXT,
+    serial      TEXT,
+    sustituye   TEXT,
+    fecha       TEXT,                -- ISO 8601
+    PRIMARY KEY (ruta_pdf, formulario)
+);
+"""
+
+# Columnas de compras del talón del ATS, en el orden en que las devuelve extraer_totales_compras
+codigos_compras = ["total_0", "total_12", "total_no_iva"]
+
+
+# Función para armar el periodo 'AAAA-MM' de un resultado
+def periodo_de(anio, mes):
+    return f"{anio or 0:04d}-{mes:02d}"
+
+
+# Función para convertir un valor extraído en (valor numérico, texto original)
+def separar_valor(valor):
+    if isinstance(valor, (int, float)):
+        return float(valor), None
+    return None, str(valor)
+
+
+# Función para aplanar un resultado de extracción en filas de la tabla `valores`
+# La página sale de `resultado.paginas`; queda NULL si el extractor no la da (XML, códigos no encontrados)
+def filas_de_resultado(resultado, extraido_en):
+    comunes = (resultado.cliente, resultado.formulario, resultado.anio, resultado.mes,
+               periodo_de(resultado.anio, resultado.mes))
+    ruta_pdf = os.path.abspath(resultado.ruta_pdf)
+    paginas = resultado.paginas or {}
+    filas = []
+    if resultado.formulario == "ats":
+        paginas_retenciones = paginas.get("retenciones", {})
+        for codigo, base in resultado.datos.get("retenciones", {}).items():
+            filas.append(comunes + ("retenciones", codigo, base, None, None, ruta_pdf,
+                                    paginas_retenciones.get(codigo), extraido_en))
+        for codigo, valor in zip(codigos_compras, resultado.datos.get("compras", [])):
+            filas.append(comunes + ("compras", codigo, None, valor, None, ruta_pdf,
+                                    paginas.get("compras"), extraido_en))
+    else:
+        for codigo, valor in resultado.datos.items():
+            numero, texto = separar_valor(valor)
+            filas.append(comunes + ("casillero", codigo, None, numero, texto, ruta_pdf,
+                                    paginas.get(codigo), extraido_en))
+    return filas
+
+
+# Función para la fila de la tabla `declaraciones` de un resultado
+# Si el resultado no trae la declaración (p. ej. del manifiesto incremental) se lee ahora, no al renderizar
+def fila_de_declaracion(resultado):
+    declaracion = resultado.declaracion or datos_declaracion(resultado.ruta_pdf)
+    fecha = declaracion.fecha.isoformat() if declaracion.fecha else None
+    return (os.path.abspath(resultado.ruta_pdf), resultado.formulario, declaracion.ruc, declaracion.tipo,
+            declaracion.serial, declaracion.sustituye, fecha)
+
+
+# Almacén de resultados sobre un archivo SQLite
+class AlmacenResultados:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.executescript(esquema)
+        self.conexion.execute(f"PRAGMA user_version={version_esquema}")
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    # Guardar los resultados en una sola transacción; las filas anteriores del mismo PDF se reemplazan
+    @medido("almacen_guardar")
+    def guardar_resultados(self, resultados):
+        extraido_en = time.time()
+        validos = [resultado for resultado in resultados if not resultado.error and resultado.datos is not None]
+        filas = [fila for resultado in validos for fila in filas_de_resultado(resultado, extraido_en)]
+        declaraciones = [fila_de_declaracion(resultado) for resultado in validos]
+        with self.conexion:
+            self.conexion.executemany(
+                "DELETE FROM valores WHERE ruta_pdf = ? AND formulario = ?",
+                [(os.path.abspath(resultado.ruta_pdf), resultado.formulario) for resultado in validos],
+            )
+            self.conexion.executemany(
+                "INSERT INTO valores (cliente, formulario, anio, mes, periodo, seccion, codigo, base, valor, texto, "
+                "ruta_pdf, pagina, extraido_en) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                filas,
+            )
+            self.conexion.executemany(
+                "INSERT OR REPLACE INTO declaraciones (ruta_pdf, formulario, ruc, tipo, serial, sustituye, fecha) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                declaraciones,
+            )
+        logging.info(f"{len(filas)} valores de {len(validos)} PDFs guardados en '{self.ruta}'.")
+        return len(filas)
+
+    # Consulta general; devuelve filas como diccionarios
+    def consultar(self, cliente=None, formulario=None, codigo=None, desde=None, hasta=None):
+        condiciones, parametros = [], []
+        for columna, valor in (("cliente", cliente), ("formulario", formulario), ("codigo", codigo)):
+            if valor is not None:
+                condiciones.append(f"{columna} = ?")
+                parametros.append(valor)
+        if desde:
+            condiciones.append("periodo >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("periodo <= ?")
+            parametros.append(hasta)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        cursor = self.conexion.execute(
+            f"SELECT * FROM valores {donde} ORDER BY cliente, periodo, formulario, codigo", parametros
+        )
+        columnas = [descripcion[0] for descripcion in cursor.description]
+        return [dict(zip(columnas, fila)) for fila in cursor]
+
+    # Reconstruir los resultados de extracción de un cliente y año (mismas formas que devuelven los extractores)
+    # Cada resultado lleva la declaración guardada, así elegir la versión del mes no vuelve a abrir los PDFs
+    @medido("almacen_leer")
+    def resultados(self, cliente, anio=None):
+        condicion = "cliente = ?" + (" AND (anio = ? OR anio IS NULL)" if anio else "")
+        parametros = [cliente] + ([anio] if anio else [])
+        cursor = self.conexion.execute(
+            f"SELECT formulario, anio, mes, seccion, codigo, base, valor, texto, ruta_pdf, pagina FROM valores "
+            f"WHERE {condicion} ORDER BY rowid", parametros
+        )
+
+        por_pdf = {}
+        paginas_por_pdf = {}
+        for formulario, anio_pdf, mes, seccion, codigo, base, valor, texto, ruta_pdf, pagina in cursor:
+            clave = (formulario, anio_pdf, mes, ruta_pdf)
+            if formulario == "ats":
+                datos = por_pdf.setdefault(clave, {"retenciones": {}, "compras": {}})
+                paginas = paginas_por_pdf.setdefault(clave, {"retenciones": {}, "compras": None})
+                if seccion == "retenciones":
+                    datos["retenciones"][codigo] = base
+                    paginas["retenciones"][codigo] = pagina
+                else:
+                    datos["compras"][codigo] = valor
+                    paginas["compras"] = pagina
+            else:
+                por_pdf.setdefault(clave, {})[codigo] = valor if texto is None else texto
+                paginas_por_pdf.setdefault(clave, {})[codigo] = pagina
+
+        declaraciones = self.declaraciones(cliente)
+        sin_declaracion = DatosDeclaracion(None, None, None, None, None)
+        faltantes = 0
+        resultados = []
+        for (formulario, anio_pdf, mes, ruta_pdf), datos in por_pdf.items():
+            if formulario == "ats":
+                compras = datos["compras"]
+                datos["compras"] = [compras[codigo] for codigo in codigos_compras if codigo in compras]
+            declaracion = declaraciones.get((ruta_pdf, formulario))
+            if declaracion is None:
+                faltantes += 1
+                declaracion = sin_declaracion
+            resultados.append(ResultadoExtraccion(
+                cliente, formulario, anio_pdf, mes, ruta_pdf, datos, None, declaracion=declaracion,
+                paginas=paginas_por_pdf[(formulario, anio_pdf, mes, ruta_pdf)],
+            ))
+        if faltantes:
+            logging.warning(
+                f"{faltantes} PDFs de '{cliente}' no tienen los datos de la declaración en el almacén (guardados "
+                f"antes de la versión {version_esquema} del esquema); la versión de cada mes se elige por el nombre "
+                f"del archivo. Vuelva a cargarlos para elegirla como en la extracción."
+            )
+        return resultados
+
+    # Datos de la declaración guardados de los PDFs de un cliente: {(ruta_pdf, formulario): DatosDeclaracion}
+    def declaraciones(self, cliente):
+        cursor = self.conexion.execute(
+            "SELECT ruta_pdf, formulario, ruc, tipo, serial, sustituye, fecha FROM declaraciones "
+            "WHERE ruta_pdf IN (SELECT ruta_pdf FROM valores WHERE cliente = ?)", [cliente]
+        )
+        return {
+            (ruta_pdf, formulario): DatosDeclaracion(
+                ruc, tipo, serial, sustituye, datetime.fromisoformat(fecha) if fecha else None
+            )
+            for ruta_pdf, formulario, ruc, tipo, serial, sustituye, fecha in cursor
+        }
+
+    # Datos de un cliente como {formulario: {mes: datos}}, listos para aplicar el diseño de la plantilla
+    def datos_cliente(self, cliente, anio=None):
+        return agrupar_resultados(self.resultados(cliente, anio)).get(cliente, {})
+
+
+# Función para extraer los PDFs de un directorio y guardarlos en el almacén
+def cargar(ruta_almacen, directorio, clientes=None, max_workers=None):
+    resultados = extraer_en_paralelo(generar_trabajos(directorio, clientes=clientes), max_workers=max_workers)
+    with AlmacenResultados(ruta_almacen) as almacen:
+        return almacen.guardar_resultados(resultados)
+
+
+# Función para generar el libro de Excel de un cliente solo a partir del almacén (sin leer PDFs)
+def renderizar(ruta_almacen, cliente, ruta_salida, anio=None, ruta_plantilla="./pdf/plantilla_1.xlsx"):
+    from escritor_excel import SesionLibro
+    from diseno_plantilla import plan_de_plantilla, aplicar_diseno
+
+    with AlmacenResultados(ruta_almacen) as almacen:
+        datos = almacen.datos_cliente(cliente, anio)
+    if not datos:
+        logging.warning(f"No hay datos de '{cliente}' en el almacén '{ruta_almacen}'.")
+        return False
+    sesion = SesionLibro(ruta_plantilla, ruta_salida)
+    aplicar_diseno(plan_de_plantilla(ruta_plantilla), datos, sesion)
+    return sesion.guardar()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Almacén SQLite de los valores extraídos de los PDFs.")
+    parser.add_argument("--almacen", default=os.environ.get("ALMACEN_RESULTADOS", "resultados.sqlite"))
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_cargar = subparsers.add_parser("cargar", help="Extraer los PDFs de un directorio y guardarlos")
+    parser_cargar.add_argument("directorio")
+    parser_cargar.add_argument("--cliente", action="append", dest="clientes")
+    parser_cargar.add_argument("--workers", type=int)
+
+    parser_renderizar = subparsers.add_parser("renderizar", help="Escribir el libro de un cliente desde el almacén")
+    parser_renderizar.add_argument("cliente")
+    parser_renderizar.add_argument("salida")
+    parser_renderizar.add_argument("--anio", type=int)
+    parser_renderizar.add_argument("--plantilla", default="./pdf/plantilla_1.xlsx")
+
+    parser_consultar = subparsers.add_parser("consultar", help="Mostrar valores guardados")
+    parser_consultar.add_argument("--cliente")
+    parser_consultar.add_argument("--formulario")
+    parser_consultar.add_argument("--codigo")
+    parser_consultar.add_argument("--desde", help="Periodo inicial AAAA-MM")
+    parser_consultar.add_argument("--hasta", help="Periodo final AAAA-MM")
+
+    argumentos = parser.parse_args()
+    if argumentos.comando == "cargar":
+        cargar(argumentos.almacen, argumentos.directorio, argumentos.clientes, argumentos.workers)
+    elif argumentos.comando == "renderizar":
+        renderizar(argumentos.almacen, argumentos.cliente, argumentos.salida, argumentos.anio, argumentos.plantilla)
+    else:
+        with AlmacenResultados(argumentos.almacen) as almacen:
+            for fila in almacen.consultar(argumentos.cliente, argumentos.formulario, argumentos.codigo,
+                                          argumentos.desde, argumentos.hasta):
+                print(f"{fila['cliente']}\t{fila['periodo']}\t{fila['formulario']}\t{fila['codigo']}\t"
+                      f"{fila['base'] if fila['valor'] is None else fila['valor']}\t{os.path.basename(fila['ruta_pdf'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+# Description: Benchmark por etapas sobre los PDFs de ejemplo del repositorio (103, 104, ATS y conciliaciones)
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import glob
+import re
+
+import pdfplumber
+
+from cache_pdf import cache_documentos
+from lector_pdf_rapido import palabras_rapidas
+from descubrimiento import descubrir_clientes
+import indice_formulario
+from extractores import (
+    indices_a_buscar_103, indices_a_buscar_104, extraer_valores_indices, extraer_ats,
+    encabezado_retenciones, encabezado_compras,
+)
+from tokenizador_sri import retenciones_de_texto, totales_de_texto
+from extraccion_paralela import ResultadoExtraccion, agrupar_resultados
+
+version_benchmark = 1
+directorios_por_defecto = ["./impuestos", "./pdf"]
+formularios_benchmark = ["103", "104", "ats", "conciliacion"]
+etapas = ["abrir_pdf", "extract_words", "palabras_rapidas", "extract_text", "buscar_codigos", "regex_secciones", "preparar_celdas", "guardar_libro"]
+indices_por_formulario = {"103": indices_a_buscar_103, "104": indices_a_buscar_104}
+
+
+# Función para obtener el pico de memoria residente del proceso en MB
+def rss_maximo_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # En macOS ru_maxrss viene en bytes; en Linux en KB
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# Función para medir una llamada `repeticiones` veces y quedarse con el mejor tiempo (menos ruido)
+def medir(funcion, repeticiones=1):
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor, resultado
+
+
+# Función para cargar en la caché compartida lo ya extraído, así las etapas siguientes miden solo su propio trabajo
+def precargar_cache(ruta_pdf, palabras, textos):
+    _, entrada = cache_documentos.entrada(ruta_pdf)
+    entrada["palabras"] = dict(enumerate(palabras))
+    entrada["texto"] = dict(enumerate(textos))
+    entrada["num_paginas"] = len(textos)
+    entrada.pop("secciones", None)
+    indice_formulario.indices_por_documento.clear()
+
+
+# Función para medir todas las etapas de extracción de un PDF
+def medir_pdf(registro, repeticiones=1):
+    ruta_pdf = registro.ruta_pdf
+    tiempos = {}
+
+    def abrir():
+        with pdfplumber.open(ruta_pdf) as pdf:
+            return len(pdf.pages)
+    tiempos["abrir_pdf"], num_paginas = medir(abrir, repeticiones)
+
+    def palabras():
+        with pdfplumber.open(ruta_pdf) as pdf:
+            return [pagina.extract_words() for pagina in pdf.pages]
+    tiempos["extract_words"], paginas_palabras = medir(palabras, repeticiones)
+
+    # Lectura directa con pdfminer; incluye abrir el archivo, que es parte de su costo
+    tiempos["palabras_rapidas"], _ = medir(lambda: palabras_rapidas(ruta_pdf), repeticiones)
+
+    def textos():
+        with pdfplumber.open(ruta_pdf) as pdf:
+            return [pagina.extract_text() or "" for pagina in pdf.pages]
+    tiempos["extract_text"], paginas_texto = medir(textos, repeticiones)
+    # extract_words/extract_text incluyen la apertura; se descuenta para aislar cada etapa
+    tiempos["extract_words"] = max(tiempos["extract_words"] - tiempos["abrir_pdf"], 0.0)
+    tiempos["extract_text"] = max(tiempos["extract_text"] - tiempos["abrir_pdf"], 0.0)
+
+    datos = None
+    if registro.formulario in indices_por_formulario:
+        indices = indices_por_formulario[registro.formulario]
+
+        def buscar():
+            precargar_cache(ruta_pdf, paginas_palabras, paginas_texto)
+            return extraer_valores_indices(ruta_pdf, indices)
+        tiempos["buscar_codigos"], datos = medir(buscar, repeticiones)
+    elif registro.formulario == "ats":
+        def regex_ats():
+            precargar_cache(ruta_pdf, paginas_palabras, paginas_texto)
+            return extraer_ats(ruta_pdf)
+        tiempos["regex_secciones"], datos = medir(regex_ats, repeticiones)
+    elif registro.formulario == "conciliacion":
+        from conciliacion_bancaria import extraer_movimientos
+
+        def regex_conciliacion():
+            precargar_cache(ruta_pdf, paginas_palabras, paginas_texto)
+            return extraer_movimientos(ruta_pdf)
+        tiempos["regex_secciones"], _ = medir(regex_conciliacion, repeticiones)
+
+    palabras_total = sum(len(pagina) for pagina in paginas_palabras)
+    return {
+        "ruta": os.path.relpath(ruta_pdf),
+        "cliente": registro.cliente,
+        "formulario": registro.formulario,
+        "mes": registro.mes,
+        "paginas": num_paginas,
+        "palabras": palabras_total,
+        "bytes": os.path.getsize(ruta_pdf),
+        "etapas": {etapa: round(segundos, 6) for etapa, segundos in tiempos.items()},
+        "rss_mb": round(rss_maximo_mb(), 1),
+    }, datos
+
+
+# Función para medir la preparación de celdas y el guardado del libro con los datos extraídos de un cliente
+def medir_escritura(datos_cliente, ruta_plantilla):
+    import logging
+    from escritor_excel import SesionLibro
+    from diseno_plantilla import plan_de_plantilla, aplicar_diseno
+
+    planes = plan_de_plantilla(ruta_plantilla)
+    with tempfile.TemporaryDirectory() as directorio:
+        sesion = SesionLibro(ruta_plantilla, os.path.join(directorio, "benchmark.xlsx"))
+
+        def preparar():
+            # Los avisos por mes faltante no interesan aquí
+            nivel = logging.getLogger().level
+            logging.getLogger().setLevel(logging.ERROR)
+            try:
+                aplicar_diseno(planes, datos_cliente, sesion)
+            finally:
+                logging.getLogger().setLevel(nivel)
+            return sesion.total_celdas()
+
+        tiempo_preparar, celdas = medir(preparar)
+        tiempo_guardar, _ = medir(sesion.guardar)
+    return {"preparar_celdas": round(tiempo_preparar, 6), "guardar_libro": round(tiempo_guardar, 6), "celdas": celdas}
+
+
+# Función para resumir una lista de tiempos (total, media, p50, p95)
+def resumir_tiempos(tiempos):
+    if not tiempos:
+        return None
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))]
+    return {
+        "n": len(ordenados),
+        "total": round(sum(ordenados), 6),
+        "media": round(statistics.mean(ordenados), 6),
+        "p50": round(statistics.median(ordenados), 6),
+        "p95": round(p95, 6),
+    }
+
+
+# Función para ejecutar el benchmark completo y devolver el resultado como diccionario
+def ejecutar_benchmark(directorios, repeticiones=1, limite=None, ruta_plantilla="./pdf/plantilla_1.xlsx"):
+    # El benchmark mide las extracciones reales: sin caché en disco
+    cache_documentos.directorio = None
+    inicio_total = time.perf_counter()
+
+    inicio = time.perf_counter()
+    registros = list(descubrir_clientes(directorios, formularios=formularios_benchmark))
+    tiempo_descubrimiento = time.perf_counter() - inicio
+    if limite:
+        registros = registros[:limite]
+
+    archivos = []
+    resultados = []
+    for registro in registros:
+        archivo, datos = medir_pdf(registro, repeticiones)
+        archivos.append(archivo)
+        if datos is not None and registro.mes is not None:
+            resultados.append(ResultadoExtraccion(
+                registro.cliente, registro.formulario, registro.anio, registro.mes, registro.ruta_pdf, datos, None
+            ))
+        cache_documentos.limpiar()
+
+    escrituras = {}
+    for cliente, datos_cliente in agrupar_resultados(resultados).items():
+        escrituras[cliente] = medir_escritura(datos_cliente, ruta_plantilla)
+
+    resumen = {}
+    for etapa in etapas:
+        if etapa in ("preparar_celdas", "guardar_libro"):
+            tiempos = [escritura[etapa] for escritura in escrituras.values()]
+        else:
+            tiempos = [archivo["etapas"][etapa] for archivo in archivos if etapa in archivo["etapas"]]
+        resumen[etapa] = resumir_tiempos(tiempos)
+
+    paginas = sum(archivo["paginas"] for archivo in archivos)
+    tiempo_paginas = sum(
+        archivo["etapas"]["abrir_pdf"] + archivo["etapas"]["extract_words"] + archivo["etapas"]["extract_text"]
+        for archivo in archivos
+    )
+    return {
+        "version": version_benchmark,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pdfplumber": pdfplumber.__version__,
+        "plataforma": platform.platform(),
+        "repeticiones": repeticiones,
+        "directorios": directorios,
+        "archivos": archivos,
+        "escrituras": escrituras,
+        "descubrimiento": round(tiempo_descubrimiento, 6),
+        "etapas": resumen,
+        "paginas": paginas,
+        "paginas_por_segundo": round(paginas / tiempo_paginas, 2) if tiempo_paginas else None,
+        "tiempo_total": round(time.perf_counter() - inicio_total, 6),
+        "rss_max_mb": round(rss_maximo_mb(), 1),
+    }
+
+
+# Función para imprimir el resumen por etapa y los archivos más lentos
+def imprimir_reporte(resultado, mas_lentos=10):
+    print(f"{'etapa':<18}{'n':>5}{'total (s)':>12}{'media (ms)':>12}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for etapa, resumen in resultado["etapas"].items():
+        if resumen is None:
+            continue
+        print(f"{etapa:<18}{resumen['n']:>5}{resumen['total']:>12.3f}{resumen['media'] * 1000:>12.1f}"
+              f"{resumen['p50'] * 1000:>10.1f}{resumen['p95'] * 1000:>10.1f}")
+
+    print(f"\nDescubrimiento: {resultado['descubrimiento']:.3f} s")
+    print(f"Páginas: {resultado['paginas']}  ({resultado['paginas_por_segundo']} páginas/s en apertura + extracción)")
+    print(f"Tiempo total: {resultado['tiempo_total']:.3f} s  RSS máximo: {resultado['rss_max_mb']} MB")
+
+    lentos = sorted(resultado["archivos"], key=lambda archivo: sum(archivo["etapas"].values()), reverse=True)
+    print("\nArchivos más lentos:")
+    for archivo in lentos[:mas_lentos]:
+        detalle = "  ".join(f"{etapa}={segundos * 1000:.1f}ms" for etapa, segundos in archivo["etapas"].items())
+        print(f"  {archivo['ruta']} ({archivo['paginas']} pág.): {detalle}")
+
+
+# Expresiones regulares usadas antes del tokenizador, como referencia para el micro-benchmark
+patron_retencion_anterior = r"^(\d{3,4}[A-Z]?)\s+.*?\s+(\d[\d.,]*)\s+(\d[\d.,]*)$"
+patron_totales_anterior = r"(\d{1,3}(?:,\d{3})*(?:\.\d+)|\d+\.\d+)"
+
+
+def retenciones_con_regex(texto):
+    codigos = {}
+    if encabezado_retenciones in texto:
+        for linea in texto.split(encabezado_retenciones)[1].strip().split("\n"):
+            match = re.search(patron_retencion_anterior, linea)
+            if match:
+                codigos[match.group(1)] = float(match.group(2).replace(",", ""))
+    return codigos
+
+
+def compras_con_regex(texto):
+    if encabezado_compras in texto:
+        for linea in texto.split(encabezado_compras)[1].strip().split("\n"):
+            if "TOTAL:" in linea:
+                numeros = re.findall(patron_totales_anterior, linea)
+                return [float(numero.replace(",", "")) for numero in numeros[:3]] if len(numeros) >= 4 else []
+    return []
+
+
+def retenciones_con_tokenizador(texto):
+    return {fila.codigo: fila.base for fila in retenciones_de_texto(texto, encabezado_retenciones)}
+
+
+def compras_con_tokenizador(texto):
+    return totales_de_texto(texto, encabezado_compras)[:3]
+
+
+# Micro-benchmark del análisis de las secciones del ATS (regex anteriores vs tokenizador) sobre el texto ya extraído
+def micro_benchmark_tokenizador(patron_pdfs="./impuestos/ats/*.pdf", repeticiones=200):
+    textos = []
+    for ruta_pdf in sorted(glob.glob(patron_pdfs)):
+        with pdfplumber.open(ruta_pdf) as pdf:
+            textos.extend(pagina.extract_text() or "" for pagina in pdf.pages)
+
+    pares = [
+        ("retenciones", retenciones_con_regex, retenciones_con_tokenizador),
+        ("compras", compras_con_regex, compras_con_tokenizador),
+    ]
+    resultado = {"pdfs": patron_pdfs, "paginas": len(textos), "repeticiones": repeticiones, "secciones": {}}
+    print(f"{'sección':<14}{'regex (us/pág)':>16}{'tokenizador (us/pág)':>22}{'mejora':>9}  iguales")
+    for nombre, con_regex, con_tokenizador in pares:
+        iguales = all(con_regex(texto) == con_tokenizador(texto) for texto in textos)
+        tiempos = {}
+        for etiqueta, funcion in (("regex", con_regex), ("tokenizador", con_tokenizador)):
+            tiempos[etiqueta], _ = medir(lambda: [funcion(texto) for texto in textos], repeticiones)
+        por_pagina = {etiqueta: segundos / max(len(textos), 1) * 1e6 for etiqueta, segundos in tiempos.items()}
+        mejora = por_pagina["regex"] / por_pagina["tokenizador"] if por_pagina["tokenizador"] else 0
+        print(f"{nombre:<14}{por_pagina['regex']:>16.1f}{por_pagina['tokenizador']:>22.1f}{mejora:>8.1f}x  {iguales}")
+        resultado["secciones"][nombre] = {
+            "regex_us": round(por_pagina["regex"], 2), "tokenizador_us": round(por_pagina["tokenizador"], 2),
+            "iguales": iguales,
+        }
+    return resultado
+
+
+# Función para comparar contra una línea base: devuelve las etapas cuya mediana empeoró más que la tolerancia
+def comparar_con_base(resultado, base, tolerancia=0.2):
+    regresiones = []
+    print(f"\n{'etapa':<18}{'base p50 (ms)':>15}{'actual p50 (ms)':>17}{'cambio':>9}")
+    for etapa, actual in resultado["etapas"].items():
+        anterior = base.get("etapas", {}).get(etapa)
+        if not actual or not anterior or not anterior["p50"]:
+            continue
+        cambio = actual["p50"] / anterior["p50"] - 1
+        marca = "  <-- regresión" if cambio > tolerancia else ""
+        print(f"{etapa:<18}{anterior['p50'] * 1000:>15.1f}{actual['p50'] * 1000:>17.1f}{cambio:>+9.0%}{marca}")
+        if cambio > tolerancia:
+            regresiones.append(etapa)
+
+    if base.get("rss_max_mb") and resultado["rss_max_mb"] > base["rss_max_mb"] * (1 + tolerancia):
+        print(f"RSS máximo: {base['rss_max_mb']} MB -> {resultado['rss_max_mb']} MB  <-- regresión")
+        regresiones.append("rss_max_mb")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por etapas sobre los PDFs de ejemplo.")
+    parser.add_argument("directorios", nargs="*", default=directorios_por_defecto)
+    parser.add_argument("--salida", default="benchmark.json", help="JSON con los resultados (línea base)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento permitido (0.2 = 20%%)")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Se toma el mejor tiempo de N repeticiones")
+    parser.add_argument("--limite", type=int, help="Medir solo los primeros N PDFs")
+    parser.add_argument("--tokenizador", action="store_true",
+                        help="Solo el micro-benchmark de las secciones del ATS (regex vs tokenizador)")
+    argumentos = parser.parse_args()
+
+    if argumentos.tokenizador:
+        patron = os.path.join(argumentos.directorios[0], "ats", "*.pdf")
+        resultado = micro_benchmark_tokenizador(patron, max(argumentos.repeticiones, 50))
+        with open(argumentos.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, ensure_ascii=False, indent=1)
+        return
+
+    resultado = ejecutar_benchmark(argumentos.directorios, argumentos.repeticiones, argumentos.limite)
+    imprimir_reporte(resultado)
+
+    with open(argumentos.salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultado, archivo, ensure_ascii=False, indent=1)
+    print(f"\nResultados guardados en '{argumentos.salida}'.")
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        if comparar_con_base(resultado, base, argumentos.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
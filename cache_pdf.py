@@ -0,0 +1,282 @@
+# Description: Caché de PDFs ya analizados, compartida por todos los extractores
+import gc
+import os
+import pickle
+import hashlib
+import logging
+from collections import OrderedDict
+
+from instrumentacion import instrumentacion
+
+# pdfplumber y pdfminer (lector_pdf_rapido) se importan al analizar el primer PDF que no está en caché:
+# una ejecución que solo lee de la caché en disco no los carga
+
+tipos_extraccion = ("palabras", "texto")
+# Motor de extracción de palabras: "rapido" (pdfminer directo, con pdfplumber para lo que no valide) o "pdfplumber"
+motores_palabras = ("rapido", "pdfplumber")
+motor_palabras = os.environ.get("MOTOR_PALABRAS", "rapido")
+version_cache = 2  # Cambiar si cambia el formato de las entradas guardadas en disco
+
+
+# Función para calcular la clave de un PDF: ruta absoluta + fecha de modificación + tamaño
+def clave_documento(ruta_pdf):
+    info = os.stat(ruta_pdf)
+    return (os.path.abspath(ruta_pdf), info.st_mtime_ns, info.st_size)
+
+
+# Presupuesto de memoria residente en MB (0 = sin límite); MAX_RSS_MB lo configura
+max_rss_mb = float(os.environ.get("MAX_RSS_MB", 0))
+# Funciones que sueltan memoria retenida por otros módulos (p. ej. índices) cuando se excede el presupuesto
+funciones_liberar_memoria = []
+avisos_memoria = []  # El aviso de presupuesto excedido se emite una sola vez por proceso
+
+
+# Función para leer la memoria residente actual del proceso en MB (None si el sistema no la expone)
+def memoria_residente_mb():
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# Función para volver por debajo del presupuesto: se vacían las cachés en memoria (la capa en disco se conserva)
+def vigilar_memoria():
+    if not max_rss_mb:
+        return
+    residente = memoria_residente_mb()
+    if residente is None or residente <= max_rss_mb:
+        return
+    instrumentacion.contar("memoria_liberaciones")
+    cache_documentos.limpiar()
+    for liberar in funciones_liberar_memoria:
+        liberar()
+    gc.collect()
+    residente = memoria_residente_mb()
+    if residente > max_rss_mb and not avisos_memoria:
+        avisos_memoria.append(residente)
+        logging.warning(f"Memoria residente de {residente:.0f} MB por encima del presupuesto de {max_rss_mb:.0f} MB "
+                        f"aun después de vaciar las cachés en memoria.")
+
+
+# Generador que analiza una página a la vez de un PDF ya abierto y libera sus objetos antes de la siguiente
+# pdfplumber conserva en `pdf.pages` los caracteres y el layout de cada página hasta que se cierra el PDF
+def paginas_analizadas(pdf, tipo, paginas=None):
+    numeros = range(len(pdf.pages)) if paginas is None else paginas
+    for numero in numeros:
+        pagina = pdf.pages[numero]
+        try:
+            if tipo == "palabras":
+                resultado = pagina.extract_words()
+            else:
+                resultado = pagina.extract_text() or ""
+        finally:
+            pagina.close()
+        instrumentacion.contar(f"paginas_{tipo}")
+        vigilar_memoria()
+        yield numero, resultado
+
+
+# Generador de (página, resultado) para recorrer PDFs grandes sin pasar por la caché
+def iterar_paginas(ruta_pdf, tipo, paginas=None):
+    if tipo not in tipos_extraccion:
+        raise ValueError(f"Tipo de extracción desconocido: {tipo}")
+    import pdfplumber
+    with pdfplumber.open(ruta_pdf) as pdf:
+        instrumentacion.contar("pdfs_abiertos")
+        yield from paginas_analizadas(pdf, tipo, paginas)
+
+
+# Función para extraer de las páginas indicadas el resultado de un tipo de extracción
+def analizar_paginas(ruta_pdf, tipo, paginas=None, motor=None):
+    import pdfplumber
+    from lector_pdf_rapido import palabras_rapidas
+
+    resultados = {}
+    if tipo == "palabras" and (motor or motor_palabras) == "rapido":
+        try:
+            resultados, no_validas, num_paginas = palabras_rapidas(ruta_pdf, paginas)
+        except Exception as e:
+            logging.warning(f"Lectura rápida fallida en '{ruta_pdf}', se usa pdfplumber: {e}")
+        else:
+            if not no_validas:
+                return resultados, num_paginas
+            # Solo las páginas que la vía rápida no pudo validar pasan por pdfplumber
+            paginas = no_validas
+
+    with instrumentacion.etapa(f"pdf_{tipo}"), pdfplumber.open(ruta_pdf) as pdf:
+        instrumentacion.contar("pdfs_abiertos")
+        resultados.update(paginas_analizadas(pdf, tipo, paginas))
+        return resultados, len(pdf.pages)
+
+
+# Función para comparar textos sin espacios ni mayúsculas (la sonda no reconstruye los espacios)
+def normalizar(texto):
+    return "".join(texto.split()).upper()
+
+
+# Caché LRU en memoria con una capa opcional en disco (pickle por documento)
+class CacheDocumentos:
+    def __init__(self, max_documentos=64, directorio=None):
+        self.max_documentos = max_documentos
+        self.directorio = directorio
+        self.documentos = OrderedDict()  # clave -> {"palabras": {pagina: ...}, "texto": {...}, "secciones": {...}}
+        self.aciertos = 0
+        self.fallos = 0
+
+    def ruta_en_disco(self, clave):
+        nombre = hashlib.sha1(repr((version_cache, clave)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directorio, f"{nombre}.pkl")
+
+    def leer_de_disco(self, clave):
+        if not self.directorio:
+            return {}
+        ruta = self.ruta_en_disco(clave)
+        if not os.path.exists(ruta):
+            return {}
+        try:
+            with open(ruta, "rb") as archivo:
+                return pickle.load(archivo)
+        except Exception as e:
+            logging.warning(f"No se pudo leer la caché en disco '{ruta}': {e}")
+            return {}
+
+    def guardar_en_disco(self, clave, entrada):
+        if not self.directorio:
+            return
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            ruta = self.ruta_en_disco(clave)
+            temporal = f"{ruta}.tmp"
+            with open(temporal, "wb") as archivo:
+                pickle.dump(entrada, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, ruta)
+        except Exception as e:
+            logging.warning(f"No se pudo guardar la caché en disco para '{clave[0]}': {e}")
+
+    # Devolver la entrada del documento (memoria, luego disco) y marcarla como usada recientemente
+    def entrada(self, ruta_pdf):
+        clave = clave_documento(ruta_pdf)
+        entrada = self.documentos.get(clave)
+        if entrada is None:
+            entrada = self.leer_de_disco(clave)
+            self.documentos[clave] = entrada
+        self.documentos.move_to_end(clave)
+
+        while len(self.documentos) > self.max_documentos:
+            self.documentos.popitem(last=False)
+        return clave, entrada
+
+    # Devolver por página el resultado de `tipo`, analizando solo las páginas que no estén en caché
+    def obtener(self, ruta_pdf, tipo, paginas=None, motor=None):
+        if tipo not in tipos_extraccion:
+            raise ValueError(f"Tipo de extracción desconocido: {tipo}")
+        if motor is not None and motor not in motores_palabras:
+            raise ValueError(f"Motor de palabras desconocido: {motor}")
+
+        clave, entrada = self.entrada(ruta_pdf)
+        resultados = entrada.setdefault(tipo, {})
+        if paginas is None and "num_paginas" in entrada:
+            paginas = range(entrada["num_paginas"])
+
+        faltantes = None if paginas is None else [numero for numero in paginas if numero not in resultados]
+        if faltantes is None or faltantes:
+            self.fallos += 1
+            instrumentacion.contar("cache_fallos")
+            nuevos, entrada["num_paginas"] = analizar_paginas(ruta_pdf, tipo, faltantes, motor)
+            resultados.update(nuevos)
+            self.guardar_en_disco(clave, entrada)
+        else:
+            self.aciertos += 1
+            instrumentacion.contar("cache_aciertos")
+
+        if paginas is None:
+            paginas = range(entrada["num_paginas"])
+        return [resultados[numero] for numero in paginas]
+
+    # Ambos motores producen las mismas palabras, así que comparten la entrada de la caché
+    def palabras(self, ruta_pdf, paginas=None, motor=None):
+        return self.obtener(ruta_pdf, "palabras", paginas, motor)
+
+    def textos(self, ruta_pdf, paginas=None):
+        return self.obtener(ruta_pdf, "texto", paginas)
+
+    # Devolver el texto crudo normalizado de las páginas (todas, o solo las primeras `max_paginas`)
+    def sonda(self, ruta_pdf, max_paginas=0):
+        clave, entrada = self.entrada(ruta_pdf)
+        sonda = entrada.get("sonda", [])
+        completa = entrada.get("sonda_completa", False)
+
+        if completa or (max_paginas and len(sonda) >= max_paginas):
+            self.aciertos += 1
+            instrumentacion.contar("cache_aciertos")
+        else:
+            self.fallos += 1
+            instrumentacion.contar("cache_fallos")
+            from lector_pdf_rapido import sondear_paginas
+            sonda = [normalizar(texto) for texto in sondear_paginas(ruta_pdf, max_paginas)]
+            completa = not max_paginas or len(sonda) < max_paginas
+            entrada["sonda"], entrada["sonda_completa"] = sonda, completa
+            if completa:
+                entrada["num_paginas"] = len(sonda)
+            self.guardar_en_disco(clave, entrada)
+
+        return sonda[:max_paginas] if max_paginas else sonda
+
+    # Devolver {página: texto de la sonda} solo de las páginas indicadas, sin sondear el resto del documento
+    def sonda_de_paginas(self, ruta_pdf, paginas):
+        clave, entrada = self.entrada(ruta_pdf)
+        sueltas = entrada.setdefault("sonda_paginas", {})
+        conocidas = dict(enumerate(entrada.get("sonda", [])))
+        conocidas.update(sueltas)
+        faltantes = sorted(numero for numero in paginas if numero not in conocidas)
+
+        if faltantes:
+            self.fallos += 1
+            instrumentacion.contar("cache_fallos")
+            from lector_pdf_rapido import sondear_paginas
+            textos = sondear_paginas(ruta_pdf, paginas=set(faltantes))
+            sueltas.update(zip(faltantes, (normalizar(texto) for texto in textos)))
+            conocidas.update(sueltas)
+            self.guardar_en_disco(clave, entrada)
+        else:
+            self.aciertos += 1
+            instrumentacion.contar("cache_aciertos")
+        return {numero: conocidas[numero] for numero in paginas}
+
+    # Devolver el número de páginas; si no se conoce se recorre el árbol de páginas sin interpretarlas
+    def numero_paginas(self, ruta_pdf):
+        clave, entrada = self.entrada(ruta_pdf)
+        if "num_paginas" not in entrada:
+            from lector_pdf_rapido import contar_paginas
+            entrada["num_paginas"] = contar_paginas(ruta_pdf)
+            self.guardar_en_disco(clave, entrada)
+        return entrada["num_paginas"]
+
+    # Devolver las páginas que contienen el encabezado de una sección; el mapa queda guardado en la entrada
+    def paginas_con_seccion(self, ruta_pdf, encabezado):
+        clave, entrada = self.entrada(ruta_pdf)
+        secciones = entrada.setdefault("secciones", {})
+        if encabezado in secciones:
+            return secciones[encabezado]
+
+        # Si el texto completo ya está en caché no hace falta sondear
+        textos = entrada.get("texto", {})
+        if "num_paginas" in entrada and len(textos) == entrada["num_paginas"]:
+            secciones[encabezado] = [numero for numero in sorted(textos) if encabezado in textos[numero]]
+        else:
+            buscado = normalizar(encabezado)
+            # Una página sin texto decodificable se conserva para no perder la sección
+            secciones[encabezado] = [
+                numero for numero, texto in enumerate(self.sonda(ruta_pdf)) if not texto or buscado in texto
+            ]
+
+        self.guardar_en_disco(clave, entrada)
+        return secciones[encabezado]
+
+    def limpiar(self):
+        self.documentos.clear()
+
+
+# Caché compartida por defecto; CACHE_PDF_DIR activa la capa en disco
+cache_documentos = CacheDocumentos(directorio=os.environ.get("CACHE_PDF_DIR"))
@@ -0,0 +1,102 @@
+# Description: Punto de entrada de línea de comandos, un subcomando por proceso (python cli.py <comando> --help)
+# Cada subcomando importa sus módulos al ejecutarse: --help no carga pdfplumber, pdfminer, numpy ni el backend de Excel
+import os
+import sys
+import json
+import logging
+import argparse
+import importlib
+
+# Subcomandos que delegan en el main() de su módulo con el resto de los argumentos: nombre -> (módulo, ayuda)
+comandos_delegados = {
+    "lote": ("lote_clientes", "procesa los clientes de un manifiesto en un solo pool"),
+    "conciliar": ("conciliacion_formularios", "concilia 103 / 104 / ATS de un cliente desde el almacén"),
+    "bancos": ("conciliacion_bancaria", "movimientos y totales mensuales de las conciliaciones bancarias"),
+    "almacen": ("almacen_resultados", "consulta o llena el almacén SQLite de valores extraídos"),
+    "libro": ("lector_libro", "lee o compara las secciones de libros ya escritos sin abrirlos completos"),
+    "servicio": ("servicio", "servicio HTTP local de extracción"),
+    "benchmark": ("benchmark", "benchmark por etapas sobre los PDFs de ejemplo"),
+}
+
+
+# Función para procesar un cliente (extracción + libro), como test_vale.py pero con argumentos
+def comando_procesar(argumentos):
+    from test_vale import procesar
+    opciones = {
+        "directorio_cliente": argumentos.directorio, "ruta_plantilla": argumentos.plantilla,
+        "ruta_excel_salida": argumentos.salida,
+    }
+    procesar(
+        max_workers=argumentos.workers, incremental=argumentos.incremental, ruta_almacen=argumentos.almacen,
+        ruta_conciliacion=argumentos.conciliacion, regla_version=argumentos.regla_version,
+        **{nombre: valor for nombre, valor in opciones.items() if valor is not None},
+    )
+
+
+# Función para extraer los datos de PDFs (o ATS en XML) sueltos y mostrarlos en JSON
+def comando_extraer(argumentos):
+    from descubrimiento import clasificar_pdf, clasificar_xml
+    from extractores import extractores_por_formulario
+
+    salida = {}
+    for ruta in argumentos.archivos:
+        formulario = argumentos.formulario
+        if formulario is None:
+            registro = (clasificar_xml(ruta, None) if ruta.lower().endswith(".xml")
+                        else clasificar_pdf(ruta, None, None))
+            formulario = registro.formulario if registro else None
+        if formulario not in extractores_por_formulario:
+            logging.error(f"No se reconoce el formulario de '{ruta}'; indíquelo con --formulario.")
+            continue
+        salida[ruta] = {"formulario": formulario, "datos": extractores_por_formulario[formulario](ruta)}
+    print(json.dumps(salida, ensure_ascii=False, indent=2))
+
+
+# Función para ejecutar el main() de un módulo como si se hubiera llamado directamente
+def comando_delegado(nombre, resto):
+    modulo, _ = comandos_delegados[nombre]
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {nombre}", *resto]
+    importlib.import_module(modulo).main()
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Extracción de los formularios del SRI (103, 104, ATS) a Excel.")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    procesar = subcomandos.add_parser("procesar", help="extrae los PDFs de un cliente y escribe su libro")
+    procesar.add_argument("--directorio", help="carpeta del cliente (por defecto ./impuestos)")
+    procesar.add_argument("--plantilla", help="plantilla con su .diseno.json (por defecto ./pdf/plantilla_1.xlsx)")
+    procesar.add_argument("--salida", help="libro de salida (por defecto datos_anuales.xlsx)")
+    procesar.add_argument("--workers", type=int, help="procesos de extracción (por defecto, uno por núcleo)")
+    procesar.add_argument("--incremental", action="store_true", help="solo extrae los PDFs nuevos o modificados")
+    procesar.add_argument("--almacen", help="guarda además los valores en este almacén SQLite")
+    procesar.add_argument("--conciliacion", help="CSV con las discrepancias 103 / 104 / ATS")
+    procesar.add_argument("--regla-version", choices=["reciente", "original", "sustitutiva"],
+                          help="versión que vale si hay varias del mismo mes (por defecto REGLA_VERSION o reciente)")
+    procesar.set_defaults(funcion=comando_procesar)
+
+    extraer = subcomandos.add_parser("extraer", help="muestra en JSON los datos de PDFs o ATS en XML sueltos")
+    extraer.add_argument("archivos", nargs="+")
+    extraer.add_argument("--formulario", choices=["103", "104", "ats"], help="por defecto se detecta del contenido")
+    extraer.set_defaults(funcion=comando_extraer)
+
+    # Sin -h propio: la ayuda y los argumentos los resuelve el parser del módulo
+    for nombre, (_, ayuda) in comandos_delegados.items():
+        subcomandos.add_parser(nombre, help=ayuda, add_help=False)
+    return parser
+
+
+def main():
+    parser = crear_parser()
+    argumentos, resto = parser.parse_known_args()
+    if argumentos.comando in comandos_delegados:
+        comando_delegado(argumentos.comando, resto)
+        return
+    if resto:
+        parser.error(f"argumentos no reconocidos: {' '.join(resto)}")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    argumentos.funcion(argumentos)
+
+
+if __name__ == "__main__":
+    main()
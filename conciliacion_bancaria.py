@@ -0,0 +1,569 @@
+# Description: Extractor de las conciliaciones bancarias (Libro Auxiliar) con totales vectorizados en pandas
+import os
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cache_pdf import cache_documentos
+from descubrimiento import descubrir_pdfs
+
+# Páginas del Libro Auxiliar en la sonda (texto sin espacios, en mayúsculas): por el título o, si el OCR lo perdió,
+# por el encabezado de la tabla
+marcas_libro_auxiliar = ("LIBROAUXILIAR", "TERCEROFECHA")
+
+# Enderezado de las páginas escaneadas: pendientes que se prueban y distancia vertical (en puntos, ya enderezada)
+# a partir de la cual una palabra empieza otra fila
+pendientes_prueba = np.linspace(-0.04, 0.04, 161)
+salto_fila = 4.0
+# Dos cajas del OCR que se tocan (a menos de esto) y una es de un solo carácter son la misma palabra: "2 , 4 5 9 . 0 2"
+separacion_caracteres = 0.7
+# Distancia mínima (en puntos) entre los bordes derechos de dos columnas de importes
+separacion_columnas = 15.0
+columnas_importes = ["debito", "credito", "saldo"]
+
+# Período del Libro Auxiliar: "Libro Auxiliar entre el 01/04/2024 y el 30/04/2024"
+patron_periodo = r"entre el\s*(?P<inicio>\d{1,2}/\d{1,2}/\d{4})\s*y el\s*(?P<fin>\d{1,2}/\d{1,2}/\d{4})"
+
+# "Total para <cuenta>" del pie, con el saldo final del Libro Auxiliar
+patron_total_para = r"tota\S?\s?p\s?ara"
+
+# Encabezados y pies de página: período, "Total para <cuenta>", "Total Movimientos", "Fecha y Hora de Impresión"
+patron_pie = (
+    r"(?i)libro auxiliar|[i¡]mpresi\S*\s?[:;]|\d:\d{2}:\d{2}|p[aá]g[il]na|movimientos"
+    r"|" + patron_total_para + r"|p\s?ara\s+[0-9IlOoJÍ¡]{6}"
+)
+
+# Caracteres que el OCR confunde con dígitos (solo se corrigen en fechas e importes, no en los textos)
+digitos_ocr = "0-9OoQCcDUÜÓóIlií|SsZ"
+
+# Fecha de una fila, con los separadores y dígitos que cambia el OCR: "16/OS/2024", "126^04^024", "18rt)1/2024"
+patron_fecha = (
+    rf"(?P<dia>[{digitos_ocr}]{{1,3}})\s?(?:[/(^«,'Í7]{{1,2}}|rt\)|iX|A\))\s?(?P<mes>[{digitos_ocr}]{{1,2}}|\^)"
+    rf"\s?[/«^]\s?(?P<anio>2[{digitos_ocr}^£']{{1,3}}|[{digitos_ocr}]{{2,3}}(?=\W|[A-Za-z]|$))"
+)
+
+# Importe: miles opcionales y decimales obligatorios (1.234,56 / 1,234.56 / 1,234,56 / O.OO)
+patron_importe = rf"[-•■~.]?[{digitos_ocr}]{{1,3}}(?:[.,][{digitos_ocr}]{{3}})*[.,][{digitos_ocr}]{{1,2}}"
+
+# Documento del movimiento: "(001) ce 10378", "(OOI)CB 23", "(001) NC 40186"
+patron_referencia = (
+    r"[({^]\s*[0OoÓC][0-9OoIilÓ'\s]{2,4}[)}]\s*(?P<tipo>[A-Za-z](?:\s?[A-Za-z0-9])?)\s*(?P<numero>\d{1,6})?"
+)
+
+# "SALDO INICIAL" y sus variantes del OCR: "SALOOINICIAL", "S/U.DO INICIAL", "SALDO IN[CIAL"
+patron_saldo_inicial = r"(?i)S\S{1,3}[DO]{1,2}\s?IN\S{1,3}AL"
+
+# Correcciones de los errores típicos del OCR en importes y fechas
+correcciones_ocr = str.maketrans({
+    "O": "0", "o": "0", "Q": "0", "D": "0", "U": "0", "Ü": "0", "Ó": "0", "C": "0", "c": "0", "ó": "6",
+    "I": "1", "l": "1", "i": "1", "í": "1", "|": "1", "S": "5", "s": "5", "Z": "2",
+    "•": "-", "■": "-", "~": "-",
+})
+
+# Signos del OCR dentro de los textos y alrededor de los importes ("0.00,", "O.OOj", "4,634.65'")
+ruido_ocr = "'\"¡!|[]{};:_^?¿«»<>■•"
+ruido_importes = "'\"¡!|[]{}();:_^?¿«»<>jJ,"
+letras = "A-Za-zÁÉÍÓÚÑáéíóúñ"
+
+columnas_movimientos = [
+    "archivo", "fecha", "tercero", "descripcion", "referencia", "debito", "credito", "saldo", "saldo_inicial",
+    "corregido",
+]
+
+
+# Función para convertir una columna de textos numéricos (1.234,56 / 1,234.56 / errores de OCR) a float
+# Las correcciones del OCR solo se aplican a los textos que ya son mayoritariamente dígitos ("3.S2"), que tienen
+# la forma de un importe con algún dígito ("S,750.3C", "5,oo6.oo") o que son un cero escrito con letras ("O.OO",
+# "o.ool"); el resto queda como NaN
+def convertir_numeros(textos):
+    textos = textos.fillna("").astype(str).str.strip(ruido_importes)
+    cero = textos.str.fullmatch(r"[-•]?[0OoQCcG]+[.,][0OoQCcG]{1,2}[lIi|]?")
+    digitos = textos.str.count(r"\d")
+    no_digitos = textos.str.count(r"[^\d.,\-•■~]")
+    forma_importe = textos.str.fullmatch(patron_importe) & (digitos > 0)
+    textos = textos.where((digitos >= no_digitos) | forma_importe | cero, "").where(~cero, "0.00")
+    textos = textos.str.translate(correcciones_ocr).str.replace(r"[^\d.,\-]", "", regex=True)
+    negativo = textos.str.startswith("-")
+    textos = textos.str.replace("-", "", regex=False)
+
+    # Miles seguidos de dos dígitos: el OCR perdió el punto decimal ("6,80000")
+    textos = textos.str.replace(r"^(\d{1,3}(?:[.,]\d{3})+)(\d{2})$", r"\1.\2", regex=True)
+    # Sin decimales no es un importe: el OCR cambió el punto ("-19,313766") o juntó dos filas
+    textos = textos.where(textos.str.fullmatch(r"\d{1,3}(?:[.,]?\d{3})*[.,]\d{1,2}"), "")
+    # El decimal es el último separador seguido de 1 o 2 dígitos al final; los demás separadores son de miles
+    textos = textos.str.replace(r"[.,](?=\d{1,2}$)", "d", regex=True).str.replace(r"[.,]", "", regex=True)
+    numeros = pd.to_numeric(textos.str.replace("d", ".", regex=False), errors="coerce")
+    return numeros.where(~negativo, -numeros)
+
+
+# Función para contar los dígitos en que difieren dos columnas de importes (alineados a la derecha, con el signo):
+# lo que el OCR tendría que haber leído mal para que uno sea el otro; con un NaN no hay nada que comparar (0)
+def digitos_distintos(importes_a, importes_b):
+    caracteres = [
+        pd.Series(np.char.mod("%.2f", importes.fillna(0.0).round(2).to_numpy() + 0.0), dtype=str).str.zfill(16)
+        .to_numpy().astype("U16").view("U1").reshape(-1, 16)
+        for importes in (importes_a, importes_b)
+    ]
+    distintos = (caracteres[0] != caracteres[1]).sum(axis=1)
+    return pd.Series(np.where(importes_a.isna() | importes_b.isna(), 0, distintos), index=importes_a.index)
+
+
+# Función para saber qué páginas de un PDF son del Libro Auxiliar (con la sonda, sin armar las palabras)
+def paginas_libro_auxiliar(ruta_pdf):
+    return [
+        numero for numero, texto in enumerate(cache_documentos.sonda(ruta_pdf))
+        if any(marca in texto for marca in marcas_libro_auxiliar)
+    ]
+
+
+# Función para juntar en una tabla las palabras (texto y caja) de las páginas del Libro Auxiliar de varios PDFs
+def palabras_libro_auxiliar(rutas_pdf):
+    tablas = []
+    for ruta_pdf in rutas_pdf:
+        paginas = paginas_libro_auxiliar(ruta_pdf)
+        for pagina, palabras in zip(paginas, cache_documentos.palabras(ruta_pdf, paginas)):
+            tabla = pd.DataFrame(palabras, columns=["text", "x0", "x1", "top", "bottom"])
+            tablas.append(tabla.assign(archivo=ruta_pdf, pagina=pagina))
+    if not tablas:
+        return pd.DataFrame(columns=["text", "x0", "x1", "top", "bottom", "archivo", "pagina"])
+    return pd.concat(tablas, ignore_index=True)
+
+
+# Función para estimar la inclinación de una página escaneada: la pendiente con la que los centros de las palabras
+# se concentran en menos franjas horizontales de un punto (perfil de proyección)
+def inclinacion(x, y):
+    proyecciones = y[None, :] - pendientes_prueba[:, None] * x[None, :]
+    franjas = np.floor(proyecciones - proyecciones.min(axis=1, keepdims=True)).astype(int)
+    ancho = franjas.max() + 1
+    desplazadas = franjas + np.arange(len(pendientes_prueba))[:, None] * ancho
+    conteos = np.bincount(desplazadas.ravel(), minlength=len(pendientes_prueba) * ancho).reshape(-1, ancho)
+    return pendientes_prueba[int(np.argmax(np.square(conteos).sum(axis=1)))]
+
+
+# Función para agrupar las palabras en filas: cada página se endereza y una fila nueva empieza donde la altura
+# (ya enderezada) salta más de `salto_fila`; las cajas de un carácter pegadas se unen en una palabra
+def palabras_en_filas(palabras):
+    centro_x = ((palabras["x0"] + palabras["x1"]) / 2).to_numpy()
+    centro_y = ((palabras["top"] + palabras["bottom"]) / 2).to_numpy()
+    orden_pagina = palabras.groupby(["archivo", "pagina"], sort=False).ngroup().to_numpy()
+    pendientes = np.array([
+        inclinacion(centro_x[orden_pagina == pagina], centro_y[orden_pagina == pagina])
+        for pagina in range(orden_pagina.max() + 1)
+    ])
+    palabras = palabras.assign(orden_pagina=orden_pagina, y=centro_y - pendientes[orden_pagina] * centro_x)
+
+    palabras = palabras.sort_values(["orden_pagina", "y"], kind="stable")
+    nueva_fila = (palabras["y"].diff() > salto_fila) | (palabras["orden_pagina"].diff() != 0)
+    palabras = palabras.assign(fila=nueva_fila.cumsum()).sort_values(["fila", "x0"], kind="stable")
+
+    misma_fila = palabras["fila"].diff() == 0
+    pegada = (palabras["x0"] - palabras["x1"].shift(1)) <= separacion_caracteres
+    un_caracter = (palabras["text"].str.len() == 1) | (palabras["text"].shift(1).str.len() == 1)
+    palabra = (~(misma_fila & pegada & un_caracter)).cumsum()
+    return palabras.groupby(palabra, sort=False).agg(
+        archivo=("archivo", "first"), orden_pagina=("orden_pagina", "first"), fila=("fila", "first"),
+        text=("text", "".join), x0=("x0", "min"), x1=("x1", "max"),
+    ).reset_index(drop=True)
+
+
+# Función para ubicar las columnas de débitos, créditos y saldo de cada página: los importes están alineados a la
+# derecha, así que sus bordes derechos forman tres grupos; devuelve {orden_pagina: [borde débito, crédito, saldo]}
+def columnas_de_importes(palabras):
+    importes = palabras[palabras["text"].str.strip(ruido_importes).str.fullmatch(patron_importe)]
+    columnas = {}
+    for orden_pagina, bordes in importes.groupby("orden_pagina")["x1"]:
+        bordes = np.sort(bordes.to_numpy())
+        grupos = np.split(bordes, np.flatnonzero(np.diff(bordes) > separacion_columnas) + 1)
+        grupos = [grupo for grupo in grupos if len(grupo) > 1][-3:]
+        if len(grupos) == 3:
+            columnas[orden_pagina] = [float(np.median(grupo)) for grupo in grupos]
+    return columnas
+
+
+# Función para armar la tabla del Libro Auxiliar: una fila por renglón de la página, con el renglón completo,
+# el texto a la izquierda de los importes y el de cada columna de importes (sus cajas se juntan sin espacios)
+def filas_libro_auxiliar(rutas_pdf):
+    palabras = palabras_libro_auxiliar(rutas_pdf)
+    if palabras.empty:
+        return pd.DataFrame(columns=["archivo", "linea", "texto"] + columnas_importes)
+    palabras = palabras_en_filas(palabras)
+    lineas = palabras.groupby("fila")["text"].agg(" ".join).rename("linea")
+
+    columnas = columnas_de_importes(palabras)
+    sin_columnas = set(palabras["orden_pagina"].unique()) - set(columnas)
+    if sin_columnas:
+        logging.warning(f"{len(sin_columnas)} páginas del Libro Auxiliar no tienen las tres columnas de importes.")
+    palabras = palabras[palabras["orden_pagina"].isin(list(columnas))]
+    bordes = np.array([columnas[orden_pagina] for orden_pagina in palabras["orden_pagina"]]).reshape(-1, 3)
+    # Lo que queda a la izquierda de la mitad del ancho de la primera columna de importes es texto
+    inicio_importes = bordes[:, 0] - (bordes[:, 1] - bordes[:, 0]) / 2
+    columna = np.abs(palabras["x1"].to_numpy()[:, None] - bordes).argmin(axis=1)
+    palabras = palabras.assign(
+        columna=np.where(palabras["x1"].to_numpy() < inicio_importes, "texto", np.array(columnas_importes)[columna])
+    )
+
+    es_texto = palabras["columna"] == "texto"
+    texto = palabras[es_texto].groupby("fila")["text"].agg(" ".join)
+    importes = palabras[~es_texto].groupby(["fila", "columna"])["text"].agg("".join).unstack()
+    filas = palabras.groupby("fila")[["archivo"]].first().join(lineas).join(texto.rename("texto")).join(importes)
+    return filas.reindex(columns=["archivo", "linea", "texto"] + columnas_importes).reset_index(drop=True)
+
+
+# Función para quitar los signos del OCR de los textos (terceros o descripciones) y normalizar los espacios
+def limpiar_textos(textos):
+    textos = textos.fillna("").str.translate(str.maketrans("", "", ruido_ocr))
+    return textos.str.split().str.join(" ").str.strip(" ,.-/")
+
+
+# Función para limpiar los terceros: sin palabras de menos de dos letras al inicio ("r", "1", "I") ni restos sin
+# letras al final
+def limpiar_terceros(textos):
+    textos = limpiar_textos(textos)
+    textos = textos.str.replace(rf"^(?:[^{letras}\s]*[{letras}]?[^{letras}\s]*(?:\s+|$))+", "", regex=True)
+    return textos.str.replace(rf"(?:^|\s+)[^{letras}\s]+$", "", regex=True)
+
+
+# Función para leer los dígitos de una parte de la fecha ("OS" -> 5, "126" -> 26); NaN si no hay dígitos
+def numeros_de_fecha(textos, ultimos=2):
+    digitos = textos.fillna("").str.translate(correcciones_ocr).str.replace(r"\D", "", regex=True).str[-ultimos:]
+    return pd.to_numeric(digitos, errors="coerce")
+
+
+# Función para armar las fechas de las filas dentro del período de su Libro Auxiliar
+# Si el OCR cambió el mes o el año ("20/03/2024" en agosto), se usa el día con el mes del período
+def fechas_en_periodo(partes, inicio, fin):
+    dia, mes, anio = numeros_de_fecha(partes["dia"]), numeros_de_fecha(partes["mes"]), numeros_de_fecha(
+        partes["anio"], 4)
+    anio = anio.where(anio >= 1000, fin.dt.year)
+    fechas = pd.Series(pd.NaT, index=partes.index, dtype="datetime64[ns]")
+    for anios, meses in ((anio, mes), (fin.dt.year, fin.dt.month), (inicio.dt.year, inicio.dt.month)):
+        candidatas = pd.to_datetime(
+            pd.DataFrame({"year": anios, "month": meses, "day": dia}), errors="coerce"
+        )
+        # Sin período solo vale la fecha tal como se leyó
+        validas = candidatas.between(inicio, fin) | (inicio.isna() & fechas.isna())
+        fechas = fechas.fillna(candidatas.where(validas))
+    return fechas
+
+
+# Función para corregir las fechas fuera de orden (el Libro Auxiliar va por fecha): una fila más tardía que la
+# siguiente o más temprana que la anterior, con los vecinos en orden, toma la fecha de la fila anterior
+def ordenar_fechas(fechas, archivos):
+    anterior = fechas.groupby(archivos).shift(1)
+    siguiente = fechas.groupby(archivos).shift(-1)
+    fuera_de_orden = (anterior <= siguiente) & ((fechas > siguiente) | (fechas < anterior))
+    fechas = fechas.where(~fuera_de_orden, anterior)
+    return fechas.groupby(archivos).cummax()
+
+
+# Función para completar con el saldo acumulado lo que el OCR leyó mal (en el orden del PDF, por archivo)
+# Un movimiento es débito o crédito: el lado ilegible de una fila con el otro lado distinto de 0 es 0
+# El OCR pierde el menos de los saldos ("5.620,72"): un saldo positivo que no cuadra y negado cuadra con la fila
+# anterior o con la siguiente es negativo
+# Un saldo es ancla si cuadra con la fila anterior o con la siguiente. Entre dos anclas (un tramo):
+#   - si en el tramo falta un solo importe, es lo que falta para llegar de un ancla a la otra
+#   - si no, se corrige lo que obligue a cambiar menos dígitos: los saldos intermedios (recalculados con los
+#     importes) y el último importe, o los importes de cada fila (la diferencia entre saldos legibles)
+# El saldo inicial parte de 0: su débito (o crédito) es el propio saldo; la última fila de cada archivo es ancla si
+# su saldo es el del pie (`saldo_pie`)
+def corregir_con_saldos(movimientos, tolerancia=0.005):
+    archivos = movimientos["archivo"]
+    debito, credito, saldo = (movimientos[columna].copy() for columna in columnas_importes)
+    inicio_archivo = archivos.ne(archivos.shift(1))
+    ultima_del_archivo = inicio_archivo.shift(-1, fill_value=True)
+    # La última fila no tiene siguiente: su saldo se confirma con el del "Total para" del pie
+    cierra = ultima_del_archivo & ((saldo - movimientos["saldo_pie"]).round(2).abs() <= tolerancia)
+
+    def saldo_anterior(saldos):
+        return saldos.groupby(archivos).shift(1).where(~movimientos["saldo_inicial"], 0.0)
+
+    def cuadra(saldos, movimientos_fila):
+        return ((saldo_anterior(saldos) + movimientos_fila - saldos).round(2).abs() <= tolerancia).fillna(False)
+
+    def anclas(movimiento):
+        ok = cuadra(saldo, movimiento)
+        return saldo.notna() & (ok | cierra | (ok.shift(-1, fill_value=False) & ~ultima_del_archivo))
+
+    # Tramos (las filas que siguen a un saldo marcado, hasta el próximo inclusive), el saldo marcado anterior a cada
+    # tramo y el saldo que se acumula en el tramo con los importes (NaN desde el primer importe ilegible)
+    def tramos(marcados, movimiento):
+        tramo = (marcados.shift(1, fill_value=True) | inicio_archivo).cumsum()
+        base = saldo_anterior(saldo.where(marcados).groupby(archivos).ffill()).groupby(tramo).transform("first")
+        acumulado = base + movimiento.groupby(tramo).cumsum()
+        return tramo, base, acumulado.where(~movimiento.isna().groupby(tramo).cummax())
+
+    abono, cargo = debito.fillna(0) > 0, credito.fillna(0) > 0
+    debito, credito = debito.where(debito.notna() | ~cargo, 0.0), credito.where(credito.notna() | ~abono, 0.0)
+
+    movimiento = debito - credito
+    negado_cuadra = ((saldo_anterior(saldo) + movimiento + saldo).round(2).abs() <= tolerancia) | (
+        ((-saldo + movimiento.shift(-1) - saldo.shift(-1)).round(2).abs() <= tolerancia) & ~ultima_del_archivo
+    )
+    signo_perdido = (saldo > 0) & ~cuadra(saldo, movimiento) & negado_cuadra
+    saldo = saldo.where(~signo_perdido, -saldo)
+
+    ancla = anclas(movimiento)
+    tramo, base, _ = tramos(ancla, movimiento)
+    falta = debito.isna() | credito.isna()
+    residuo = saldo.where(ancla).groupby(tramo).transform("last") - base - (
+        (debito.fillna(0) - credito.fillna(0)).groupby(tramo).transform("sum")
+    )
+    unico = falta & (falta.groupby(tramo).transform("sum") == 1) & ancla.groupby(tramo).transform("last")
+    debito = debito.where(~(unico & debito.isna()), (residuo + credito.fillna(0)).clip(lower=0).round(2))
+    credito = credito.where(~(unico & credito.isna()), (debito - residuo).clip(lower=0).round(2))
+
+    movimiento = debito - credito
+    ancla = anclas(movimiento)
+    tramo, _, acumulado = tramos(ancla, movimiento)
+    cambios_saldos = digitos_distintos(saldo.where(~ancla), acumulado) + digitos_distintos(
+        movimiento.where(ancla), movimiento + saldo - acumulado
+    )
+    cambios_importes = digitos_distintos(movimiento, saldo - saldo_anterior(saldo))
+    importes_valen = acumulado.notna().groupby(tramo).transform("last") & (
+        cambios_saldos.groupby(tramo).transform("sum") <= cambios_importes.groupby(tramo).transform("sum")
+    )
+    confiable = ancla | (saldo.notna() & ~importes_valen)
+
+    # Fuera de eso, un saldo no confiable o ilegible se recalcula con el último confiable y los importes, o con el
+    # siguiente
+    hacia_adelante = tramos(confiable, movimiento)[2]
+    hacia_atras = (saldo.where(confiable) - movimiento).shift(-1).where(~ultima_del_archivo)
+    recalculado = acumulado.where(importes_valen).fillna(hacia_adelante).fillna(hacia_atras)
+    saldo_corregido = ~confiable & recalculado.notna()
+    saldo = saldo.where(~saldo_corregido, recalculado.round(2))
+
+    diferencia = (saldo - saldo_anterior(saldo)).round(2)
+    importes_corregidos = ~cuadra(saldo, movimiento) & diferencia.notna() & (confiable | saldo_corregido)
+    debito = debito.where(~importes_corregidos, diferencia.clip(lower=0))
+    credito = credito.where(~importes_corregidos, (-diferencia).clip(lower=0))
+
+    corregidos = signo_perdido | saldo_corregido | importes_corregidos | unico | (
+        movimientos[["debito", "credito"]].isna().any(axis=1) & debito.notna() & credito.notna()
+    )
+    if corregidos.any():
+        logging.info(f"{int(corregidos.sum())} movimientos del Libro Auxiliar se completaron con el saldo acumulado.")
+    return movimientos.assign(debito=debito, credito=credito, saldo=saldo, corregido=corregidos)
+
+
+# Función para convertir uno o varios PDFs de conciliación en una tabla de movimientos
+# Todo el análisis es por columnas (str.extract / str.contains sobre todas las filas a la vez), sin recorrer líneas
+def extraer_movimientos(rutas_pdf):
+    if isinstance(rutas_pdf, str):
+        rutas_pdf = [rutas_pdf]
+    filas = filas_libro_auxiliar(rutas_pdf)
+    linea, texto = filas["linea"].fillna(""), filas["texto"].fillna("")
+
+    periodos = linea.str.extract(patron_periodo).groupby(filas["archivo"]).transform("first")
+    inicio = pd.to_datetime(periodos["inicio"], format="%d/%m/%Y", errors="coerce")
+    fin = pd.to_datetime(periodos["fin"], format="%d/%m/%Y", errors="coerce")
+
+    # Filas de movimientos: con fecha, documento o "SALDO INICIAL" (el "Total para" ilegible no tiene ninguno)
+    importes = pd.DataFrame({columna: convertir_numeros(filas[columna]) for columna in columnas_importes})
+    total_para = linea.str.contains(patron_total_para, case=False)
+    saldo_pie = importes["saldo"].where(total_para).groupby(filas["archivo"]).transform("last")
+    partes = texto.str.extract(rf"^(?P<tercero>.*?){patron_fecha}(?P<resto>.*)$")
+    saldo_inicial = texto.str.contains(patron_saldo_inicial)
+    referencia = texto.str.extract(patron_referencia)["tipo"].notna()
+    es_movimiento = ~linea.str.contains(patron_pie) & (partes["dia"].notna() | referencia | saldo_inicial) & (
+        importes.notna().sum(axis=1) >= 1
+    )
+    filas, texto, importes, partes = filas[es_movimiento], texto[es_movimiento], importes[es_movimiento], \
+        partes[es_movimiento]
+    saldo_inicial, inicio, fin = saldo_inicial[es_movimiento], inicio[es_movimiento], fin[es_movimiento]
+    saldo_pie = saldo_pie[es_movimiento]
+
+    # Sin período legible ("#¿Nombre?" en vez del título), el período es el mes de la fecha mediana de sus filas
+    leidas = fechas_en_periodo(partes, inicio, fin).where(~saldo_inicial)
+    mediana = leidas.groupby(filas["archivo"]).transform("median")
+    inicio = inicio.fillna(mediana.dt.to_period("M").dt.start_time)
+    fin = fin.fillna(mediana.dt.to_period("M").dt.end_time.dt.normalize())
+
+    # Sin fecha legible, la fila va con la anterior (dentro del período, nunca en el mes del saldo inicial)
+    fechas = fechas_en_periodo(partes, inicio, fin).where(~saldo_inicial)
+    fechas = fechas.groupby(filas["archivo"]).ffill()
+    fechas = fechas.where(fechas.notna() & ~(fechas < inicio), inicio)
+    fechas = ordenar_fechas(fechas, filas["archivo"])
+    # El saldo inicial lleva el último día del período anterior
+    fechas = fechas.where(~saldo_inicial, inicio - pd.Timedelta(days=1))
+
+    documento = partes["resto"].fillna(texto).str.extract(
+        rf"^(?P<descripcion>.*?)(?:{patron_referencia}|$)"
+    )
+    referencias = documento["tipo"].str.replace(r"\s", "", regex=True).str.upper() + documento["numero"].fillna("")
+    # El separador de columna "|" pegado a la descripción queda como "i", "j" o "l": "jCOMISIONES", "iTRANSF."
+    descripciones = limpiar_textos(documento["descripcion"]).str.replace(
+        r"^[ijl](?=[A-ZÁÉÍÓÚÑ]{2})", "", regex=True
+    )
+
+    movimientos = pd.DataFrame({
+        "archivo": filas["archivo"],
+        "fecha": fechas,
+        "tercero": limpiar_terceros(partes["tercero"]).where(~saldo_inicial, ""),
+        "descripcion": descripciones.where(~saldo_inicial, "SALDO INICIAL"),
+        "referencia": referencias.fillna("").where(~saldo_inicial, ""),
+        **{columna: importes[columna] for columna in columnas_importes},
+        "saldo_inicial": saldo_inicial.astype(bool),
+        "saldo_pie": saldo_pie,
+    }).reset_index(drop=True)
+    movimientos = corregir_con_saldos(movimientos)
+
+    # Las filas que ni el saldo acumulado pudo completar no sirven para los totales ni para verificar los saldos
+    ilegibles = movimientos[columnas_importes].isna().any(axis=1)
+    if ilegibles.any():
+        logging.info(f"{int(ilegibles.sum())} movimientos del Libro Auxiliar tienen importes ilegibles y se descartan.")
+    return movimientos[~ilegibles].reindex(columns=columnas_movimientos).reset_index(drop=True)
+
+
+# Función para verificar el saldo acumulado: saldo anterior + débito - crédito = saldo (por archivo)
+# Cada archivo se ordena por fecha (orden estable: los empates quedan como en el PDF) y arranca en su saldo inicial
+def verificar_saldos(movimientos, tolerancia=0.01):
+    orden_archivo = movimientos.groupby("archivo", sort=False).ngroup()
+    movimientos = movimientos.assign(orden_archivo=orden_archivo, orden_saldo=~movimientos["saldo_inicial"])
+    movimientos = movimientos.sort_values(["orden_archivo", "orden_saldo", "fecha"], kind="stable")
+
+    saldo_anterior = movimientos.groupby("archivo")["saldo"].shift(1)
+    esperado = saldo_anterior + movimientos["debito"] - movimientos["credito"]
+    # El saldo inicial (o la primera fila de un archivo sin saldo inicial) no tiene saldo anterior
+    esperado = esperado.where(~movimientos["saldo_inicial"])
+    movimientos["saldo_esperado"] = esperado.fillna(movimientos["saldo"])
+    movimientos["diferencia"] = (movimientos["saldo"] - movimientos["saldo_esperado"]).round(2)
+    movimientos["saldo_ok"] = np.abs(movimientos["diferencia"].to_numpy()) <= tolerancia
+    return movimientos.drop(columns=["orden_archivo", "orden_saldo"])
+
+
+# Función para calcular los totales mensuales de débitos y créditos y los saldos inicial y final de cada mes
+# Las filas de saldo inicial no son movimientos: no suman ni cuentan, solo dan el saldo con el que empieza el mes
+# `cuadra` indica si saldo inicial + débitos - créditos = saldo final; un mes sin saldo inicial no cuadra
+def totales_mensuales(movimientos, columnas_grupo=("banco",), tolerancia=0.01):
+    # El saldo inicial lleva el último día del mes anterior: pertenece al mes siguiente a su fecha
+    fecha_periodo = movimientos["fecha"].where(
+        ~movimientos["saldo_inicial"], movimientos["fecha"] + pd.Timedelta(days=1)
+    )
+    movimientos = movimientos.assign(periodo=fecha_periodo.dt.to_period("M"))
+    grupos = [columna for columna in columnas_grupo if columna in movimientos] + ["periodo"]
+    movimientos = movimientos.sort_values(grupos + ["fecha"], kind="stable")
+
+    es_saldo_inicial = movimientos["saldo_inicial"].astype(bool)
+    saldos_iniciales = movimientos[es_saldo_inicial].groupby(grupos)["saldo"].first().rename("saldo_inicial")
+    totales = movimientos[~es_saldo_inicial].groupby(grupos).agg(
+        debitos=("debito", "sum"),
+        creditos=("credito", "sum"),
+        saldo_final=("saldo", "last"),
+        movimientos=("saldo", "size"),
+    )
+    totales = totales.join(saldos_iniciales, how="outer")
+    # Un mes sin movimientos termina con su saldo inicial
+    totales = totales.fillna({"debitos": 0.0, "creditos": 0.0, "movimientos": 0})
+    totales["saldo_final"] = totales["saldo_final"].fillna(totales["saldo_inicial"])
+    totales["movimientos"] = totales["movimientos"].astype(int)
+    descuadre = totales["saldo_inicial"] + totales["debitos"] - totales["creditos"] - totales["saldo_final"]
+    totales["cuadra"] = (descuadre.round(2).abs() <= tolerancia).fillna(False).astype(bool)
+    return totales.reset_index()[
+        grupos + ["saldo_inicial", "debitos", "creditos", "saldo_final", "movimientos", "cuadra"]
+    ]
+
+
+# Función para extraer todas las conciliaciones de un cliente y consolidarlas por banco
+def consolidar_bancos(directorio_cliente, leer_texto=False):
+    registros = list(descubrir_pdfs(directorio_cliente, formularios=["conciliacion"], leer_texto=leer_texto))
+    if not registros:
+        return pd.DataFrame(columns=columnas_movimientos + ["banco", "anio", "mes"])
+
+    movimientos = extraer_movimientos([registro.ruta_pdf for registro in registros])
+    # El banco es la carpeta que contiene el PDF (Conciliación/<Banco>/...)
+    info = pd.DataFrame({
+        "archivo": [registro.ruta_pdf for registro in registros],
+        "banco": [os.path.basename(os.path.dirname(registro.ruta_pdf)) for registro in registros],
+        "anio": [registro.anio for registro in registros],
+        "mes": [registro.mes for registro in registros],
+    })
+    return solo_mes_del_archivo(movimientos.merge(info, on="archivo", how="left"))
+
+
+# Función para quedarse, de cada conciliación, con los movimientos de su mes: un Libro Auxiliar que abarca varios
+# meses (el de septiembre desde el 01/08) repetiría los del mes anterior, que ya están en su propia conciliación
+# El último saldo antes del mes pasa a ser el saldo inicial del mes si el archivo no trae uno
+def solo_mes_del_archivo(movimientos):
+    inicio_mes = pd.to_datetime(
+        pd.DataFrame({"year": movimientos["anio"], "month": movimientos["mes"], "day": 1}), errors="coerce"
+    )
+    fecha_periodo = movimientos["fecha"].where(
+        ~movimientos["saldo_inicial"], movimientos["fecha"] + pd.Timedelta(days=1)
+    )
+    anterior = fecha_periodo < inicio_mes
+    posterior = fecha_periodo >= inicio_mes + pd.offsets.MonthBegin(1)
+    if not (anterior | posterior).any():
+        return movimientos
+
+    tiene_saldo_inicial = (movimientos["saldo_inicial"] & ~anterior).groupby(movimientos["archivo"]).transform("any")
+    ultimo_anterior = anterior & ~anterior.groupby(movimientos["archivo"]).shift(-1, fill_value=False)
+    nuevo_saldo_inicial = ultimo_anterior & ~tiene_saldo_inicial
+    movimientos = movimientos.assign(
+        fecha=movimientos["fecha"].where(~nuevo_saldo_inicial, inicio_mes - pd.Timedelta(days=1)),
+        tercero=movimientos["tercero"].where(~nuevo_saldo_inicial, ""),
+        descripcion=movimientos["descripcion"].where(~nuevo_saldo_inicial, "SALDO INICIAL"),
+        referencia=movimientos["referencia"].where(~nuevo_saldo_inicial, ""),
+        debito=movimientos["debito"].where(~nuevo_saldo_inicial, movimientos["saldo"]),
+        credito=movimientos["credito"].where(~nuevo_saldo_inicial, 0.0),
+        saldo_inicial=movimientos["saldo_inicial"] | nuevo_saldo_inicial,
+    )
+    fuera = (anterior | posterior) & ~nuevo_saldo_inicial
+    logging.info(f"{int(fuera.sum())} movimientos de otros meses se descartan de sus conciliaciones.")
+    return movimientos[~fuera].reset_index(drop=True)
+
+
+# Función para el resumen cruzado: débitos y créditos por banco (filas) y mes (columnas), sin los saldos iniciales
+def resumen_por_banco(movimientos):
+    return movimientos[~movimientos["saldo_inicial"].astype(bool)].pivot_table(
+        index="banco", columns="mes", values=["debito", "credito"], aggfunc="sum", fill_value=0.0
+    )
+
+
+# Función para avisar de los meses que no cuadran (o no tienen saldo inicial) en los totales, y de los meses cuyo
+# saldo final no es el saldo inicial del mes siguiente
+def reportar_descuadres(totales):
+    grupos = list(totales.columns[:list(totales.columns).index("periodo")])
+    saldos_iniciales = totales.groupby(grupos)["saldo_inicial"] if grupos else totales["saldo_inicial"]
+    siguiente_inicial = saldos_iniciales.shift(-1)
+    continuidad = (totales["saldo_final"] - siguiente_inicial).round(2)
+    for indice, fila in totales.iterrows():
+        grupo = " ".join(str(fila[columna]) for columna in grupos + ["periodo"])
+        if pd.isna(fila["saldo_inicial"]):
+            logging.warning(f"{grupo}: no se encontró el saldo inicial; los totales del mes no se pueden verificar.")
+        elif not fila["cuadra"]:
+            descuadre = fila["saldo_inicial"] + fila["debitos"] - fila["creditos"] - fila["saldo_final"]
+            logging.warning(f"{grupo}: saldo inicial + débitos - créditos no da el saldo final (diferencia "
+                            f"{descuadre:,.2f}).")
+        if abs(continuidad[indice]) > 0.01:
+            logging.warning(f"{grupo}: el saldo final ({fila['saldo_final']:,.2f}) no es el saldo inicial del mes "
+                            f"siguiente ({siguiente_inicial[indice]:,.2f}).")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Movimientos y totales de las conciliaciones bancarias de un cliente.")
+    parser.add_argument("directorio", nargs="?", default="./impuestos", help="carpeta del cliente")
+    parser.add_argument("--salida", help="CSV con los movimientos (con la verificación del saldo)")
+    parser.add_argument("--tolerancia", type=float, default=0.01)
+    argumentos = parser.parse_args()
+
+    movimientos = consolidar_bancos(argumentos.directorio)
+    if movimientos.empty:
+        logging.warning(f"No hay conciliaciones bancarias con Libro Auxiliar en '{argumentos.directorio}'.")
+        return
+    verificados = verificar_saldos(movimientos, argumentos.tolerancia)
+    logging.info(
+        f"{len(verificados)} movimientos; {int(verificados['saldo_ok'].sum())} cuadran con el saldo anterior."
+    )
+    if argumentos.salida:
+        verificados.to_csv(argumentos.salida, index=False)
+        logging.info(f"Movimientos guardados en '{argumentos.salida}'.")
+    totales = totales_mensuales(movimientos, tolerancia=argumentos.tolerancia)
+    reportar_descuadres(totales)
+    print(totales.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
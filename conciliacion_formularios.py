@@ -0,0 +1,139 @@
+# Description: Conciliación entre formularios (103 vs ATS, 103 vs 104, 104 vs ATS) calculada en pandas para todo el año
+import os
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from diseno_plantilla import valores_del_mes
+from almacen_resultados import AlmacenResultados
+
+meses = list(range(1, 13))
+
+# 103 VS ATS: base de cada código del 103 contra la base del mismo código en el resumen de retenciones del ATS
+# Mismas filas que la hoja "103 VS ATS"; el casillero 3030 del 103 corresponde al código 303A del ATS
+codigos_103_ats = {
+    "302": "302", "303": "303", "3030": "303A", "304": "304", "304B": "304B", "307": "307", "308": "308",
+    "309": "309", "310": "310", "311": "311", "312": "312", "312A": "312A", "3121": "3121", "314": "314",
+    "319": "319", "320": "320", "322": "322", "323": "323", "324": "324", "325": "325", "326": "326",
+    "327": "327", "328": "328", "332": "332", "332G": "332G", "336": "336", "337": "337", "343": "343",
+    "344": "344", "3440": "3440", "345": "345", "346": "346", "421": "421",
+}
+codigo_sueldos = "302"  # Sueldos: se descuentan de la base de compras del 103 en "103 VS 104"
+
+# 103 VS 104: base de compras del 103 (sin sueldos) contra las adquisiciones y pagos del 104
+codigos_104_vs_103 = ["500", "501", "502", "503", "540", "505", "506", "507", "508", "531", "532", "535"]
+
+# 104 VS ATS: compras del 104 contra las del talón del ATS (tarifa 0%, tarifa 12% y no objeto de IVA)
+codigos_104_vs_ats = ["510", "511", "512", "513", "550", "515", "516", "517", "518"]
+columnas_compras_ats = ["0", "1", "2"]
+
+columnas_reporte = ["comparacion", "mes", "concepto", "valor_a", "valor_b", "diferencia", "estado"]
+
+
+# Función para armar la tabla anual códigos × meses de un formulario (NaN en los meses sin PDF)
+def tabla_anual(datos_por_mes, claves, campo=None):
+    tabla = pd.DataFrame(
+        {mes: valores_del_mes(datos_por_mes[mes], campo) for mes in meses if mes in datos_por_mes},
+        index=pd.Index(claves, dtype=object), columns=meses, dtype=object,
+    )
+    # Los valores que no son números (texto que quedó en el casillero) cuentan como 0
+    numeros = tabla.apply(pd.to_numeric, errors="coerce").astype(float)
+    meses_con_datos = np.array([mes in datos_por_mes for mes in meses])
+    return numeros.where(~np.isnan(numeros.to_numpy()) | ~meses_con_datos, 0.0)
+
+
+# Función para pasar una matriz de diferencias (conceptos × meses) al formato largo del reporte
+def filas_de_reporte(comparacion, valores_a, valores_b, tolerancia):
+    a = valores_a.to_numpy().ravel()
+    b = valores_b.to_numpy().ravel()
+    diferencia = np.round(a - b, 2)
+    estado = np.select(
+        [np.isnan(a) | np.isnan(b), np.abs(diferencia) > tolerancia], ["sin_datos", "diferencia"], default="ok"
+    )
+    return pd.DataFrame({
+        "comparacion": comparacion,
+        "mes": np.tile(valores_a.columns.to_numpy(), len(valores_a)),
+        "concepto": np.repeat(valores_a.index.to_numpy(), len(valores_a.columns)),
+        "valor_a": a, "valor_b": b, "diferencia": diferencia, "estado": estado,
+    }, columns=columnas_reporte)
+
+
+# Función para conciliar el año completo de un cliente ({formulario: {mes: datos}}) en un solo reporte
+# valor_a y valor_b siguen el orden de las hojas, así la diferencia (valor_a - valor_b) tiene su mismo signo:
+# ATS - 103 en "103 VS ATS", 103 - 104 en "103 VS 104" y 104 - ATS en "104 VS ATS" (columna U = T - E)
+def conciliar(datos_cliente, tolerancia=0.01):
+    formulario_103 = tabla_anual(datos_cliente.get("103", {}), list(codigos_103_ats))
+    formulario_104 = tabla_anual(datos_cliente.get("104", {}), codigos_104_vs_103 + codigos_104_vs_ats)
+    ats = datos_cliente.get("ats", {})
+    retenciones_ats = tabla_anual(ats, list(codigos_103_ats.values()), "retenciones")
+    retenciones_ats.index = formulario_103.index
+    compras_ats = tabla_anual(ats, columnas_compras_ats, "compras")
+
+    # Las sumas por mes conservan NaN cuando falta el PDF del mes (min_count=1)
+    base_103 = formulario_103.drop(index=codigo_sueldos).sum(min_count=1).to_frame("base de compras").T
+    base_104 = formulario_104.loc[codigos_104_vs_103].sum(min_count=1).to_frame("base de compras").T
+    total_ats = compras_ats.sum(min_count=1).to_frame("total compras").T
+    compras_104 = formulario_104.loc[codigos_104_vs_ats].sum(min_count=1).to_frame("total compras").T
+
+    reporte = pd.concat([
+        filas_de_reporte("103 VS ATS", retenciones_ats, formulario_103, tolerancia),
+        filas_de_reporte("103 VS 104", base_103, base_104, tolerancia),
+        filas_de_reporte("104 VS ATS", compras_104, total_ats, tolerancia),
+    ], ignore_index=True)
+    return reporte
+
+
+# Función para quedarse con las filas que requieren revisión (diferencias y meses sin datos)
+def discrepancias(reporte, incluir_sin_datos=True):
+    estados = ["diferencia", "sin_datos"] if incluir_sin_datos else ["diferencia"]
+    return reporte[reporte["estado"].isin(estados)].reset_index(drop=True)
+
+
+# Función para el resumen anual por comparación: totales de cada lado y número de diferencias
+def resumen_anual(reporte):
+    return reporte.groupby("comparacion", sort=False).agg(
+        total_a=("valor_a", "sum"),
+        total_b=("valor_b", "sum"),
+        diferencia=("diferencia", "sum"),
+        diferencias=("estado", lambda estados: int((estados == "diferencia").sum())),
+        sin_datos=("estado", lambda estados: int((estados == "sin_datos").sum())),
+    ).round(2)
+
+
+# Función para registrar el resultado en el log y, si se indica, guardar el reporte en CSV
+def reportar_conciliacion(reporte, ruta_csv=None):
+    for comparacion, fila in resumen_anual(reporte).iterrows():
+        logging.info(
+            f"{comparacion}: {fila['total_a']:.2f} vs {fila['total_b']:.2f} (diferencia {fila['diferencia']:.2f}), "
+            f"{int(fila['diferencias'])} diferencias y {int(fila['sin_datos'])} valores sin datos."
+        )
+    if ruta_csv:
+        discrepancias(reporte).to_csv(ruta_csv, index=False)
+        logging.info(f"Reporte de discrepancias guardado en '{ruta_csv}'.")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Conciliación 103 / 104 / ATS de un cliente desde el almacén.")
+    parser.add_argument("cliente")
+    parser.add_argument("--almacen", default=os.environ.get("ALMACEN_RESULTADOS", "resultados.sqlite"))
+    parser.add_argument("--anio", type=int)
+    parser.add_argument("--tolerancia", type=float, default=0.01)
+    parser.add_argument("--salida", help="CSV con las discrepancias")
+    argumentos = parser.parse_args()
+
+    with AlmacenResultados(argumentos.almacen) as almacen:
+        datos = almacen.datos_cliente(argumentos.cliente, argumentos.anio)
+    if not datos:
+        logging.warning(f"No hay datos de '{argumentos.cliente}' en el almacén '{argumentos.almacen}'.")
+        return
+    reporte = conciliar(datos, argumentos.tolerancia)
+    reportar_conciliacion(reporte, argumentos.salida)
+    if not argumentos.salida:
+        print(discrepancias(reporte).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
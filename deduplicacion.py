@@ -0,0 +1,187 @@
+# Description: Huellas de contenido de los PDFs (copias y re-exportaciones) y elección de la versión que vale por periodo
+import os
+import re
+import logging
+import hashlib
+from datetime import datetime
+from collections import namedtuple
+
+from cache_pdf import cache_documentos
+from descubrimiento import patron_ruc_texto
+from lector_ats_xml import cabecera_ats_xml
+
+# Regla para elegir entre varias declaraciones del mismo periodo:
+#   "reciente":    la de fecha de recaudación (o de generación del ATS) más reciente
+#   "original":    la declaración original, aunque después se haya sustituido
+#   "sustitutiva": la sustitutiva más reciente (la original solo si no hay sustitutiva)
+reglas_version = ("reciente", "original", "sustitutiva")
+regla_version = os.environ.get("REGLA_VERSION", "reciente")
+
+# Huella de un documento: hash de los bytes y hash del texto normalizado de la primera página
+# (que lleva el número serial o el secuencial del SRI); un PDF re-exportado cambia los bytes pero no el texto
+HuellaDocumento = namedtuple("HuellaDocumento", ["bytes", "texto"])
+
+# Datos de la declaración leídos de la primera página: RUC, tipo (ORIGINAL / SUSTITUTIVA), número serial,
+# serial del formulario que sustituye y fecha (de recaudación, o de generación en el talón del ATS)
+DatosDeclaracion = namedtuple("DatosDeclaracion", ["ruc", "tipo", "serial", "sustituye", "fecha"])
+
+patron_tipo = re.compile(r"TIPODECLARACIÓN:(ORIGINAL|SUSTITUTIVA)")
+patron_sustituye = re.compile(r"FORMULARIOSUSTITUYE:(\d+)")
+patron_recaudacion = re.compile(r"FECHARECAUDACIÓN\D*DEC\d+?(\d{12})(\d{2}-\d{2}-\d{4})")
+patron_generacion_ats = re.compile(r"FECHADEGENERACIÓN:(\d{2}-\d{2}-\d{4})(\d{2}:\d{2}:\d{2})?")
+patron_secuencial_ats = re.compile(r"SECUENCIALANEXO:(\d+)")
+
+tamano_bloque = 1 << 20
+
+
+# Función para calcular el hash de los bytes de un archivo, leyendo por bloques
+def hash_bytes(ruta):
+    sha1 = hashlib.sha1()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b""):
+            sha1.update(bloque)
+    return sha1.hexdigest()
+
+
+# Función para calcular la huella de un documento; los XML y los PDFs sin texto solo llevan la de bytes
+# La sonda de la primera página normalmente ya está en caché desde el descubrimiento
+def huella_documento(ruta):
+    texto = None
+    if ruta.lower().endswith(".pdf"):
+        try:
+            primera = cache_documentos.sonda(ruta, max_paginas=1)
+        except Exception as e:
+            logging.warning(f"No se pudo leer la primera página de '{ruta}' para su huella: {e}")
+            primera = []
+        if primera and primera[0]:
+            contenido = f"{cache_documentos.numero_paginas(ruta)}\n{primera[0]}"
+            texto = hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+    return HuellaDocumento(hash_bytes(ruta), texto)
+
+
+# Índice de documentos por huella: el primer trabajo de cada documento es su representante
+# Un documento es el mismo si coincide la huella de bytes o la de texto
+class IndiceDocumentos:
+    def __init__(self):
+        self.por_bytes = {}
+        self.por_texto = {}
+        self.duplicados = 0
+
+    # Registrar un trabajo y devolver su representante (él mismo si el documento no se había visto)
+    def registrar(self, trabajo, huella):
+        representante = self.por_bytes.get(huella.bytes)
+        if representante is None and huella.texto:
+            representante = self.por_texto.get(huella.texto)
+        if representante is None:
+            representante = trabajo
+        else:
+            self.duplicados += 1
+        self.por_bytes.setdefault(huella.bytes, representante)
+        if huella.texto:
+            self.por_texto.setdefault(huella.texto, representante)
+        return representante
+
+
+# Función para leer RUC, tipo, serial y fecha de la declaración; la fecha del archivo si el PDF no la trae
+def datos_declaracion(ruta):
+    texto = ""
+    ruc = None
+    if ruta.lower().endswith(".xml"):
+        try:
+            cabecera = cabecera_ats_xml(ruta)
+            ruc = cabecera.ruc if cabecera else None
+        except Exception as e:
+            logging.warning(f"No se pudo leer la cabecera de '{ruta}': {e}")
+    elif ruta.lower().endswith(".pdf"):
+        try:
+            primera = cache_documentos.sonda(ruta, max_paginas=1)
+            texto = primera[0] if primera else ""
+        except Exception as e:
+            logging.warning(f"No se pudo leer la primera página de '{ruta}': {e}")
+
+    if ruc is None:
+        match = patron_ruc_texto.search(texto)
+        ruc = match.group(1) if match else None
+    tipo = patron_tipo.search(texto)
+    sustituye = patron_sustituye.search(texto)
+    serial = fecha = None
+    recaudacion = patron_recaudacion.search(texto)
+    generacion = patron_generacion_ats.search(texto)
+    if recaudacion:
+        serial, fecha = recaudacion.group(1), datetime.strptime(recaudacion.group(2), "%d-%m-%Y")
+    elif generacion:
+        secuencial = patron_secuencial_ats.search(texto)
+        serial = secuencial.group(1) if secuencial else None
+        fecha = datetime.strptime(" ".join(filter(None, generacion.groups())),
+                                  "%d-%m-%Y %H:%M:%S" if generacion.group(2) else "%d-%m-%Y")
+    if fecha is None and os.path.exists(ruta):
+        fecha = datetime.fromtimestamp(os.path.getmtime(ruta))
+
+    return DatosDeclaracion(
+        ruc, tipo.group(1).lower() if tipo else None, serial, sustituye.group(1) if sustituye else None, fecha,
+    )
+
+
+# Función para describir una versión en el log: ruta, tipo y fecha
+def describir(ruta, declaraciones):
+    declaracion = declaraciones[ruta]
+    fecha = f", {declaracion.fecha:%d-%m-%Y}" if declaracion.fecha else ""
+    return f"'{ruta}' ({declaracion.tipo or 'sin tipo'}{fecha})"
+
+
+# Función para elegir, entre los resultados del mismo periodo, el de la versión que vale según la regla
+# El ATS en XML va siempre primero (es lo que recibió el SRI); a igual criterio se prefiere el "{mes}.pdf"
+# Solo son versiones entre sí las declaraciones del mismo RUC: si la carpeta mezcla contribuyentes, se queda el RUC
+# del "{mes}.pdf" (como antes de las reglas) y la regla elige entre las declaraciones de ese RUC
+# Se usan los datos de la declaración que trae el resultado; solo se lee el PDF si no los trae (p. ej. del manifiesto)
+def elegir_version(candidatos, regla=None):
+    regla = regla or regla_version
+    if regla not in reglas_version:
+        raise ValueError(f"Regla de versión desconocida: {regla} (opciones: {', '.join(reglas_version)})")
+    declaraciones = {
+        resultado.ruta_pdf: resultado.declaracion or datos_declaracion(resultado.ruta_pdf) for resultado in candidatos
+    }
+
+    rucs = {declaraciones[resultado.ruta_pdf].ruc for resultado in candidatos} - {None}
+    if len(rucs) > 1:
+        def por_nombre(resultado):
+            base, extension = os.path.splitext(os.path.basename(resultado.ruta_pdf))
+            return (base != str(resultado.mes), extension.lower() != ".xml", os.path.basename(resultado.ruta_pdf))
+        ruc = declaraciones[min(candidatos, key=por_nombre).ruta_pdf].ruc
+        mismo_ruc = [resultado for resultado in candidatos if declaraciones[resultado.ruta_pdf].ruc in (ruc, None)]
+        otros = [
+            f"{describir(resultado.ruta_pdf, declaraciones)} del RUC {declaraciones[resultado.ruta_pdf].ruc}"
+            for resultado in candidatos if declaraciones[resultado.ruta_pdf].ruc not in (ruc, None)
+        ]
+        logging.warning(
+            f"Hay declaraciones de {len(rucs)} RUC en {candidatos[0].formulario} del mes {candidatos[0].mes} para "
+            f"'{candidatos[0].cliente}'; se usa el RUC {ruc} y se ignora {', '.join(otros)}."
+        )
+        candidatos = mismo_ruc
+        if len(candidatos) == 1:
+            return candidatos[0]
+
+    def orden(resultado):
+        declaracion = declaraciones[resultado.ruta_pdf]
+        nombre = os.path.basename(resultado.ruta_pdf)
+        base, extension = os.path.splitext(nombre)
+        marca = declaracion.fecha.timestamp() if declaracion.fecha else 0.0
+        if regla == "original":
+            criterio = (declaracion.tipo == "original", -marca)
+        elif regla == "sustitutiva":
+            criterio = (declaracion.tipo == "sustitutiva", marca)
+        else:
+            # Una sustitutiva presentada el mismo día que la original la reemplaza
+            criterio = (marca, declaracion.tipo == "sustitutiva")
+        return (extension.lower() == ".xml", *criterio, base == str(resultado.mes), nombre)
+
+    elegido = max(candidatos, key=orden)
+    descartados = [resultado for resultado in candidatos if resultado is not elegido]
+    # Las copias del mismo documento no necesitan aviso; dos versiones distintas sí
+    if any(resultado.datos != elegido.datos for resultado in descartados):
+        logging.warning(
+            f"Hay {len(candidatos)} versiones de {elegido.formulario} del mes {elegido.mes} para '{elegido.cliente}'; "
+            f"por la regla '{regla}' se usa {describir(elegido.ruta_pdf, declaraciones)} y se ignora "
+            f"{', '.join(describir(resultado.ruta_pdf, declaraciones) for resultado in descartados)}."
+        )
+    return elegido
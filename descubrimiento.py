@@ -0,0 +1,193 @@
+# Description: Descubrimiento de PDFs en las carpetas de los clientes (103, 104, ATS, conciliaciones, ...)
+import os
+import re
+import logging
+import unicodedata
+from collections import namedtuple
+
+from cache_pdf import cache_documentos
+from lector_ats_xml import cabecera_ats_xml
+
+# Cada PDF encontrado: cliente (carpeta), formulario, periodo (año, mes) y datos leídos de la primera página
+RegistroPDF = namedtuple("RegistroPDF", ["cliente", "formulario", "anio", "mes", "ruta_pdf", "ruc", "variante"])
+
+meses = {
+    "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4, "MAYO": 5, "JUNIO": 6, "JULIO": 7,
+    "AGOSTO": 8, "SEPTIEMBRE": 9, "SETIEMBRE": 9, "OCTUBRE": 10, "NOVIEMBRE": 11, "DICIEMBRE": 12,
+}
+
+# Nombre de carpeta (sin tildes, en mayúsculas) -> formulario
+carpetas_formulario = {
+    "103": "103",
+    "104": "104",
+    "ATS": "ats",
+    "CONCILIACION": "conciliacion",
+    "CCO": "cco",
+    "RESOLUCIONES_SRI": "resolucion",
+}
+
+# Prefijos del nombre de archivo que identifican el formulario
+prefijos_formulario = (
+    ("CCO", "cco"),
+    ("RESOLUCION", "resolucion"),
+)
+
+# Marcas en el texto de la primera página (sin espacios, en mayúsculas) -> formulario
+marcas_texto = (
+    ("OBLIGACIÓNTRIBUTARIA:1031", "103"),
+    ("DECLARACIÓNDERETENCIONESENLAFUENTE", "103"),
+    ("OBLIGACIÓNTRIBUTARIA:2011", "104"),
+    ("DECLARACIONDEIVA", "104"),
+    ("ANEXOTRANSACCIONAL", "ats"),
+    ("CONCILIACIÓN", "conciliacion"),
+    ("CERTIFICADODECUMPLIMIENTO", "cco"),
+    ("RESOLUCIÓNNO.", "resolucion"),
+)
+
+patron_mes_inicial = re.compile(r"^(\d{1,2})(?=\D|$)")
+patron_anio = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+patron_periodo_texto = re.compile(r"PER[IÍ]ODO(?:FISCAL)?:(" + "|".join(meses) + r")(\d{4})")
+patron_fechas_texto = re.compile(r"ENTRE\d{1,2}/(\d{1,2})/(\d{4})")
+patron_ruc_texto = re.compile(r"(?:RUC|IDENTIFICACIÓN):(\d{13})")
+patron_original = re.compile(r"\bORI(GINAL)?\b")
+
+
+# Función para quitar tildes y pasar a mayúsculas (para comparar nombres de carpetas y archivos)
+def sin_tildes(texto):
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c)).upper()
+
+
+# Función para clasificar un archivo solo por su nombre: (formulario, año, mes, variante)
+def clasificar_por_nombre(nombre_archivo):
+    base = sin_tildes(os.path.splitext(nombre_archivo)[0])
+    formulario = None
+    for prefijo, tipo in prefijos_formulario:
+        if base.startswith(prefijo):
+            formulario = tipo
+    if "CONCILIACION" in base:
+        formulario = "conciliacion"
+
+    mes = None
+    match = patron_mes_inicial.match(base)
+    if match and 1 <= int(match.group(1)) <= 12:
+        mes = int(match.group(1))
+    else:
+        for nombre_mes, numero in meses.items():
+            if re.search(rf"\b{nombre_mes}\b", base):
+                mes = numero
+                break
+
+    match = patron_anio.search(base)
+    anio = int(match.group(1)) if match else None
+    variante = "original" if patron_original.search(base) else ""
+    return formulario, anio, mes, variante
+
+
+# Función para clasificar un archivo por el texto de su primera página: (formulario, año, mes, ruc)
+def clasificar_por_texto(ruta_pdf):
+    try:
+        paginas = cache_documentos.sonda(ruta_pdf, max_paginas=1)
+    except Exception as e:
+        logging.warning(f"No se pudo leer la primera página de '{ruta_pdf}': {e}")
+        return None, None, None, None
+    texto = paginas[0] if paginas else ""
+
+    formulario = next((tipo for marca, tipo in marcas_texto if marca in texto), None)
+
+    anio = mes = None
+    match = patron_periodo_texto.search(texto)
+    if match:
+        mes, anio = meses[match.group(1)], int(match.group(2))
+    else:
+        match = patron_fechas_texto.search(texto)
+        if match:
+            mes, anio = int(match.group(1)), int(match.group(2))
+
+    match = patron_ruc_texto.search(texto)
+    ruc = match.group(1) if match else None
+    return formulario, anio, mes, ruc
+
+
+# Función para clasificar un PDF combinando carpeta, nombre y (si hace falta) texto de la primera página
+def clasificar_pdf(ruta_pdf, cliente, formulario_carpeta, leer_texto=True):
+    formulario, anio, mes, variante = clasificar_por_nombre(os.path.basename(ruta_pdf))
+    formulario = formulario or formulario_carpeta
+    ruc = None
+
+    if leer_texto:
+        formulario_texto, anio_texto, mes_texto, ruc = clasificar_por_texto(ruta_pdf)
+        if formulario_texto and formulario and formulario_texto != formulario:
+            logging.warning(
+                f"'{ruta_pdf}' está en una carpeta de {formulario} pero su contenido es de {formulario_texto}."
+            )
+        formulario = formulario_texto or formulario
+        anio = anio_texto or anio
+        mes = mes_texto or mes
+
+    return RegistroPDF(cliente, formulario, anio, mes, ruta_pdf, ruc, variante)
+
+
+# Función para clasificar un ATS en XML por su cabecera (None si el XML no es un ATS)
+def clasificar_xml(ruta_xml, cliente):
+    try:
+        cabecera = cabecera_ats_xml(ruta_xml)
+    except Exception as e:
+        logging.warning(f"No se pudo leer la cabecera de '{ruta_xml}': {e}")
+        return None
+    if cabecera is None:
+        return None
+    _, anio, mes, variante = clasificar_por_nombre(os.path.basename(ruta_xml))
+    return RegistroPDF(cliente, "ats", cabecera.anio or anio, cabecera.mes or mes, ruta_xml, cabecera.ruc, variante)
+
+
+# Generador que recorre una carpeta y produce un RegistroPDF por cada PDF (y cada ATS en XML), sin cargar el árbol en memoria
+def descubrir_pdfs(directorio_raiz, formularios=None, leer_texto=True, clientes=None):
+    base_nombres = os.path.dirname(os.path.abspath(directorio_raiz))
+
+    def recorrer(directorio, cliente, formulario_carpeta):
+        try:
+            entradas = sorted(os.scandir(directorio), key=lambda entrada: entrada.name)
+        except OSError as e:
+            logging.warning(f"No se pudo leer la carpeta '{directorio}': {e}")
+            return
+
+        for entrada in entradas:
+            if entrada.is_dir():
+                formulario = carpetas_formulario.get(sin_tildes(entrada.name))
+                if formulario:
+                    # El cliente es la carpeta que contiene las carpetas de formularios
+                    yield from recorrer(entrada.path, os.path.relpath(directorio, base_nombres), formulario)
+                else:
+                    yield from recorrer(entrada.path, cliente, formulario_carpeta)
+            elif entrada.name.lower().endswith((".pdf", ".xml")):
+                cliente_archivo = cliente or os.path.relpath(directorio, base_nombres)
+                if clientes and cliente_archivo not in clientes:
+                    continue
+
+                # Los XML solo interesan si son un ATS (el archivo que se sube al SRI)
+                if entrada.name.lower().endswith(".xml"):
+                    if formularios and "ats" not in formularios:
+                        continue
+                    registro = clasificar_xml(entrada.path, cliente_archivo)
+                    if registro is not None:
+                        yield registro
+                    continue
+
+                # Se descartan antes de leer el texto los archivos cuyo formulario ya se sabe que no interesa
+                formulario_conocido = clasificar_por_nombre(entrada.name)[0] or formulario_carpeta
+                if formularios and formulario_conocido and formulario_conocido not in formularios:
+                    continue
+
+                registro = clasificar_pdf(entrada.path, cliente_archivo, formulario_carpeta, leer_texto)
+                if formularios and registro.formulario not in formularios:
+                    continue
+                yield registro
+
+    yield from recorrer(directorio_raiz, None, None)
+
+
+# Generador que encadena el descubrimiento de varias carpetas de clientes
+def descubrir_clientes(directorios_raiz, formularios=None, leer_texto=True, clientes=None):
+    for directorio_raiz in directorios_raiz:
+        yield from descubrir_pdfs(directorio_raiz, formularios, leer_texto, clientes)
@@ -0,0 +1,100 @@
+# Description: Diseño declarativo de la plantilla (JSON) compilado a planes de escritura con coordenadas numéricas
+import os
+import json
+import logging
+from collections import namedtuple
+
+from escritor_excel import celda_a_coordenadas, agrupar_en_bloques
+from instrumentacion import medido
+
+# Una sección del diseño ya compilada: de dónde salen los datos y qué bloques se escriben en el año
+# claves: códigos de la sección (filas de la matriz anual códigos × meses)
+# bloques: [(fila, columna, posiciones)], con `posiciones` = matriz de índices planos en la matriz anual
+PlanSeccion = namedtuple("PlanSeccion", ["nombre", "hoja", "formulario", "campo", "meses", "claves", "bloques"])
+
+
+# Función para leer el archivo de diseño de una plantilla
+def cargar_diseno(ruta_diseno):
+    with open(ruta_diseno, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+# Función para ubicar el diseño de una plantilla: mismo nombre con extensión .diseno.json
+def ruta_diseno_de(ruta_plantilla):
+    return f"{os.path.splitext(ruta_plantilla)[0]}.diseno.json"
+
+
+# Función para compilar una sección: la celda de enero de cada código más el desplazamiento por mes
+# Los bloques cubren el año completo; las columnas intermedias (p. ej. D y E entre C y F) no se tocan
+def compilar_seccion(seccion, meses=12):
+    import numpy as np  # Solo al compilar el diseño: el arranque de los comandos que no escriben no lo carga
+
+    paso_filas, paso_columnas = seccion.get("paso_mes", (0, 0))
+    claves = list(seccion["celdas"])
+    anclas = np.array([celda_a_coordenadas(seccion["celdas"][clave]) for clave in claves]).reshape(-1, 2)
+
+    desplazamientos = np.arange(meses)
+    filas = anclas[:, [0]] + desplazamientos * paso_filas        # (códigos × meses)
+    columnas = anclas[:, [1]] + desplazamientos * paso_columnas
+    posiciones = np.arange(len(claves) * meses)
+
+    celdas = dict(zip(zip(filas.ravel().tolist(), columnas.ravel().tolist()), posiciones.tolist()))
+    if len(celdas) != len(posiciones):
+        raise ValueError(f"La sección '{seccion['nombre']}' tiene dos códigos en la misma celda.")
+    bloques = [(fila, columna, np.array(matriz)) for fila, columna, matriz in agrupar_en_bloques(celdas)]
+
+    return PlanSeccion(
+        seccion["nombre"], seccion["hoja"], seccion["formulario"], seccion.get("campo"), meses, claves, bloques
+    )
+
+
+# Función para compilar todo el diseño de una plantilla (se hace una sola vez por corrida)
+def compilar_diseno(diseno):
+    meses = diseno.get("meses", 12)
+    return [compilar_seccion(seccion, meses) for seccion in diseno["secciones"]]
+
+
+# Función para cargar y compilar el diseño que acompaña a una plantilla
+def plan_de_plantilla(ruta_plantilla):
+    return compilar_diseno(cargar_diseno(ruta_diseno_de(ruta_plantilla)))
+
+
+# Función para obtener los datos de un mes como {clave: valor} (las listas usan su posición como clave)
+def valores_del_mes(datos_mes, campo=None):
+    if campo is not None:
+        datos_mes = datos_mes.get(campo)
+    if isinstance(datos_mes, (list, tuple)):
+        return {str(posicion): valor for posicion, valor in enumerate(datos_mes)}
+    return datos_mes or {}
+
+
+# Función para armar la matriz anual (códigos × meses) de una sección; None donde no hay dato
+def matriz_anual(plan, datos_por_mes):
+    import numpy as np
+
+    valores = np.full((len(plan.claves), plan.meses), None, dtype=object)
+    for mes in range(1, plan.meses + 1):
+        if mes not in datos_por_mes:
+            logging.warning(f"No hay datos extraídos del mes {mes} para la hoja '{plan.hoja}' ({plan.nombre}).")
+            continue
+        datos_mes = valores_del_mes(datos_por_mes[mes], plan.campo)
+        valores[:, mes - 1] = [datos_mes.get(clave) for clave in plan.claves]
+    return valores
+
+
+# Función para registrar en la sesión el año completo de una sección: un bloque por rango contiguo
+@medido()
+def aplicar_plan(plan, datos_por_mes, sesion):
+    valores = matriz_anual(plan, datos_por_mes).ravel()
+    for fila, columna, posiciones in plan.bloques:
+        sesion.escribir_bloque(plan.hoja, fila, columna, valores[posiciones].tolist())
+    logging.info(
+        f"{len(datos_por_mes)} meses de '{plan.nombre}' preparados para la hoja '{plan.hoja}' "
+        f"en {len(plan.bloques)} bloques."
+    )
+
+
+# Función para aplicar el plan completo con los datos agrupados de un cliente ({formulario: {mes: datos}})
+def aplicar_diseno(planes, datos_cliente, sesion):
+    for plan in planes:
+        aplicar_plan(plan, datos_cliente.get(plan.formulario, {}), sesion)
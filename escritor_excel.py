@@ -0,0 +1,212 @@
+# Description: Sesión de escritura por lotes sobre el libro de Excel de salida
+import os
+import sys
+import re
+import logging
+
+from instrumentacion import instrumentacion
+
+patron_celda = re.compile(r"^([A-Z]+)(\d+)$")
+
+# Motor de escritura: xlwings (Excel), openpyxl o xlsx (parche directo del paquete); por defecto se elige solo
+motor_excel = os.environ.get("MOTOR_EXCEL")
+
+
+# Función para convertir las letras de una columna a su número (A = 1, AA = 27)
+def letra_a_columna(letras):
+    numero = 0
+    for letra in letras.upper():
+        numero = numero * 26 + (ord(letra) - ord("A") + 1)
+    return numero
+
+
+# Función para convertir el número de una columna a sus letras (27 = AA)
+def columna_a_letra(numero):
+    letras = ""
+    while numero > 0:
+        numero, resto = divmod(numero - 1, 26)
+        letras = chr(ord("A") + resto) + letras
+    return letras
+
+
+# Función para convertir una referencia tipo "AA10" en coordenadas (fila, columna)
+def celda_a_coordenadas(celda):
+    match = patron_celda.match(celda.strip().upper())
+    if not match:
+        raise ValueError(f"Referencia de celda no válida: {celda}")
+    return int(match.group(2)), letra_a_columna(match.group(1))
+
+
+# Función para agrupar las celdas de una hoja en bloques rectangulares contiguos
+# Recibe {(fila, columna): valor} y devuelve [(fila_inicio, columna_inicio, matriz)]
+def agrupar_en_bloques(celdas):
+    # Primero se forman tramos de columnas consecutivas dentro de cada fila
+    tramos_por_fila = {}
+    for fila, columna in sorted(celdas):
+        tramos = tramos_por_fila.setdefault(fila, [])
+        if tramos and tramos[-1][1] == columna - 1:
+            tramos[-1][1] = columna
+        else:
+            tramos.append([columna, columna])
+
+    # Luego se apilan los tramos de filas consecutivas que cubren las mismas columnas
+    bloques = []
+    abiertos = {}
+    for fila in sorted(tramos_por_fila):
+        siguientes = {}
+        for columna_inicio, columna_fin in tramos_por_fila[fila]:
+            clave = (columna_inicio, columna_fin)
+            bloque = abiertos.get(clave)
+            if bloque is not None and bloque[1] == fila - 1:
+                bloque[1] = fila
+            else:
+                bloque = [fila, fila, columna_inicio, columna_fin]
+                bloques.append(bloque)
+            siguientes[clave] = bloque
+        abiertos = siguientes
+
+    resultado = []
+    for fila_inicio, fila_fin, columna_inicio, columna_fin in bloques:
+        matriz = [
+            [celdas[(fila, columna)] for columna in range(columna_inicio, columna_fin + 1)]
+            for fila in range(fila_inicio, fila_fin + 1)
+        ]
+        resultado.append((fila_inicio, columna_inicio, matriz))
+    return resultado
+
+
+# Función para elegir el motor de Excel disponible (xlwings solo donde hay Excel instalado)
+def elegir_motor():
+    if motor_excel:
+        return motor_excel
+    if sys.platform in ("win32", "darwin"):
+        try:
+            import xlwings  # noqa: F401
+            return "xlwings"
+        except ImportError:
+            pass
+    return "xlsx"
+
+
+# Función para aplicar los bloques usando Excel a través de xlwings
+def guardar_con_xlwings(ruta_origen, ruta_salida, bloques_por_hoja):
+    import xlwings as xw
+
+    app = xw.App(visible=False)
+    try:
+        wb = app.books.open(os.path.abspath(ruta_origen))
+        instrumentacion.contar("libros_abiertos")
+        nombres = [sheet.name for sheet in wb.sheets]
+        for nombre_hoja, bloques in bloques_por_hoja.items():
+            if nombre_hoja in nombres:
+                hoja = wb.sheets[nombre_hoja]
+            else:
+                hoja = wb.sheets.add(name=nombre_hoja)
+            for fila, columna, matriz in bloques:
+                hoja.range((fila, columna)).value = matriz
+        wb.save(os.path.abspath(ruta_salida))
+        instrumentacion.contar("libros_guardados")
+        wb.close()
+    finally:
+        app.quit()
+
+
+# Función para aplicar los bloques en Python puro con openpyxl (sin Excel)
+def guardar_con_openpyxl(ruta_origen, ruta_salida, bloques_por_hoja):
+    import openpyxl
+
+    with instrumentacion.etapa("abrir_libro"):
+        wb = openpyxl.load_workbook(ruta_origen)
+    instrumentacion.contar("libros_abiertos")
+    for nombre_hoja, bloques in bloques_por_hoja.items():
+        if nombre_hoja in wb.sheetnames:
+            hoja = wb[nombre_hoja]
+        else:
+            hoja = wb.create_sheet(title=nombre_hoja)
+        for fila, columna, matriz in bloques:
+            for i, valores_fila in enumerate(matriz):
+                for j, valor in enumerate(valores_fila):
+                    hoja.cell(row=fila + i, column=columna + j, value=valor)
+    with instrumentacion.etapa("guardar_libro"):
+        wb.save(ruta_salida)
+    instrumentacion.contar("libros_guardados")
+    wb.close()
+
+
+# Función para aplicar los bloques parcheando el XML de las hojas dentro del zip (sin Excel y sin cargar el libro)
+# Lo que este parche no cubre (p. ej. una hoja que no existe en la plantilla) se escribe con openpyxl
+def guardar_con_xlsx(ruta_origen, ruta_salida, bloques_por_hoja):
+    from paquete_xlsx import parchear_libro, ParcheNoSoportado
+
+    try:
+        parchear_libro(ruta_origen, ruta_salida, bloques_por_hoja)
+    except ParcheNoSoportado as e:
+        logging.info(f"No se puede escribir '{ruta_salida}' parcheando el paquete ({e}); se usa openpyxl.")
+        guardar_con_openpyxl(ruta_origen, ruta_salida, bloques_por_hoja)
+
+
+motores = {
+    "xlwings": guardar_con_xlwings,
+    "openpyxl": guardar_con_openpyxl,
+    "xlsx": guardar_con_xlsx,
+}
+
+
+# Sesión que acumula todas las escrituras de una corrida y las aplica con una sola apertura
+class SesionLibro:
+    def __init__(self, ruta_plantilla, ruta_salida, motor=None):
+        self.ruta_plantilla = ruta_plantilla
+        self.ruta_salida = ruta_salida
+        self.motor = motor or elegir_motor()
+        if self.motor not in motores:
+            raise ValueError(f"Motor de Excel desconocido: {self.motor}")
+        self.escrituras = {}  # nombre_hoja -> {(fila, columna): valor}
+
+    # Registrar un valor usando una referencia tipo "C44"
+    def escribir(self, nombre_hoja, celda, valor):
+        fila, columna = celda_a_coordenadas(celda)
+        self.escribir_coordenada(nombre_hoja, fila, columna, valor)
+
+    # Registrar un valor usando coordenadas numéricas (fila, columna)
+    def escribir_coordenada(self, nombre_hoja, fila, columna, valor):
+        self.escrituras.setdefault(nombre_hoja, {})[(fila, columna)] = valor
+
+    # Registrar una matriz a partir de (fila, columna); las celdas con None se dejan como están en el libro
+    def escribir_bloque(self, nombre_hoja, fila, columna, matriz):
+        celdas = self.escrituras.setdefault(nombre_hoja, {})
+        for i, valores_fila in enumerate(matriz):
+            for j, valor in enumerate(valores_fila):
+                if valor is not None:
+                    celdas[(fila + i, columna + j)] = valor
+
+    def total_celdas(self):
+        return sum(len(celdas) for celdas in self.escrituras.values())
+
+    def bloques_por_hoja(self):
+        return {nombre_hoja: agrupar_en_bloques(celdas) for nombre_hoja, celdas in self.escrituras.items()}
+
+    # Abrir el libro una sola vez, aplicar todos los bloques y guardar una sola vez
+    def guardar(self):
+        if not self.escrituras:
+            logging.info("No hay datos pendientes de escribir en el libro de Excel.")
+            return True
+
+        ruta_origen = self.ruta_salida if os.path.exists(self.ruta_salida) else self.ruta_plantilla
+        bloques_por_hoja = self.bloques_por_hoja()
+        total_bloques = sum(len(bloques) for bloques in bloques_por_hoja.values())
+
+        try:
+            with instrumentacion.etapa(f"escribir_libro_{self.motor}"):
+                motores[self.motor](ruta_origen, self.ruta_salida, bloques_por_hoja)
+        except Exception as e:
+            logging.error(f"Error al guardar el libro '{self.ruta_salida}' con {self.motor}: {e}")
+            return False
+
+        instrumentacion.contar("celdas_escritas", self.total_celdas())
+        instrumentacion.contar("bloques_escritos", total_bloques)
+        logging.info(
+            f"{self.total_celdas()} celdas escritas en {total_bloques} bloques de "
+            f"{len(bloques_por_hoja)} hojas en '{self.ruta_salida}' ({self.motor})."
+        )
+        self.escrituras = {}
+        return True
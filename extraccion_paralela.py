@@ -0,0 +1,139 @@
+# Description: Planificador que reparte la extracción de PDFs entre varios procesos
+import os
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from extractores import extractores_por_formulario, extractores_con_paginas
+from descubrimiento import descubrir_pdfs
+from deduplicacion import IndiceDocumentos, huella_documento, elegir_version, datos_declaracion
+from instrumentacion import instrumentacion
+
+# Un trabajo es un PDF concreto: (cliente, formulario, año, mes, ruta del archivo)
+TrabajoExtraccion = namedtuple("TrabajoExtraccion", ["cliente", "formulario", "anio", "mes", "ruta_pdf"])
+
+# El resultado solo lleva tipos que se pueden serializar con pickle para viajar entre procesos
+# `metricas` trae la instrumentación acumulada en el proceso del pool (None si se ejecutó en este proceso)
+# `declaracion` trae RUC, tipo y fecha de la primera página, leídos en el mismo proceso que extrajo el PDF,
+# para elegir entre versiones del mismo mes sin volver a leerlo en el proceso principal
+# `paginas` trae la página (1 = primera) de la que salió cada valor, con la forma que da extractores_con_paginas
+ResultadoExtraccion = namedtuple(
+    "ResultadoExtraccion",
+    ["cliente", "formulario", "anio", "mes", "ruta_pdf", "datos", "error", "metricas", "declaracion", "paginas"],
+    defaults=[None, None, None],
+)
+
+
+# Generador de trabajos a partir del descubrimiento de PDFs en la carpeta de un cliente (impuestos/, impuestos_jona/, ...)
+def generar_trabajos(directorio_cliente, formularios=None, clientes=None):
+    formularios = formularios or tuple(extractores_por_formulario)
+    for registro in descubrir_pdfs(directorio_cliente, formularios=formularios, clientes=clientes):
+        if registro.mes is None:
+            logging.warning(f"No se pudo determinar el mes de '{registro.ruta_pdf}'; se omite.")
+            continue
+        yield TrabajoExtraccion(registro.cliente, registro.formulario, registro.anio, registro.mes, registro.ruta_pdf)
+
+
+# Generador de los trabajos de varios clientes, para repartirlos en el mismo pool
+def generar_trabajos_clientes(directorios_clientes, formularios=None, clientes=None):
+    for directorio_cliente in directorios_clientes:
+        yield from generar_trabajos(directorio_cliente, formularios, clientes)
+
+
+# Función que ejecuta un trabajo dentro de un proceso del pool
+# Con en_pool=True la instrumentación del trabajo se devuelve en el resultado para sumarla en el proceso principal
+def ejecutar_trabajo(trabajo, en_pool=False):
+    extractor = extractores_con_paginas[trabajo.formulario]
+    if en_pool:
+        instrumentacion.limpiar()
+    try:
+        with instrumentacion.etapa(f"extraer_{trabajo.formulario}"):
+            datos, paginas = extractor(trabajo.ruta_pdf)
+        with instrumentacion.etapa("datos_declaracion"):
+            declaracion = datos_declaracion(trabajo.ruta_pdf)
+        resultado = ResultadoExtraccion(*trabajo, datos, None, declaracion=declaracion, paginas=paginas)
+    except Exception as e:
+        resultado = ResultadoExtraccion(*trabajo, None, f"{type(e).__name__}: {e}")
+    if en_pool:
+        resultado = resultado._replace(metricas=instrumentacion.exportar())
+    return resultado
+
+
+# Función para registrar un trabajo en el índice de documentos; devuelve su representante
+# Si no se puede calcular la huella el trabajo se extrae por su cuenta
+def representante_de(indice, trabajo):
+    try:
+        return indice.registrar(trabajo, huella_documento(trabajo.ruta_pdf))
+    except Exception as e:
+        logging.warning(f"No se pudo calcular la huella de '{trabajo.ruta_pdf}': {e}")
+        return trabajo
+
+
+# Función para ejecutar los trabajos en un ProcessPoolExecutor (max_workers=1 ejecuta en serie)
+# Los trabajos se envían a medida que llegan del generador, con un máximo de trabajos en vuelo
+# Cada documento se extrae una sola vez: las copias (mismos bytes o mismo texto) reciben el resultado de su representante
+def extraer_en_paralelo(trabajos, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    resultados = []
+    indice = IndiceDocumentos()
+    copias = []  # (trabajo, representante)
+
+    def unicos():
+        for trabajo in trabajos:
+            representante = representante_de(indice, trabajo)
+            if representante is trabajo:
+                yield trabajo
+            else:
+                copias.append((trabajo, representante))
+
+    if max_workers == 1:
+        resultados = [ejecutar_trabajo(trabajo) for trabajo in unicos()]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            en_vuelo = set()
+            for trabajo in unicos():
+                en_vuelo.add(executor.submit(ejecutar_trabajo, trabajo, True))
+                if len(en_vuelo) >= max_workers * 4:
+                    listos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    resultados.extend(futuro.result() for futuro in listos)
+            resultados.extend(futuro.result() for futuro in en_vuelo)
+
+    for resultado in resultados:
+        instrumentacion.combinar(resultado.metricas)
+        instrumentacion.contar("pdfs_extraidos")
+        if resultado.error:
+            instrumentacion.contar("pdfs_con_error")
+            logging.error(f"Error al extraer '{resultado.ruta_pdf}': {resultado.error}")
+
+    if copias:
+        por_trabajo = {TrabajoExtraccion(*resultado[:5]): resultado for resultado in resultados}
+        resultados.extend(copia_de_resultado(por_trabajo[representante], trabajo) for trabajo, representante in copias)
+        instrumentacion.contar("pdfs_duplicados", len(copias))
+    logging.info(
+        f"{len(resultados)} PDFs extraídos con {max_workers} procesos ({len(copias)} eran copias de otro documento)."
+    )
+    return resultados
+
+
+# Función para dar a una copia el resultado de su representante, con su propio cliente, periodo y ruta
+def copia_de_resultado(resultado, trabajo):
+    return ResultadoExtraccion(
+        *trabajo, resultado.datos, resultado.error, declaracion=resultado.declaracion, paginas=resultado.paginas
+    )
+
+
+# Función para ordenar los resultados como {cliente: {formulario: {mes: datos}}}
+# Si hay varias versiones del mismo periodo (original, sustitutivas, copias) se usa la que indique la regla
+# (REGLA_VERSION: reciente, original o sustitutiva)
+def agrupar_resultados(resultados, regla=None):
+    candidatos = {}
+    for resultado in resultados:
+        if resultado.error:
+            continue
+        candidatos.setdefault((resultado.cliente, resultado.formulario, resultado.mes), []).append(resultado)
+
+    agrupados = {}
+    for (cliente, formulario, mes), versiones in candidatos.items():
+        elegido = versiones[0] if len(versiones) == 1 else elegir_version(versiones, regla)
+        agrupados.setdefault(cliente, {}).setdefault(formulario, {})[mes] = elegido.datos
+    return agrupados
@@ -0,0 +1,134 @@
+# Description: Extractores de valores de los formularios 103, 104 y del talón resumen del ATS
+import logging
+from cache_pdf import cache_documentos
+from plantillas_formulario import leer_casilleros
+from instrumentacion import instrumentacion, medido
+from tokenizador_sri import retenciones_de_texto, totales_de_texto
+from lector_ats_xml import leer_ats_xml
+
+indices_a_buscar_103 = [
+    "302","303", "3030", "304", "304B", "307", "308", "309", "310", "311", "312", "312A", "3121",
+    "314", "319", "320", "322", "323", "324", "325", "326", "327", "328", "332", "332G",
+    "336", "337", "343", "344", "3440", "345", "346", "421"
+]  
+indices_a_buscar_104 = [
+    "500", "501", "502", "503", "505", "506", "507", "508", "510", "511", "512", "513", "515", "516", "517", "518",
+    "531", "532", "535", "540", "550", "721", "723", "725", "729","731"
+]
+
+# Encabezados de las secciones del talón resumen del ATS
+encabezado_retenciones = "RESUMEN DE RETENCIONES - AGENTE DE RETENCION"
+encabezado_compras = "COMPRAS"
+
+
+# Función para extraer valores según los índices de cada PDF
+def extraer_valores_indices(ruta_pdf, indices_buscados):
+    return extraer_valores_y_paginas(ruta_pdf, indices_buscados)[0]
+
+# Función para extraer los valores y la página (1 = primera) de cada código: (valores, {código: página})
+@medido("extraer_valores_indices")
+def extraer_valores_y_paginas(ruta_pdf, indices_buscados):
+    valores_encontrados = {indice: 0 for indice in indices_buscados}  # Inicializar con 0
+    paginas_encontradas = {}
+
+    try:
+        # Los códigos se leen en su posición de la plantilla de la versión del formulario; los que no
+        # coinciden se buscan con el índice de un solo escaneo (el primer PDF de cada versión es la referencia)
+        casilleros = leer_casilleros(ruta_pdf, indices_buscados)
+        instrumentacion.contar("codigos_encontrados", len(casilleros))
+        instrumentacion.contar("codigos_faltantes", len(set(indices_buscados)) - len(casilleros))
+        for indice, casillero in casilleros.items():
+            if casillero.siguiente is not None:
+                valor_extraido = casillero.siguiente.replace('.', ',')  # Reemplazar punto por coma
+
+                # Convertir a número si es posible
+                try:
+                    valor_extraido = float(valor_extraido.replace(',', '.'))  # Convertir a número
+                except ValueError:
+                    pass
+
+                valores_encontrados[indice] = valor_extraido
+                paginas_encontradas[indice] = casillero.pagina + 1
+    except Exception as e:
+        logging.error(f"Error al procesar el archivo PDF {ruta_pdf}: {e}")
+
+    return valores_encontrados, paginas_encontradas
+
+# Función para extraer códigos de retención y sus valores
+def extraer_codigos_retencion(pdf_path):
+    return retenciones_y_paginas(pdf_path)[0]
+
+# Función para extraer códigos de retención, sus valores y la página de cada código: (códigos, {código: página})
+@medido("extraer_codigos_retencion")
+def retenciones_y_paginas(pdf_path):
+    codigos_retencion = {}
+    paginas_codigos = {}
+
+    # Solo se extrae el texto completo de las páginas que contienen la sección
+    paginas = cache_documentos.paginas_con_seccion(pdf_path, encabezado_retenciones)
+    for pagina, texto in zip(paginas, cache_documentos.textos(pdf_path, paginas)):
+        for fila in retenciones_de_texto(texto, encabezado_retenciones):
+            instrumentacion.contar("lineas_tokenizadas")
+            codigos_retencion[fila.codigo] = fila.base
+            paginas_codigos[fila.codigo] = pagina + 1
+
+    return codigos_retencion, paginas_codigos
+
+# Función para extraer totales de compras
+def extraer_totales_compras(pdf_path):
+    return compras_y_pagina(pdf_path)[0]
+
+# Función para extraer totales de compras y la página de la que salen: (totales, página o None)
+@medido("extraer_totales_compras")
+def compras_y_pagina(pdf_path):
+
+    totales = []
+    pagina_totales = None
+    paginas = cache_documentos.paginas_con_seccion(pdf_path, encabezado_compras)
+    for pagina, texto in zip(paginas, cache_documentos.textos(pdf_path, paginas)):
+        if encabezado_compras in texto:
+            numeros = totales_de_texto(texto, encabezado_compras)
+            if numeros:
+                # Total de compras (tarifa 0% y tarifa 12%) y base no objeto de IVA
+                totales = numeros[:3]
+                pagina_totales = pagina + 1
+    return totales, pagina_totales
+
+# Extractores por tipo de formulario: reciben solo la ruta del PDF para poder ejecutarse en otro proceso
+def extraer_formulario_103(ruta_pdf):
+    return extraer_valores_indices(ruta_pdf, indices_a_buscar_103)
+
+def extraer_formulario_104(ruta_pdf):
+    return extraer_valores_indices(ruta_pdf, indices_a_buscar_104)
+
+# El ATS puede venir como talón resumen en PDF o como el XML que se sube al SRI (mismos datos, mismo formato)
+def extraer_ats(ruta_pdf):
+    return extraer_ats_con_paginas(ruta_pdf)[0]
+
+def extraer_formulario_103_con_paginas(ruta_pdf):
+    return extraer_valores_y_paginas(ruta_pdf, indices_a_buscar_103)
+
+def extraer_formulario_104_con_paginas(ruta_pdf):
+    return extraer_valores_y_paginas(ruta_pdf, indices_a_buscar_104)
+
+# Páginas del ATS: {"retenciones": {código: página}, "compras": página}; el XML no tiene páginas
+def extraer_ats_con_paginas(ruta_pdf):
+    if ruta_pdf.lower().endswith(".xml"):
+        return leer_ats_xml(ruta_pdf), {}
+    retenciones, paginas_retenciones = retenciones_y_paginas(ruta_pdf)
+    compras, pagina_compras = compras_y_pagina(ruta_pdf)
+    datos = {"retenciones": retenciones, "compras": compras}
+    return datos, {"retenciones": paginas_retenciones, "compras": pagina_compras}
+
+extractores_por_formulario = {
+    "103": extraer_formulario_103,
+    "104": extraer_formulario_104,
+    "ats": extraer_ats,
+}
+
+# Los mismos extractores devolviendo (datos, páginas), para guardar de qué página sale cada valor
+extractores_con_paginas = {
+    "103": extraer_formulario_103_con_paginas,
+    "104": extraer_formulario_104_con_paginas,
+    "ats": extraer_ats_con_paginas,
+}
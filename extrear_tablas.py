@@ -1,24 +1,14 @@
-import pdfplumber
-import re
+from cache_pdf import iterar_paginas
+from tokenizador_sri import retenciones_de_texto, totales_de_texto
 
 def extraer_codigos_retencion(pdf_path):
     codigos_retencion = {}
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for pagina in pdf.pages:
-            texto = pagina.extract_text()
-            if "RESUMEN DE RETENCIONES - AGENTE DE RETENCION" in texto:
-                seccion = texto.split("RESUMEN DE RETENCIONES - AGENTE DE RETENCION")[1]
-                lineas = seccion.strip().split("\n")
-
-                for linea in lineas:
-                    match = re.search(r"^(\d{3,4}[A-Z]?)\s+.*?\s+(\d[\d.,]*)\s+(\d[\d.,]*)$", linea)
-
-                    if match:
-                        codigo = match.group(1)
-                        base = float(match.group(2).replace(",", ""))
-                        valor = float(match.group(3).replace(",", ""))
-                        codigos_retencion[codigo] = {"base": base, "valor": valor}
+    # Una página a la vez: cada página se libera antes de analizar la siguiente
+    for _, texto in iterar_paginas(pdf_path, "texto"):
+        # Mismo tokenizador que extractores.py, así todos los scripts leen igual la sección
+        for fila in retenciones_de_texto(texto, "RESUMEN DE RETENCIONES - AGENTE DE RETENCION"):
+            codigos_retencion[fila.codigo] = {"base": fila.base, "valor": fila.valor}
 
     return codigos_retencion
 
@@ -26,39 +16,27 @@ def extraer_codigos_retencion(pdf_path):
 def extraer_totales_compras(pdf_path):
 
     totales = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for pagina in pdf.pages:
-            texto = pagina.extract_text()
-            if "COMPRAS" in texto:
-                seccion = texto.split("COMPRAS")[1]
-                lineas = seccion.strip().split("\n")
-
-                for linea in lineas:
-                    if "TOTAL:" in linea:
-                        numeros = re.findall(r"(\d{1,3}(?:,\d{3})*(?:\.\d+)|\d+\.\d+)", linea)
-                        if len(numeros) >= 4:
-                            # Total de compras
-                            totales_0 = float(numeros[0].replace(",", ""))
-                            totales_12 = float(numeros[1].replace(",", ""))
-                            # Total de IVA
-                            totales_no_iva = float(numeros[2].replace(",", ""))
-                            totales = [totales_0, totales_12, totales_no_iva]
-                        break
+    for _, texto in iterar_paginas(pdf_path, "texto"):
+        numeros = totales_de_texto(texto, "COMPRAS")
+        if numeros:
+            # Total de compras (tarifa 0% y tarifa 12%) y base no objeto de IVA
+            totales = numeros[:3]
     return totales
 
 
 # === EJECUCIÓN ===
-ruta_pdf = "./impuestos/ats/3.pdf"
-
-# 1. Extraer Retenciones
-retenciones = extraer_codigos_retencion(ruta_pdf)
-print("🧾 Retenciones encontradas:")
-for cod, datos in retenciones.items():
-    print(f"  Código: {cod} | Base: {datos['base']} | Valor: {datos['valor']}")
-
-# 2. Extraer Totales COMPRAS
-compras_totales = extraer_totales_compras(ruta_pdf)
-print("\n🛒 Totales de COMPRAS:")
-print(compras_totales)
-for total in compras_totales:
-    print(total)  
+if __name__ == "__main__":
+    ruta_pdf = "./impuestos/ats/3.pdf"
+
+    # 1. Extraer Retenciones
+    retenciones = extraer_codigos_retencion(ruta_pdf)
+    print("🧾 Retenciones encontradas:")
+    for cod, datos in retenciones.items():
+        print(f"  Código: {cod} | Base: {datos['base']} | Valor: {datos['valor']}")
+
+    # 2. Extraer Totales COMPRAS
+    compras_totales = extraer_totales_compras(ruta_pdf)
+    print("\n🛒 Totales de COMPRAS:")
+    print(compras_totales)
+    for total in compras_totales:
+        print(total)
@@ -1,38 +1,6 @@
-import pdfplumber
-import xlwings as xw
 import os
 import logging
-
-# Configuración de logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Función para extraer valores según los índices de cada PDF
-def extraer_valores_indices(ruta_pdf, indices_buscados):
-    valores_encontrados = {indice: 0 for indice in indices_buscados}  # Inicializar con 0
-
-    try:
-        with pdfplumber.open(ruta_pdf) as pdf:
-            for pagina in pdf.pages:
-                palabras = pagina.extract_words()
-
-                for i in range(len(palabras)):
-                    palabra_actual = palabras[i]['text']
-
-                    if palabra_actual in valores_encontrados:
-                        if i + 1 < len(palabras):
-                            valor_extraido = palabras[i + 1]['text'].replace('.', ',')  # Reemplazar punto por coma
-                            
-                            # Convertir a número si es posible
-                            try:
-                                valor_extraido = float(valor_extraido.replace(',', '.'))  # Convertir a número
-                            except ValueError:
-                                pass  
-
-                            valores_encontrados[palabra_actual] = valor_extraido
-    except Exception as e:
-        logging.error(f"Error al procesar el archivo PDF {ruta_pdf}: {e}")
-
-    return valores_encontrados
+from extractores import extraer_valores_indices
 
 # Función para convertir el número de mes a la letra de columna correspondiente
 def mes_a_columna(mes):
@@ -42,6 +10,8 @@ def mes_a_columna(mes):
 # Función para escribir datos en la plantilla Excel
 # Función para escribir datos en la plantilla Excel
 def escribir_en_plantilla(datos, mes, ruta_plantilla, ruta_salida, ubicaciones):
+    import xlwings as xw  # Requiere Excel; solo se carga al escribir
+
     try:
         # Verificar si el archivo de salida ya existe
         if os.path.exists(ruta_salida):
@@ -119,12 +89,16 @@ ubicaciones_celdas = {
     "421": ("103 VS ATS", "C41")
 }
 
-# Procesar los 12 archivos PDF (uno por mes)
-for mes in range(1, 13):
-    ruta_pdf = os.path.join(".", "pdf", f"{mes}.pdf")
+if __name__ == "__main__":
+    # Configuración de logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # Procesar los 12 archivos PDF (uno por mes)
+    for mes in range(1, 13):
+        ruta_pdf = os.path.join(".", "pdf", f"{mes}.pdf")
 
-    if os.path.exists(ruta_pdf):
-        valores_extraidos = extraer_valores_indices(ruta_pdf, indices_a_buscar)
-        escribir_en_plantilla(valores_extraidos, mes, ruta_plantilla, ruta_excel_salida, ubicaciones_celdas)
-    else:
-        logging.warning(f"No se encontró el archivo: {ruta_pdf}")
\ No newline at end of file
+        if os.path.exists(ruta_pdf):
+            valores_extraidos = extraer_valores_indices(ruta_pdf, indices_a_buscar)
+            escribir_en_plantilla(valores_extraidos, mes, ruta_plantilla, ruta_excel_salida, ubicaciones_celdas)
+        else:
+            logging.warning(f"No se encontró el archivo: {ruta_pdf}")
@@ -0,0 +1,153 @@
+# Description: Modo incremental: manifiesto de PDFs ya extraídos y de celdas ya escritas en el libro
+import os
+import json
+import hashlib
+import logging
+
+from escritor_excel import columna_a_letra, celda_a_coordenadas
+from extraccion_paralela import ResultadoExtraccion
+from lector_libro import leer_celdas
+
+version_manifiesto = 1
+
+
+# Función para calcular el hash del contenido de un archivo
+def hash_archivo(ruta, tam_bloque=1 << 20):
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(tam_bloque), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+# Función para obtener la huella rápida de un archivo (fecha de modificación + tamaño)
+def huella_archivo(ruta):
+    info = os.stat(ruta)
+    return [info.st_mtime_ns, info.st_size]
+
+
+# Manifiesto guardado junto al libro de salida: qué PDF produjo qué datos y qué valor tiene cada celda escrita
+class Manifiesto:
+    def __init__(self, ruta_manifiesto, ruta_salida):
+        self.ruta_manifiesto = ruta_manifiesto
+        self.ruta_salida = ruta_salida
+        self.pdfs = {}     # ruta absoluta -> {"huella", "hash", "cliente", "formulario", "anio", "mes", "datos"}
+        self.celdas = {}   # nombre_hoja -> {"C44": valor}
+        self.libro = None  # huella del libro de salida tras la última escritura
+        self.vistos = set()
+        self.cargar()
+
+    def cargar(self):
+        if not os.path.exists(self.ruta_manifiesto):
+            return
+        try:
+            with open(self.ruta_manifiesto, encoding="utf-8") as archivo:
+                contenido = json.load(archivo)
+        except Exception as e:
+            logging.warning(f"No se pudo leer el manifiesto '{self.ruta_manifiesto}'; se procesará todo: {e}")
+            return
+        if contenido.get("version") != version_manifiesto:
+            return
+        self.pdfs = contenido.get("pdfs", {})
+        self.celdas = contenido.get("celdas", {})
+        self.libro = contenido.get("libro")
+
+    def guardar(self):
+        # Los PDFs que ya no aparecieron en esta corrida se eliminan del manifiesto
+        self.pdfs = {ruta: entrada for ruta, entrada in self.pdfs.items() if ruta in self.vistos}
+        contenido = {"version": version_manifiesto, "pdfs": self.pdfs, "celdas": self.celdas, "libro": self.libro}
+        temporal = f"{self.ruta_manifiesto}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(contenido, archivo, ensure_ascii=False, indent=1)
+        os.replace(temporal, self.ruta_manifiesto)
+
+    # Función para saber si un PDF no cambió desde la corrida anterior (huella o, si no coincide, hash)
+    def sin_cambios(self, ruta_pdf):
+        entrada = self.pdfs.get(os.path.abspath(ruta_pdf))
+        if entrada is None:
+            return False
+        huella = huella_archivo(ruta_pdf)
+        if entrada["huella"] == huella:
+            return True
+        if entrada["hash"] == hash_archivo(ruta_pdf):
+            entrada["huella"] = huella
+            return True
+        return False
+
+    # Separar los trabajos en resultados reutilizados del manifiesto y trabajos que hay que extraer
+    def separar_trabajos(self, trabajos):
+        reutilizados = []
+        pendientes = []
+        for trabajo in trabajos:
+            ruta = os.path.abspath(trabajo.ruta_pdf)
+            self.vistos.add(ruta)
+            if self.sin_cambios(trabajo.ruta_pdf):
+                reutilizados.append(ResultadoExtraccion(*trabajo, self.pdfs[ruta]["datos"], None))
+            else:
+                pendientes.append(trabajo)
+        logging.info(f"Modo incremental: {len(reutilizados)} PDFs sin cambios, {len(pendientes)} por extraer.")
+        return reutilizados, pendientes
+
+    def registrar_resultados(self, resultados):
+        for resultado in resultados:
+            if resultado.error:
+                continue
+            ruta = os.path.abspath(resultado.ruta_pdf)
+            self.vistos.add(ruta)
+            self.pdfs[ruta] = {
+                "huella": huella_archivo(resultado.ruta_pdf),
+                "hash": hash_archivo(resultado.ruta_pdf),
+                "cliente": resultado.cliente,
+                "formulario": resultado.formulario,
+                "anio": resultado.anio,
+                "mes": resultado.mes,
+                "datos": resultado.datos,
+            }
+
+    # Quitar de la sesión las celdas cuyo valor ya está escrito en el libro
+    # Si el libro cambió por fuera, sus valores actuales se leen en modo solo lectura (solo las celdas de la sesión)
+    def filtrar_escrituras(self, sesion):
+        if not os.path.exists(self.ruta_salida):
+            logging.info("El libro de salida no existe; se escribirán todas las celdas.")
+            return
+        if self.libro == huella_archivo(self.ruta_salida):
+            existentes = {
+                nombre_hoja: {celda_a_coordenadas(celda): valor for celda, valor in celdas.items()}
+                for nombre_hoja, celdas in self.celdas.items()
+            }
+        else:
+            try:
+                existentes = leer_celdas(self.ruta_salida, sesion.escrituras)
+            except Exception as e:
+                logging.warning(f"No se pudo leer el libro '{self.ruta_salida}'; se escribirán todas las celdas: {e}")
+                return
+            logging.info("El libro de salida cambió desde la última corrida; se compara con sus valores actuales.")
+            for nombre_hoja, celdas in existentes.items():
+                self.celdas.setdefault(nombre_hoja, {}).update(
+                    {f"{columna_a_letra(columna)}{fila}": valor for (fila, columna), valor in celdas.items()}
+                )
+
+        total_antes = sesion.total_celdas()
+        for nombre_hoja in list(sesion.escrituras):
+            previas = existentes.get(nombre_hoja, {})
+            celdas = {
+                coordenadas: valor for coordenadas, valor in sesion.escrituras[nombre_hoja].items()
+                if coordenadas not in previas or previas[coordenadas] != valor
+            }
+            if celdas:
+                sesion.escrituras[nombre_hoja] = celdas
+            else:
+                del sesion.escrituras[nombre_hoja]
+        logging.info(f"Modo incremental: {sesion.total_celdas()} de {total_antes} celdas cambiaron.")
+
+    # Registrar las celdas que la sesión va a escribir (llamar antes de sesion.guardar())
+    def registrar_escrituras(self, sesion):
+        for nombre_hoja, celdas in sesion.escrituras.items():
+            previas = self.celdas.setdefault(nombre_hoja, {})
+            for (fila, columna), valor in celdas.items():
+                previas[f"{columna_a_letra(columna)}{fila}"] = valor
+
+    # Registrar la huella del libro después de guardarlo
+    def registrar_libro(self):
+        if os.path.exists(self.ruta_salida):
+            self.libro = huella_archivo(self.ruta_salida)
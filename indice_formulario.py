@@ -0,0 +1,96 @@
+# Description: Índice de casilleros de los formularios del SRI construido en una sola pasada
+import re
+from collections import namedtuple, OrderedDict
+
+from cache_pdf import cache_documentos, clave_documento, funciones_liberar_memoria
+from instrumentacion import instrumentacion
+
+# Un casillero del formulario: página, posición del código y el texto que le sigue (su valor)
+Casillero = namedtuple("Casillero", ["pagina", "x0", "top", "siguiente"])
+
+patron_codigo = re.compile(r"^\d{3,4}[A-Z]?$")
+patron_valor = re.compile(r"^-?[\d.,]+$")
+tolerancia_linea = 3  # Diferencia máxima de 'top' para considerar dos palabras en la misma línea
+
+
+# Función para saber si la palabra siguiente es el valor del casillero (misma línea, a la derecha y numérica)
+def es_valor_del_casillero(palabra_codigo, palabra_siguiente):
+    return (
+        abs(palabra_siguiente['top'] - palabra_codigo['top']) <= tolerancia_linea
+        and palabra_siguiente['x0'] >= palabra_codigo['x0']
+        and patron_valor.match(palabra_siguiente['text']) is not None
+    )
+
+
+# Índice código -> Casillero que se va llenando a medida que se necesitan códigos nuevos
+class IndiceFormulario:
+    def __init__(self, paginas_palabras):
+        self.paginas = paginas_palabras
+        self.casilleros = {}
+        self.pagina_actual = 0
+        self.palabra_actual = 0
+
+    def completo(self):
+        return self.pagina_actual >= len(self.paginas)
+
+    # Avanzar el escaneo hasta resolver todos los `pendientes` (o hasta terminar el documento)
+    def escanear(self, pendientes):
+        while pendientes and not self.completo():
+            palabras = self.paginas[self.pagina_actual]
+            i = self.palabra_actual
+
+            inicio = i
+            while i < len(palabras):
+                palabra = palabras[i]
+                texto = palabra['text']
+                i += 1
+
+                if not patron_codigo.match(texto):
+                    continue
+
+                siguiente = palabras[i] if i < len(palabras) else None
+                if texto not in self.casilleros:
+                    self.casilleros[texto] = Casillero(
+                        self.pagina_actual, palabra['x0'], palabra['top'],
+                        siguiente['text'] if siguiente else None
+                    )
+                    pendientes.discard(texto)
+
+                # El valor del casillero se consume para no confundirlo con otro código
+                if siguiente is not None and es_valor_del_casillero(palabra, siguiente):
+                    i += 1
+
+                if not pendientes:
+                    break
+
+            instrumentacion.contar("palabras_escaneadas", i - inicio)
+            if i >= len(palabras):
+                self.pagina_actual += 1
+                self.palabra_actual = 0
+            else:
+                self.palabra_actual = i
+
+    # Devolver los casilleros encontrados de la lista pedida, escaneando solo lo que falte
+    def buscar(self, indices_buscados):
+        pendientes = {indice for indice in indices_buscados if indice not in self.casilleros}
+        self.escanear(pendientes)
+        return {indice: self.casilleros[indice] for indice in indices_buscados if indice in self.casilleros}
+
+
+indices_por_documento = OrderedDict()
+max_indices = 64
+funciones_liberar_memoria.append(indices_por_documento.clear)
+
+
+# Función para obtener (o construir) el índice de un PDF; se reutiliza entre listas de índices distintas
+def obtener_indice(ruta_pdf):
+    clave = clave_documento(ruta_pdf)
+    indice = indices_por_documento.get(clave)
+    if indice is None:
+        indice = IndiceFormulario(cache_documentos.palabras(ruta_pdf))
+        indices_por_documento[clave] = indice
+    indices_por_documento.move_to_end(clave)
+
+    while len(indices_por_documento) > max_indices:
+        indices_por_documento.popitem(last=False)
+    return indice
@@ -0,0 +1,125 @@
+# Description: Contadores y tiempos por etapa de una corrida (tabla resumen, JSON y traza de Chrome)
+import os
+import json
+import time
+import logging
+import functools
+from contextlib import contextmanager
+
+max_eventos = 200000  # Límite de eventos guardados para la traza (los contadores no tienen límite)
+
+
+# Acumula tiempos por etapa, contadores y (opcionalmente) eventos para la traza de Chrome
+class Instrumentacion:
+    def __init__(self, registrar_eventos=False):
+        self.registrar_eventos = registrar_eventos
+        self.limpiar()
+
+    def limpiar(self):
+        self.tiempos = {}     # etapa -> [segundos, llamadas]
+        self.contadores = {}  # nombre -> cantidad
+        self.eventos = []     # eventos "X" de la traza: {"name", "ts", "dur", "pid", "tid"}
+
+    def contar(self, nombre, cantidad=1):
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def registrar_tiempo(self, etapa, segundos, inicio_epoca=None):
+        acumulado = self.tiempos.setdefault(etapa, [0.0, 0])
+        acumulado[0] += segundos
+        acumulado[1] += 1
+        if self.registrar_eventos and inicio_epoca is not None and len(self.eventos) < max_eventos:
+            self.eventos.append({
+                "name": etapa, "ph": "X", "ts": int(inicio_epoca * 1e6), "dur": int(segundos * 1e6),
+                "pid": os.getpid(), "tid": 0,
+            })
+
+    # Context manager para medir un bloque: `with instrumentacion.etapa("guardar_libro"): ...`
+    @contextmanager
+    def etapa(self, nombre):
+        inicio_epoca = time.time()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_tiempo(nombre, time.perf_counter() - inicio, inicio_epoca)
+
+    # Decorador para medir cada llamada a una función (por defecto la etapa lleva el nombre de la función)
+    def medido(self, nombre=None):
+        def decorador(funcion):
+            etapa = nombre or funcion.__name__
+
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                with self.etapa(etapa):
+                    return funcion(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    # Foto de lo acumulado, con tipos simples para poder viajar entre procesos
+    def exportar(self):
+        return {
+            "tiempos": {etapa: list(valores) for etapa, valores in self.tiempos.items()},
+            "contadores": dict(self.contadores),
+            "eventos": list(self.eventos),
+        }
+
+    # Sumar lo acumulado en otro proceso (el resultado de exportar())
+    def combinar(self, metricas):
+        if not metricas:
+            return
+        for etapa, (segundos, llamadas) in metricas.get("tiempos", {}).items():
+            acumulado = self.tiempos.setdefault(etapa, [0.0, 0])
+            acumulado[0] += segundos
+            acumulado[1] += llamadas
+        for nombre, cantidad in metricas.get("contadores", {}).items():
+            self.contar(nombre, cantidad)
+        if self.registrar_eventos:
+            espacio = max_eventos - len(self.eventos)
+            self.eventos.extend(metricas.get("eventos", [])[:espacio])
+
+    # Tabla de texto con los tiempos (incluyen las etapas anidadas) y los contadores
+    def resumen(self):
+        lineas = [f"{'etapa':<34}{'llamadas':>10}{'total (s)':>12}{'media (ms)':>12}"]
+        for etapa, (segundos, llamadas) in sorted(self.tiempos.items(), key=lambda item: -item[1][0]):
+            lineas.append(f"{etapa:<34}{llamadas:>10}{segundos:>12.3f}{segundos / llamadas * 1000:>12.2f}")
+        if self.contadores:
+            lineas.append("")
+            lineas.append(f"{'contador':<34}{'cantidad':>10}")
+            for nombre, cantidad in sorted(self.contadores.items()):
+                lineas.append(f"{nombre:<34}{cantidad:>10}")
+        return "\n".join(lineas)
+
+    def guardar_json(self, ruta):
+        contenido = {
+            "tiempos": {
+                etapa: {"segundos": round(segundos, 6), "llamadas": llamadas}
+                for etapa, (segundos, llamadas) in self.tiempos.items()
+            },
+            "contadores": self.contadores,
+        }
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump(contenido, archivo, ensure_ascii=False, indent=1)
+
+    # Traza para chrome://tracing o https://ui.perfetto.dev (un carril por proceso)
+    def guardar_traza_chrome(self, ruta):
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump({"traceEvents": self.eventos, "displayTimeUnit": "ms"}, archivo)
+
+    # Mostrar el resumen en el log y escribir los archivos pedidos por variables de entorno
+    def reportar(self):
+        if not self.tiempos and not self.contadores:
+            return
+        logging.info("Resumen de la corrida:\n" + self.resumen())
+        if os.environ.get("INSTRUMENTACION_JSON"):
+            self.guardar_json(os.environ["INSTRUMENTACION_JSON"])
+            logging.info(f"Métricas guardadas en '{os.environ['INSTRUMENTACION_JSON']}'.")
+        if os.environ.get("INSTRUMENTACION_TRAZA"):
+            self.guardar_traza_chrome(os.environ["INSTRUMENTACION_TRAZA"])
+            logging.info(f"Traza guardada en '{os.environ['INSTRUMENTACION_TRAZA']}'.")
+
+
+# Instancia compartida; INSTRUMENTACION_TRAZA activa el registro de eventos para la traza
+instrumentacion = Instrumentacion(registrar_eventos=bool(os.environ.get("INSTRUMENTACION_TRAZA")))
+medido = instrumentacion.medido
+etapa = instrumentacion.etapa
+contar = instrumentacion.contar
@@ -0,0 +1,96 @@
+# Description: Lectura del ATS en XML (el archivo que recibe el SRI) con iterparse, como alternativa al talón resumen en PDF
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from instrumentacion import instrumentacion, medido
+
+# Datos de la cabecera del ATS: RUC del informante, razón social, año y mes del periodo
+CabeceraATS = namedtuple("CabeceraATS", ["ruc", "razon_social", "anio", "mes"])
+
+etiqueta_raiz = "iva"
+secciones = {"compras", "ventas", "ventasEstablecimiento", "exportaciones", "recap", "fideicomisos", "anulados",
+             "rendFinancieros"}
+# Comprobantes de las secciones que no se suman; se vacían al cerrarse igual que los de compras
+detalles_otras_secciones = {"detalleVentas", "ventaEst", "detalleExportaciones", "detalleRecap", "detalleFideicomisos",
+                            "detalleAnulados", "detalleRendFinancieros"}
+
+# Bases de cada comprobante de compra en el orden del TOTAL de COMPRAS del talón:
+# tarifa 0%, tarifa diferente de 0% y no objeto de IVA
+campos_bases_compras = ("baseImponible", "baseImpGrav", "baseNoGraIva")
+tipos_nota_credito = {"04"}  # El talón resta las notas de crédito del total de compras
+
+
+# Función para convertir un valor del XML a float (vacío o ausente cuenta como 0)
+def numero_xml(texto):
+    return float(texto) if texto else 0.0
+
+
+# Función para leer solo la cabecera del ATS (se detiene en la primera sección); None si no es un ATS
+def cabecera_ats_xml(ruta_xml):
+    valores = {}
+    with open(ruta_xml, "rb") as archivo:
+        for evento, elemento in ET.iterparse(archivo, events=("start", "end")):
+            if evento == "start":
+                if not valores and elemento.tag != etiqueta_raiz:
+                    return None
+                valores.setdefault("raiz", elemento.tag)
+                if elemento.tag in secciones:
+                    break
+            else:
+                valores[elemento.tag] = (elemento.text or "").strip()
+
+    mes, anio = valores.get("Mes", ""), valores.get("Anio", "")
+    return CabeceraATS(
+        valores.get("IdInformante") or None, valores.get("razonSocial") or None,
+        int(anio) if anio.isdecimal() else None, int(mes) if mes.isdecimal() else None,
+    )
+
+
+# Función para sumar un comprobante de compra a los totales (bases) y a las retenciones por código
+def sumar_comprobante(detalle, compras, retenciones):
+    signo = -1 if detalle.findtext("tipoComprobante") in tipos_nota_credito else 1
+    for posicion, campo in enumerate(campos_bases_compras):
+        compras[posicion] += signo * numero_xml(detalle.findtext(campo))
+    for retencion in detalle.iterfind("air/detalleAir"):
+        codigo = (retencion.findtext("codRetAir") or "").strip()
+        if codigo:
+            retenciones[codigo] = retenciones.get(codigo, 0.0) + numero_xml(retencion.findtext("baseImpAir"))
+
+
+# Función para leer retenciones y totales de compras del ATS en XML en una sola pasada
+# Devuelve lo mismo que extraer_ats con el talón en PDF: {"retenciones": {código: base}, "compras": [tarifa 0%,
+# tarifa diferente de 0%, no objeto de IVA]}. Cada comprobante se vacía apenas se suma, así el árbol no crece
+# con el XML (solo queda el elemento vacío de cada comprobante hasta que se cierra su sección)
+@medido()
+def leer_ats_xml(ruta_xml):
+    retenciones = {}
+    compras = [0.0] * len(campos_bases_compras)
+    comprobantes = 0
+
+    with open(ruta_xml, "rb") as archivo:
+        for _, elemento in ET.iterparse(archivo, events=("end",)):
+            etiqueta = elemento.tag
+            if etiqueta == "detalleCompras":
+                sumar_comprobante(elemento, compras, retenciones)
+                comprobantes += 1
+                elemento.clear()
+            elif etiqueta in detalles_otras_secciones or etiqueta in secciones:
+                elemento.clear()
+            elif etiqueta == etiqueta_raiz:
+                break
+        else:
+            raise ValueError(f"'{ruta_xml}' no es un ATS (falta la raíz <{etiqueta_raiz}>)")
+
+    instrumentacion.contar("comprobantes_ats_xml", comprobantes)
+    return {
+        "retenciones": {codigo: round(valor, 2) for codigo, valor in sorted(retenciones.items())},
+        "compras": [round(valor, 2) for valor in compras],
+    }
+
+
+# Mismas firmas que los extractores del talón en PDF, para usarlos como `extractor_func` con el XML
+def extraer_codigos_retencion_xml(ruta_xml):
+    return leer_ats_xml(ruta_xml)["retenciones"]
+
+def extraer_totales_compras_xml(ruta_xml):
+    return leer_ats_xml(ruta_xml)["compras"]
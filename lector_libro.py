@@ -0,0 +1,196 @@
+# Description: Lectura rápida de rangos del libro de salida (solo lectura, en streaming), sin cargarlo completo ni abrir Excel
+import sys
+import json
+import logging
+import argparse
+from collections import namedtuple
+
+from escritor_excel import celda_a_coordenadas, columna_a_letra
+from diseno_plantilla import plan_de_plantilla
+from instrumentacion import instrumentacion, medido
+
+# Rango rectangular de una hoja, con filas y columnas de inicio y fin incluidas
+RangoHoja = namedtuple("RangoHoja", ["hoja", "fila_inicio", "columna_inicio", "fila_fin", "columna_fin"])
+
+# Diferencia entre el valor que tiene una celda en el libro y el que se va a escribir
+DiferenciaCelda = namedtuple("DiferenciaCelda", ["hoja", "celda", "anterior", "nuevo"])
+
+
+# Función para crear un rango a partir de una referencia tipo "C10:AJ44" (o una sola celda, "C10")
+def rango_hoja(hoja, referencia):
+    inicio, _, fin = referencia.partition(":")
+    fila_inicio, columna_inicio = celda_a_coordenadas(inicio)
+    fila_fin, columna_fin = celda_a_coordenadas(fin or inicio)
+    return RangoHoja(
+        hoja, min(fila_inicio, fila_fin), min(columna_inicio, columna_fin),
+        max(fila_inicio, fila_fin), max(columna_inicio, columna_fin),
+    )
+
+
+# Función para obtener el rango que cubre cada sección del plan: {nombre de la sección: RangoHoja}
+def rangos_del_plan(planes):
+    rangos = {}
+    for plan in planes:
+        esquinas = [
+            (fila, columna, fila + posiciones.shape[0] - 1, columna + posiciones.shape[1] - 1)
+            for fila, columna, posiciones in plan.bloques
+        ]
+        rangos[plan.nombre] = RangoHoja(
+            plan.hoja, min(esquina[0] for esquina in esquinas), min(esquina[1] for esquina in esquinas),
+            max(esquina[2] for esquina in esquinas), max(esquina[3] for esquina in esquinas),
+        )
+    return rangos
+
+
+# Función para leer rangos de un libro como matrices (numpy, dtype object; None en las celdas vacías)
+# El libro se abre en modo solo lectura y cada hoja se recorre una sola vez, solo entre las filas y columnas
+# que cubren sus rangos; las hojas que no se piden no se leen. Devuelve {rango: matriz}
+@medido()
+def leer_rangos(ruta_libro, rangos):
+    import numpy as np
+    import openpyxl
+
+    por_hoja = {}
+    for rango in rangos:
+        por_hoja.setdefault(rango.hoja, []).append(rango)
+
+    matrices = {}
+    wb = openpyxl.load_workbook(ruta_libro, read_only=True)
+    try:
+        for nombre_hoja, rangos_hoja in por_hoja.items():
+            fila_inicio = min(rango.fila_inicio for rango in rangos_hoja)
+            columna_inicio = min(rango.columna_inicio for rango in rangos_hoja)
+            fila_fin = max(rango.fila_fin for rango in rangos_hoja)
+            columna_fin = max(rango.columna_fin for rango in rangos_hoja)
+            valores = np.full((fila_fin - fila_inicio + 1, columna_fin - columna_inicio + 1), None, dtype=object)
+
+            if nombre_hoja in wb.sheetnames:
+                filas = wb[nombre_hoja].iter_rows(
+                    min_row=fila_inicio, max_row=fila_fin, min_col=columna_inicio, max_col=columna_fin,
+                    values_only=True,
+                )
+                for posicion, fila in enumerate(filas):
+                    valores[posicion, :len(fila)] = list(fila)
+            else:
+                logging.warning(f"El libro '{ruta_libro}' no tiene la hoja '{nombre_hoja}'.")
+
+            for rango in rangos_hoja:
+                matrices[rango] = valores[
+                    rango.fila_inicio - fila_inicio:rango.fila_fin - fila_inicio + 1,
+                    rango.columna_inicio - columna_inicio:rango.columna_fin - columna_inicio + 1,
+                ]
+    finally:
+        wb.close()
+
+    instrumentacion.contar("rangos_leidos", len(matrices))
+    return matrices
+
+
+# Función para recortar de la matriz leída de un rango el bloque del plan que empieza en (fila, columna)
+def matriz_de_bloque(matriz, rango, fila, columna, posiciones):
+    filas, columnas = posiciones.shape
+    fila_relativa, columna_relativa = fila - rango.fila_inicio, columna - rango.columna_inicio
+    return matriz[fila_relativa:fila_relativa + filas, columna_relativa:columna_relativa + columnas]
+
+
+# Función para leer celdas sueltas ({hoja: [(fila, columna)]}, p. ej. SesionLibro.escrituras) con un rango por hoja
+# Devuelve {hoja: {(fila, columna): valor}}
+def leer_celdas(ruta_libro, celdas_por_hoja):
+    rangos = {}
+    for nombre_hoja, celdas in celdas_por_hoja.items():
+        if celdas:
+            filas, columnas = zip(*celdas)
+            rangos[nombre_hoja] = RangoHoja(nombre_hoja, min(filas), min(columnas), max(filas), max(columnas))
+    matrices = leer_rangos(ruta_libro, list(rangos.values()))
+    return {
+        nombre_hoja: {
+            (fila, columna): matrices[rango][fila - rango.fila_inicio, columna - rango.columna_inicio]
+            for fila, columna in celdas_por_hoja[nombre_hoja]
+        }
+        for nombre_hoja, rango in rangos.items()
+    }
+
+
+# Función para leer las celdas que escribe el plan: {hoja: {(fila, columna): valor}}, igual que SesionLibro.escrituras
+def leer_celdas_del_plan(ruta_libro, planes):
+    celdas_por_hoja = {}
+    for plan in planes:
+        celdas = celdas_por_hoja.setdefault(plan.hoja, [])
+        for fila, columna, posiciones in plan.bloques:
+            celdas.extend((fila + i, columna + j) for i in range(posiciones.shape[0]) for j in range(posiciones.shape[1]))
+    return leer_celdas(ruta_libro, celdas_por_hoja)
+
+
+# Función para leer de un libro ya escrito los datos de sus secciones como {formulario: {mes: datos}}
+# Es lo inverso de aplicar_diseno: sirve para comparar o combinar libros anteriores sin volver a leer los PDFs
+def datos_del_libro(ruta_libro, planes):
+    import numpy as np
+
+    rangos = rangos_del_plan(planes)
+    matrices = leer_rangos(ruta_libro, list(rangos.values()))
+    datos = {}
+    for plan in planes:
+        # Matriz anual códigos × meses, igual que la que arma matriz_anual para escribir
+        anual = np.full(len(plan.claves) * plan.meses, None, dtype=object)
+        for fila, columna, posiciones in plan.bloques:
+            bloque = matriz_de_bloque(matrices[rangos[plan.nombre]], rangos[plan.nombre], fila, columna, posiciones)
+            anual[posiciones.ravel()] = bloque.ravel()
+        anual = anual.reshape(len(plan.claves), plan.meses).tolist()
+
+        # Las secciones que vienen de una lista (p. ej. compras del ATS) vuelven a ser lista
+        es_lista = plan.claves == [str(posicion) for posicion in range(len(plan.claves))]
+        for mes in range(1, plan.meses + 1):
+            valores = {clave: anual[posicion][mes - 1] for posicion, clave in enumerate(plan.claves)}
+            if all(valor is None for valor in valores.values()):
+                continue
+            datos_mes = datos.setdefault(plan.formulario, {}).setdefault(mes, {})
+            if es_lista:
+                valores = [valores[clave] for clave in plan.claves]
+            if plan.campo is not None:
+                datos_mes[plan.campo] = valores
+            else:
+                datos_mes.update(valores)
+    return datos
+
+
+# Función para combinar datos ({formulario: {mes: datos}}): los nuevos reemplazan mes a mes a los anteriores
+def combinar_datos(anteriores, nuevos):
+    combinados = {formulario: dict(meses) for formulario, meses in anteriores.items()}
+    for formulario, meses in nuevos.items():
+        combinados.setdefault(formulario, {}).update(meses)
+    return combinados
+
+
+# Función para comparar las escrituras pendientes ({hoja: {(fila, columna): valor}}) con lo que ya tiene el libro
+def diferencias(escrituras, existentes):
+    return [
+        DiferenciaCelda(hoja, f"{columna_a_letra(columna)}{fila}", existentes.get(hoja, {}).get((fila, columna)), valor)
+        for hoja, celdas in escrituras.items()
+        for (fila, columna), valor in sorted(celdas.items())
+        if existentes.get(hoja, {}).get((fila, columna)) != valor
+    ]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Lee (o compara) las secciones del diseño en libros ya escritos.")
+    parser.add_argument("libro", help="libro de salida a leer")
+    parser.add_argument("--contra", help="otro libro: muestra las celdas de las secciones que difieren")
+    parser.add_argument("--plantilla", default="./pdf/plantilla_1.xlsx", help="plantilla con su .diseno.json")
+    argumentos = parser.parse_args()
+
+    planes = plan_de_plantilla(argumentos.plantilla)
+    if not argumentos.contra:
+        print(json.dumps(datos_del_libro(argumentos.libro, planes), ensure_ascii=False, indent=2, default=str))
+        return
+
+    cambios = diferencias(leer_celdas_del_plan(argumentos.contra, planes),
+                          leer_celdas_del_plan(argumentos.libro, planes))
+    for cambio in cambios:
+        print(f"{cambio.hoja}!{cambio.celda}: {cambio.anterior!r} -> {cambio.nuevo!r}")
+    logging.info(f"{len(cambios)} celdas distintas entre '{argumentos.libro}' y '{argumentos.contra}'.")
+    sys.exit(1 if cambios else 0)
+
+
+if __name__ == "__main__":
+    main()
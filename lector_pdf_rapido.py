@@ -0,0 +1,169 @@
+# Description: Lectura rápida de palabras y texto crudo de PDFs digitales del SRI directamente con pdfminer (sin el layout de pdfplumber)
+from itertools import groupby
+
+from pdfminer.pdfdevice import PDFDevice, PDFTextDevice
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+from pdfminer.utils import apply_matrix_rect
+
+from instrumentacion import instrumentacion
+
+# Mismas tolerancias y ligaduras que usa pdfplumber en extract_words()
+tolerancia_x = 3
+tolerancia_y = 3
+ligaduras = {"ﬀ": "ff", "ﬃ": "ffi", "ﬄ": "ffl", "ﬁ": "fi", "ﬂ": "fl", "ﬆ": "st", "ﬅ": "st"}
+
+
+# Dispositivo de pdfminer que solo guarda (texto, x0, top, x1, bottom) de cada carácter de la página
+# Marca la página como no válida ante lo que la vía rápida no reproduce (texto vertical o girado, glifos sin unicode)
+class DispositivoCaracteres(PDFTextDevice):
+    def __init__(self, rsrcmgr, alto_pagina):
+        super().__init__(rsrcmgr)
+        self.alto_pagina = alto_pagina
+        self.caracteres = []
+        self.valida = True
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate):
+        try:
+            texto = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            texto = f"(cid:{cid})"
+            self.valida = False
+        avance = font.char_width(cid) * fontsize * scaling
+        if font.is_vertical():
+            self.valida = False
+            return avance
+
+        # Mismo rectángulo que calcula LTChar para texto horizontal
+        descenso = font.get_descent() * fontsize
+        x0, y0, x1, y1 = apply_matrix_rect(matrix, (0, descenso + rise, avance, descenso + rise + fontsize))
+        a, b, c, d = matrix[:4]
+        if not (a * d * scaling > 0 and b * c <= 0):
+            self.valida = False
+        self.caracteres.append((texto, x0, self.alto_pagina - y1, x1, self.alto_pagina - y0))
+        return avance
+
+
+# Función para unir los caracteres de una palabra en el mismo formato de diccionario que pdfplumber
+def unir_caracteres(caracteres, doctop_inicial):
+    x0 = min(caracter[1] for caracter in caracteres)
+    top = min(caracter[2] for caracter in caracteres)
+    x1 = max(caracter[3] for caracter in caracteres)
+    bottom = max(caracter[4] for caracter in caracteres)
+    # Mismo redondeo que pdfplumber: el desplazamiento se toma del doctop del primer carácter
+    primero = caracteres[0][2]
+    return {
+        "text": "".join(ligaduras.get(caracter[0], caracter[0]) for caracter in caracteres),
+        "x0": x0, "x1": x1, "top": top, "doctop": top + ((doctop_inicial + primero) - primero), "bottom": bottom,
+        "upright": True, "height": bottom - top, "width": x1 - x0, "direction": "ltr",
+    }
+
+
+# Función para agrupar caracteres en palabras con el criterio de pdfplumber:
+# líneas por `top` (tolerancia 3), orden por x0 dentro de la línea y corte en espacios o huecos mayores a 3
+def agrupar_palabras(caracteres, doctop_inicial=0):
+    tops = sorted({caracter[2] for caracter in caracteres})
+    linea_de = {}
+    linea, anterior = -1, None
+    for top in tops:
+        if anterior is None or top > anterior + tolerancia_y:
+            linea += 1
+        linea_de[top] = linea
+        anterior = top
+
+    palabras = []
+    ordenados = sorted(caracteres, key=lambda caracter: linea_de[caracter[2]])
+    for _, caracteres_linea in groupby(ordenados, key=lambda caracter: linea_de[caracter[2]]):
+        actual = []
+        for caracter in sorted(caracteres_linea, key=lambda caracter: caracter[1]):
+            texto = caracter[0]
+            if not texto or texto.isspace():
+                if actual:
+                    palabras.append(unir_caracteres(actual, doctop_inicial))
+                    actual = []
+                # pdfplumber deja un carácter sin texto como palabra propia
+                if not texto:
+                    palabras.append(unir_caracteres([caracter], doctop_inicial))
+                continue
+            ultimo = actual[-1] if actual else None
+            if ultimo and (caracter[1] < ultimo[1] or caracter[1] > ultimo[3] + tolerancia_x
+                           or abs(caracter[2] - ultimo[2]) > tolerancia_y):
+                palabras.append(unir_caracteres(actual, doctop_inicial))
+                actual = []
+            actual.append(caracter)
+        if actual:
+            palabras.append(unir_caracteres(actual, doctop_inicial))
+    return palabras
+
+
+# Función para leer las palabras de las páginas indicadas sin pasar por pdfplumber
+# Devuelve ({página: palabras}, páginas no válidas, número de páginas); las no válidas quedan para pdfplumber
+def palabras_rapidas(ruta_pdf, paginas=None):
+    resultados, no_validas = {}, []
+    with instrumentacion.etapa("pdf_palabras_rapidas"), open(ruta_pdf, "rb") as archivo:
+        rsrcmgr = PDFResourceManager(caching=True)
+        todas = list(PDFPage.get_pages(archivo))
+        numeros = range(len(todas)) if paginas is None else paginas
+
+        # doctop acumula la altura de las páginas anteriores, igual que pdfplumber
+        doctops, acumulado = [], 0
+        for pagina in todas:
+            x0, y0, x1, y1 = pagina.mediabox
+            doctops.append(acumulado)
+            acumulado += abs(y1 - y0) if (pagina.rotate or 0) % 180 == 0 else abs(x1 - x0)
+
+        for numero in numeros:
+            pagina = todas[numero]
+            x0, y0, x1, y1 = pagina.mediabox
+            if (pagina.rotate or 0) % 360 != 0 or x0 != 0 or y0 != 0:
+                no_validas.append(numero)
+                continue
+            dispositivo = DispositivoCaracteres(rsrcmgr, y1 - y0)
+            PDFPageInterpreter(rsrcmgr, dispositivo).process_page(pagina)
+            if not dispositivo.valida:
+                no_validas.append(numero)
+                continue
+            resultados[numero] = agrupar_palabras(dispositivo.caracteres, doctops[numero])
+
+        instrumentacion.contar("paginas_palabras_rapidas", len(resultados))
+        instrumentacion.contar("paginas_no_validas", len(no_validas))
+        return resultados, no_validas, len(todas)
+
+
+# Dispositivo de pdfminer que solo decodifica el texto de la página, sin armar caracteres ni líneas
+class SondaTexto(PDFDevice):
+    def __init__(self, rsrcmgr):
+        super().__init__(rsrcmgr)
+        self.partes = []
+
+    def render_string(self, textstate, seq, ncs, graphicstate):
+        font = textstate.font
+        for obj in seq:
+            if isinstance(obj, bytes):
+                for cid in font.decode(obj):
+                    try:
+                        self.partes.append(font.to_unichr(cid))
+                    except Exception:
+                        pass
+        self.partes.append(" ")
+
+
+# Función para leer rápidamente el texto crudo de cada página (sin análisis de diseño)
+# `paginas` limita la lectura a esos números de página (en orden ascendente)
+def sondear_paginas(ruta_pdf, max_paginas=0, paginas=None):
+    textos = []
+    with instrumentacion.etapa("pdf_sonda"), open(ruta_pdf, "rb") as archivo:
+        rsrcmgr = PDFResourceManager(caching=True)
+        for pagina in PDFPage.get_pages(archivo, pagenos=paginas, maxpages=max_paginas):
+            sonda = SondaTexto(rsrcmgr)
+            PDFPageInterpreter(rsrcmgr, sonda).process_page(pagina)
+            textos.append("".join(sonda.partes))
+    instrumentacion.contar("paginas_sonda", len(textos))
+    return textos
+
+
+# Función para contar las páginas recorriendo el árbol de páginas sin interpretarlas
+def contar_paginas(ruta_pdf):
+    with open(ruta_pdf, "rb") as archivo:
+        return sum(1 for _ in PDFPage.get_pages(archivo))
@@ -0,0 +1,262 @@
+# Description: Procesamiento por lotes de varios clientes (carpeta, plantilla y libro de salida) en un solo pool de procesos
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from extraccion_paralela import TrabajoExtraccion, ResultadoExtraccion, generar_trabajos, ejecutar_trabajo, \
+    agrupar_resultados, copia_de_resultado
+from deduplicacion import IndiceDocumentos, huella_documento
+from escritor_excel import SesionLibro
+from diseno_plantilla import plan_de_plantilla, aplicar_diseno
+from instrumentacion import instrumentacion
+
+# Un cliente del lote: nombre (con el que se reporta; por defecto el de su carpeta), carpeta de entrada, plantilla
+# y libro de salida
+ClienteLote = namedtuple("ClienteLote", ["nombre", "directorio", "plantilla", "salida"])
+
+# Resultado de un cliente: PDFs extraídos, PDFs con error y el error que impidió escribir su libro (None si terminó bien)
+ResultadoCliente = namedtuple("ResultadoCliente", ["nombre", "salida", "pdfs", "pdfs_con_error", "segundos", "error"])
+
+plantilla_por_defecto = "./pdf/plantilla_1.xlsx"
+
+
+# Función para leer el manifiesto del lote: {"plantilla": ..., "clientes": [{"directorio", "salida", ...}]}
+# El nombre del cliente por defecto es el de su carpeta, igual que en el descubrimiento de PDFs
+def cargar_manifiesto(ruta_manifiesto):
+    with open(ruta_manifiesto, encoding="utf-8") as archivo:
+        manifiesto = json.load(archivo)
+
+    base = os.path.dirname(os.path.abspath(ruta_manifiesto))
+    plantilla = manifiesto.get("plantilla", plantilla_por_defecto)
+    clientes = []
+    for entrada in manifiesto["clientes"]:
+        directorio = os.path.join(base, entrada["directorio"])
+        clientes.append(ClienteLote(
+            entrada.get("nombre") or os.path.basename(os.path.normpath(directorio)),
+            directorio,
+            os.path.join(base, entrada.get("plantilla", plantilla)),
+            os.path.join(base, entrada["salida"]),
+        ))
+
+    for campo in ("nombre", "salida"):
+        valores = [getattr(cliente, campo) for cliente in clientes]
+        if len(set(valores)) != len(valores):
+            raise ValueError(f"El manifiesto '{ruta_manifiesto}' repite el campo '{campo}' entre clientes.")
+    return clientes
+
+
+# Función que descubre los PDFs de un cliente dentro de un proceso del pool
+# Los trabajos se eligen por la carpeta del cliente (la que asigna el descubrimiento) y llevan el nombre del manifiesto
+# Devuelve cada trabajo con la huella de su documento (None si no se pudo calcular), que se calcula aquí
+# porque la sonda de la primera página quedó en la caché de este proceso
+def descubrir_cliente(cliente):
+    carpeta = os.path.basename(os.path.normpath(cliente.directorio))
+    trabajos = []
+    for trabajo in generar_trabajos(cliente.directorio, clientes=[carpeta]):
+        trabajo = trabajo._replace(cliente=cliente.nombre)
+        try:
+            huella = huella_documento(trabajo.ruta_pdf)
+        except Exception as e:
+            logging.warning(f"No se pudo calcular la huella de '{trabajo.ruta_pdf}': {e}")
+            huella = None
+        trabajos.append((trabajo, huella))
+    if not trabajos:
+        raise ValueError(f"No se encontraron PDFs en '{cliente.directorio}'")
+    return trabajos
+
+
+# Función que escribe el libro de un cliente dentro de un proceso del pool (una sesión propia por cliente)
+def escribir_cliente(cliente, datos, en_pool=False):
+    if en_pool:
+        instrumentacion.limpiar()
+    error = None
+    try:
+        if os.path.dirname(cliente.salida):
+            os.makedirs(os.path.dirname(cliente.salida), exist_ok=True)
+        sesion = SesionLibro(cliente.plantilla, cliente.salida)
+        aplicar_diseno(plan_de_plantilla(cliente.plantilla), datos, sesion)
+        if not sesion.guardar():
+            error = f"No se pudo guardar '{cliente.salida}'"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return error, instrumentacion.exportar() if en_pool else None
+
+
+# Estado de un cliente mientras avanza el lote
+class ProgresoCliente:
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.inicio = time.perf_counter()
+        self.pendientes = 0
+        self.resultados = []
+        self.error = None
+
+    def terminar(self, error=None):
+        errores = sum(1 for resultado in self.resultados if resultado.error)
+        return ResultadoCliente(
+            self.cliente.nombre, self.cliente.salida, len(self.resultados), errores,
+            round(time.perf_counter() - self.inicio, 3), error or self.error,
+        )
+
+
+# Reparto de los documentos del lote: cada documento (por huella) se extrae una sola vez aunque esté en
+# varios clientes, y su resultado se copia a cada trabajo que lo referencia
+class RepartoDocumentos:
+    def __init__(self):
+        self.indice = IndiceDocumentos()
+        self.extraidos = {}  # representante -> ResultadoExtraccion
+        self.esperando = {}  # representante -> [trabajos copia]
+
+    # Registrar un trabajo: devuelve True si hay que extraerlo, o la lista de resultados ya disponibles (copia)
+    def registrar(self, trabajo, huella):
+        representante = self.indice.registrar(trabajo, huella) if huella else trabajo
+        if representante is trabajo:
+            return True
+        instrumentacion.contar("pdfs_duplicados")
+        if representante in self.extraidos:
+            return [copia_de_resultado(self.extraidos[representante], trabajo)]
+        self.esperando.setdefault(representante, []).append(trabajo)
+        return []
+
+    # Guardar el resultado de un representante y devolverlo junto con el de sus copias en espera
+    def entregar(self, resultado):
+        instrumentacion.combinar(resultado.metricas)
+        instrumentacion.contar("pdfs_extraidos")
+        if resultado.error:
+            instrumentacion.contar("pdfs_con_error")
+        representante = TrabajoExtraccion(*resultado[:5])
+        self.extraidos[representante] = resultado
+        copias = self.esperando.pop(representante, [])
+        return [resultado] + [copia_de_resultado(resultado, trabajo) for trabajo in copias]
+
+
+# Función para procesar todos los clientes en un solo pool: descubrimiento, extracción y escritura se encadenan
+# por cliente, así los procesos quedan ocupados con el trabajo de cualquier cliente y un fallo no detiene a los demás
+def procesar_lote(clientes, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    reparto = RepartoDocumentos()
+    if max_workers == 1:
+        return [procesar_cliente(cliente, reparto) for cliente in clientes]
+
+    progreso = {cliente.nombre: ProgresoCliente(cliente) for cliente in clientes}
+    terminados = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        en_vuelo = {executor.submit(descubrir_cliente, cliente): ("descubrir", cliente.nombre, None)
+                    for cliente in clientes}
+        listos_para_escribir = []
+
+        # Sumar resultados a sus clientes; el cliente que ya tiene todos sus PDFs pasa a escritura
+        def repartir(resultados):
+            for resultado in resultados:
+                estado = progreso[resultado.cliente]
+                estado.pendientes -= 1
+                estado.resultados.append(resultado)
+                if estado.pendientes == 0:
+                    listos_para_escribir.append(estado)
+
+        while en_vuelo:
+            listos, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                etapa, nombre, trabajo = en_vuelo.pop(futuro)
+                estado = progreso[nombre]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    # Un proceso caído solo afecta al PDF (o al cliente) del trabajo que lo ejecutaba
+                    resultado = None
+                    error = f"{etapa}: {type(e).__name__}: {e}"
+                    if etapa == "extraer":
+                        resultado = ResultadoExtraccion(*trabajo, None, error)
+                    else:
+                        estado.error = error
+
+                if etapa == "descubrir":
+                    estado.pendientes = len(resultado or [])
+                    if not estado.pendientes:
+                        listos_para_escribir.append(estado)
+                    for trabajo_cliente, huella in resultado or []:
+                        registro = reparto.registrar(trabajo_cliente, huella)
+                        if registro is True:
+                            futuro_extraccion = executor.submit(ejecutar_trabajo, trabajo_cliente, True)
+                            en_vuelo[futuro_extraccion] = ("extraer", nombre, trabajo_cliente)
+                        else:
+                            repartir(registro)
+                elif etapa == "extraer":
+                    repartir(reparto.entregar(resultado))
+                else:
+                    error, metricas = resultado or (estado.error, None)
+                    instrumentacion.combinar(metricas)
+                    terminados.append(estado.terminar(error))
+
+            # Con todos sus PDFs extraídos, el libro del cliente se escribe en el mismo pool
+            for estado in listos_para_escribir:
+                if estado.error and not estado.resultados:
+                    terminados.append(estado.terminar())
+                    continue
+                datos = datos_de_cliente(estado.cliente, estado.resultados)
+                futuro_escritura = executor.submit(escribir_cliente, estado.cliente, datos, True)
+                en_vuelo[futuro_escritura] = ("escribir", estado.cliente.nombre, None)
+            listos_para_escribir.clear()
+
+    # Mismo orden que el manifiesto
+    orden = {cliente.nombre: posicion for posicion, cliente in enumerate(clientes)}
+    return sorted(terminados, key=lambda resultado: orden[resultado.nombre])
+
+
+# Función para registrar los errores de extracción de un cliente y agrupar sus resultados para su libro
+def datos_de_cliente(cliente, resultados):
+    for resultado in resultados:
+        if resultado.error:
+            logging.error(f"[{cliente.nombre}] Error al extraer '{resultado.ruta_pdf}': {resultado.error}")
+    return agrupar_resultados(resultados).get(cliente.nombre, {})
+
+
+# Función para procesar un cliente completo en este proceso (lote con un solo worker)
+def procesar_cliente(cliente, reparto):
+    estado = ProgresoCliente(cliente)
+    try:
+        for trabajo, huella in descubrir_cliente(cliente):
+            registro = reparto.registrar(trabajo, huella)
+            if registro is True:
+                registro = reparto.entregar(ejecutar_trabajo(trabajo))
+            estado.resultados.extend(registro)
+        error, _ = escribir_cliente(cliente, datos_de_cliente(cliente, estado.resultados))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return estado.terminar(error)
+
+
+# Función para mostrar el resumen del lote en el log
+def reportar_lote(resultados):
+    for resultado in resultados:
+        if resultado.error:
+            logging.error(f"[{resultado.nombre}] falló después de {resultado.segundos:.1f} s: {resultado.error}")
+        else:
+            logging.info(
+                f"[{resultado.nombre}] {resultado.pdfs} PDFs ({resultado.pdfs_con_error} con error) -> "
+                f"'{resultado.salida}' en {resultado.segundos:.1f} s."
+            )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Procesa por lotes los clientes de un manifiesto.")
+    parser.add_argument("manifiesto", help="JSON con los clientes (carpeta, plantilla y libro de salida)")
+    parser.add_argument("--workers", type=int, help="Procesos del pool (por defecto, uno por núcleo)")
+    argumentos = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resultados = procesar_lote(cargar_manifiesto(argumentos.manifiesto), argumentos.workers)
+    reportar_lote(resultados)
+    logging.info(f"{len(resultados)} clientes procesados en {time.perf_counter() - inicio:.1f} s.")
+    instrumentacion.reportar()
+    sys.exit(1 if any(resultado.error for resultado in resultados) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,14 @@
-
-import pdfplumber
-import re
+from indice_formulario import obtener_indice
 
 def extraer_valores_indices(ruta_pdf, indices_buscados):
     valores_encontrados = {indice: None for indice in indices_buscados}  # Diccionario inicial
 
-    with pdfplumber.open(ruta_pdf) as pdf:
-        for pagina in pdf.pages:
-            palabras = pagina.extract_words()  # Extraer palabras individuales
-
-            for i in range(len(palabras)):
-                palabra_actual = palabras[i]['text']
-
-                # Si la palabra actual es un índice buscado
-                if palabra_actual in valores_encontrados:
-                    if i + 1 < len(palabras):  # Asegurar que hay un valor después
-                        valor_extraido = palabras[i + 1]['text'].replace('.', ',')  # Convertir punto a coma
-                        valores_encontrados[palabra_actual] = valor_extraido
+    # El índice del formulario ubica cada casillero en una sola pasada y se detiene al encontrarlos todos
+    for indice, casillero in obtener_indice(ruta_pdf).buscar(indices_buscados).items():
+        if casillero.siguiente is not None:  # Asegurar que hay un valor después
+            valores_encontrados[indice] = casillero.siguiente.replace('.', ',')  # Convertir punto a coma
 
     return valores_encontrados  # Retorna el diccionario con los valores extraídos
- # Retorna el diccionario con los valores extraídos
 
 
 
@@ -89,7 +78,8 @@ indices_104 = [
     "731"
 ]
 
-valores_extraidos = extraer_valores_indices(ruta_pdf, indices_104)
+if __name__ == "__main__":
+    valores_extraidos = extraer_valores_indices(ruta_pdf, indices_104)
 
-# Imprimir el diccionario con los resultados
-print("Valores extraídos:", valores_extraidos)
\ No newline at end of file
+    # Imprimir el diccionario con los resultados
+    print("Valores extraídos:", valores_extraidos)
\ No newline at end of file
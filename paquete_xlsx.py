@@ -0,0 +1,250 @@
+# Description: Escritura directa sobre el paquete .xlsx (zip + XML), sin motor de hojas de cálculo
+# Solo se reescriben las hojas que tienen celdas a escribir (parcheando sus <c>); el resto de las partes se copia igual
+import os
+import re
+import math
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+from escritor_excel import letra_a_columna, columna_a_letra, patron_celda
+from instrumentacion import instrumentacion
+
+ns_principal = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+ns_relaciones = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+atributo_id = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+tipo_documento = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+tipo_calc_chain = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain"
+
+patron_fila = re.compile(r"<row\b[^>]*?(?:/>|>.*?</row>)", re.S)
+patron_c = re.compile(r"<c\b[^>]*?(?:/>|>.*?</c>)", re.S)
+patron_formula = re.compile(r"<f\b([^>]*)")
+patron_dimension = re.compile(r'<dimension ref="([^"]*)"\s*/>')
+patron_calc_pr = re.compile(r"<calcPr\b([^>]*?)\s*/?>(?:</calcPr>)?")
+# Elementos que van después de <calcPr> en workbook.xml (donde se inserta si la plantilla no lo trae)
+siguientes_calc_pr = ("<oleSize", "<customWorkbookViews", "<pivotCaches", "<smartTagPr", "<smartTagTypes",
+                      "<webPublishing", "<fileRecoveryPr", "<webPublishObjects", "<extLst", "</workbook>")
+
+
+# Error para los casos que este escritor no cubre (hoja nueva, fórmula compartida, tipo de valor); se usa openpyxl
+class ParcheNoSoportado(Exception):
+    pass
+
+
+# Función para leer un atributo de la etiqueta de apertura de un elemento XML (None si no está)
+def atributo(etiqueta, nombre):
+    match = re.search(rf'\s{nombre}="([^"]*)"', etiqueta[:etiqueta.find(">") + 1])
+    return match.group(1) if match else None
+
+
+# Función para ubicar una parte del paquete a partir del destino de una relación
+def ruta_de_parte(base, destino):
+    if destino.startswith("/"):
+        return destino.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), destino))
+
+
+# Función para leer las relaciones de una parte: {Id: (Type, ruta de la parte destino)}
+def relaciones_de(paquete, parte):
+    ruta_rels = posixpath.join(posixpath.dirname(parte), "_rels", f"{posixpath.basename(parte)}.rels")
+    if ruta_rels not in paquete.namelist():
+        return {}
+    raiz = ET.fromstring(paquete.read(ruta_rels))
+    return {
+        relacion.get("Id"): (relacion.get("Type"), ruta_de_parte(parte, relacion.get("Target")))
+        for relacion in raiz.iter(f"{ns_relaciones}Relationship")
+    }
+
+
+# Función para ubicar workbook.xml y la parte de cada hoja: (ruta del libro, {nombre de hoja: ruta de la parte})
+def hojas_del_paquete(paquete):
+    libro = next((destino for tipo, destino in relaciones_de(paquete, "").values() if tipo == tipo_documento),
+                 "xl/workbook.xml")
+    relaciones = relaciones_de(paquete, libro)
+    raiz = ET.fromstring(paquete.read(libro))
+    hojas = {}
+    for hoja in raiz.iter(f"{ns_principal}sheet"):
+        _, destino = relaciones.get(hoja.get(atributo_id), (None, None))
+        if destino:
+            hojas[hoja.get("name")] = destino
+    return libro, hojas
+
+
+# Función para armar el XML de una celda con su valor; conserva el estilo de la celda que reemplaza
+def celda_xml(referencia, valor, estilo=None):
+    estilo = f' s="{estilo}"' if estilo else ""
+    if valor is None:
+        return f'<c r="{referencia}"{estilo}/>'
+    if isinstance(valor, bool):
+        return f'<c r="{referencia}"{estilo} t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        if not math.isfinite(valor):
+            raise ParcheNoSoportado(f"valor no finito en {referencia}")
+        return f'<c r="{referencia}"{estilo}><v>{valor!r}</v></c>'
+    if isinstance(valor, str) and not valor.startswith("="):
+        return f'<c r="{referencia}"{estilo} t="inlineStr"><is><t xml:space="preserve">{escape(valor)}</t></is></c>'
+    raise ParcheNoSoportado(f"valor de tipo {type(valor).__name__} en {referencia}")
+
+
+# Función para reemplazar o insertar, en orden de columna, las celdas de una fila
+# Devuelve (XML de la fila, si se reemplazó alguna fórmula)
+def parchear_fila(texto, fila, valores):
+    apertura = texto[:texto.find(">") + 1]
+    contenido = "" if apertura.endswith("/>") else texto[len(apertura):-len("</row>")]
+    apertura = re.sub(r'\sspans="[^"]*"', "", apertura.removesuffix("/>").removesuffix(">")) + ">"
+
+    partes = []
+    pendientes = sorted(valores)
+    formulas = False
+    ultimo = 0
+    for match in patron_c.finditer(contenido):
+        referencia = atributo(match.group(0), "r")
+        if referencia is None:
+            raise ParcheNoSoportado(f"celda sin referencia en la fila {fila}")
+        columna = letra_a_columna(patron_celda.match(referencia).group(1))
+        partes.append(contenido[ultimo:match.start()])
+        ultimo = match.end()
+        while pendientes and pendientes[0] < columna:
+            columna_nueva = pendientes.pop(0)
+            partes.append(celda_xml(f"{columna_a_letra(columna_nueva)}{fila}", valores[columna_nueva]))
+        if pendientes and pendientes[0] == columna:
+            pendientes.pop(0)
+            formula = patron_formula.search(match.group(0))
+            if formula:
+                # Una fórmula compartida o matricial que se extiende a otras celdas no se puede quitar sola
+                if ' ref="' in formula.group(1):
+                    raise ParcheNoSoportado(f"{referencia} es el origen de una fórmula compartida o matricial")
+                formulas = True
+            partes.append(celda_xml(referencia, valores[columna], atributo(match.group(0), "s")))
+        else:
+            partes.append(match.group(0))
+    partes.append(contenido[ultimo:])
+    partes.extend(celda_xml(f"{columna_a_letra(columna)}{fila}", valores[columna]) for columna in pendientes)
+    return f"{apertura}{''.join(partes)}</row>", formulas
+
+
+# Función para parchear el XML de una hoja con {(fila, columna): valor}, fila por fila y sin armar el árbol
+# Las filas sin celdas a escribir se copian tal cual; devuelve (XML de la hoja, si se reemplazó alguna fórmula)
+def parchear_hoja(xml, celdas):
+    por_fila = {}
+    for (fila, columna), valor in celdas.items():
+        por_fila.setdefault(fila, {})[columna] = valor
+
+    xml = xml.replace("<sheetData/>", "<sheetData></sheetData>", 1)
+    inicio = xml.find(">", xml.find("<sheetData")) + 1
+    fin = xml.find("</sheetData>")
+    if inicio == 0 or fin < 0:
+        raise ParcheNoSoportado("la hoja no tiene <sheetData>")
+
+    partes = [xml[:inicio]]
+    filas_nuevas = sorted(por_fila)
+    formulas = False
+    ultimo = inicio
+    for match in patron_fila.finditer(xml, inicio, fin):
+        numero = atributo(match.group(0), "r")
+        if numero is None:
+            raise ParcheNoSoportado("fila sin número")
+        fila = int(numero)
+        partes.append(xml[ultimo:match.start()])
+        ultimo = match.end()
+        while filas_nuevas and filas_nuevas[0] < fila:
+            nueva = filas_nuevas.pop(0)
+            partes.append(parchear_fila(f'<row r="{nueva}"/>', nueva, por_fila[nueva])[0])
+        if filas_nuevas and filas_nuevas[0] == fila:
+            filas_nuevas.pop(0)
+            texto, reemplazo = parchear_fila(match.group(0), fila, por_fila[fila])
+            formulas = formulas or reemplazo
+            partes.append(texto)
+        else:
+            partes.append(match.group(0))
+    partes.append(xml[ultimo:fin])
+    partes.extend(parchear_fila(f'<row r="{nueva}"/>', nueva, por_fila[nueva])[0] for nueva in filas_nuevas)
+    partes.append(xml[fin:])
+    return ampliar_dimension("".join(partes), celdas), formulas
+
+
+# Función para ampliar <dimension> si se escribieron celdas fuera del rango usado de la hoja
+def ampliar_dimension(xml, celdas):
+    match = patron_dimension.search(xml)
+    if not match or not celdas:
+        return xml
+    esquinas = [patron_celda.match(celda) for celda in match.group(1).split(":")]
+    if not all(esquinas):
+        return xml
+    filas = [int(esquina.group(2)) for esquina in esquinas] + [fila for fila, _ in celdas]
+    columnas = [letra_a_columna(esquina.group(1)) for esquina in esquinas] + [columna for _, columna in celdas]
+    rango = f"{columna_a_letra(min(columnas))}{min(filas)}:{columna_a_letra(max(columnas))}{max(filas)}"
+    return f'{xml[:match.start()]}<dimension ref="{rango}"/>{xml[match.end():]}'
+
+
+# Función para marcar el libro para recálculo completo al abrirlo (las fórmulas guardan valores de la plantilla)
+def recalcular_al_abrir(xml):
+    match = patron_calc_pr.search(xml)
+    if match:
+        atributos = re.sub(r'\sfullCalcOnLoad="[^"]*"', "", match.group(1))
+        return f'{xml[:match.start()]}<calcPr{atributos} fullCalcOnLoad="1"/>{xml[match.end():]}'
+    posicion = min(xml.find(marca) for marca in siguientes_calc_pr if marca in xml)
+    return f'{xml[:posicion]}<calcPr fullCalcOnLoad="1"/>{xml[posicion:]}'
+
+
+# Función para quitar calcChain.xml (su relación y su tipo de contenido); Excel lo rearma al recalcular
+def quitar_calc_chain(partes, libro, ruta_calc_chain):
+    ruta_rels = posixpath.join(posixpath.dirname(libro), "_rels", f"{posixpath.basename(libro)}.rels")
+    partes[ruta_rels] = re.sub(rf'<Relationship\b[^>]*Type="{re.escape(tipo_calc_chain)}"[^>]*/>', "",
+                               partes[ruta_rels])
+    partes["[Content_Types].xml"] = re.sub(
+        rf'<Override\b[^>]*PartName="/{re.escape(ruta_calc_chain)}"[^>]*/>', "", partes["[Content_Types].xml"]
+    )
+
+
+# Función para escribir los bloques ({hoja: [(fila, columna, matriz)]}) copiando el paquete de ruta_origen
+# Lanza ParcheNoSoportado (sin tocar ruta_salida) si algo requiere un motor completo
+def parchear_libro(ruta_origen, ruta_salida, bloques_por_hoja):
+    with zipfile.ZipFile(ruta_origen) as paquete:
+        libro, hojas = hojas_del_paquete(paquete)
+        faltantes = [nombre_hoja for nombre_hoja in bloques_por_hoja if nombre_hoja not in hojas]
+        if faltantes:
+            raise ParcheNoSoportado(f"la plantilla no tiene las hojas {', '.join(faltantes)}")
+
+        partes = {libro: recalcular_al_abrir(paquete.read(libro).decode("utf-8"))}
+        formulas = False
+        with instrumentacion.etapa("parchear_hojas"):
+            for nombre_hoja, bloques in bloques_por_hoja.items():
+                celdas = {}
+                for fila, columna, matriz in bloques:
+                    for i, valores_fila in enumerate(matriz):
+                        for j, valor in enumerate(valores_fila):
+                            celdas[(fila + i, columna + j)] = valor
+                xml, reemplazo = parchear_hoja(paquete.read(hojas[nombre_hoja]).decode("utf-8"), celdas)
+                partes[hojas[nombre_hoja]] = xml
+                formulas = formulas or reemplazo
+
+        # Si se reemplazó alguna fórmula, la cadena de cálculo de la plantilla ya no corresponde
+        omitidas = set()
+        ruta_calc_chain = next((destino for tipo, destino in relaciones_de(paquete, libro).values()
+                                if tipo == tipo_calc_chain), None)
+        if formulas and ruta_calc_chain:
+            for nombre in (posixpath.join(posixpath.dirname(libro), "_rels", f"{posixpath.basename(libro)}.rels"),
+                           "[Content_Types].xml"):
+                partes[nombre] = paquete.read(nombre).decode("utf-8")
+            quitar_calc_chain(partes, libro, ruta_calc_chain)
+            omitidas.add(ruta_calc_chain)
+
+        # Se escribe a un temporal y se reemplaza al final: la salida puede ser el mismo libro de origen
+        temporal = f"{ruta_salida}.tmp"
+        try:
+            with instrumentacion.etapa("guardar_libro"), zipfile.ZipFile(temporal, "w") as salida:
+                for info in paquete.infolist():
+                    if info.filename in omitidas:
+                        continue
+                    contenido = partes.get(info.filename)
+                    salida.writestr(info, contenido.encode("utf-8") if contenido is not None
+                                    else paquete.read(info.filename))
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+    os.replace(temporal, ruta_salida)
+    instrumentacion.contar("hojas_parcheadas", len(bloques_por_hoja))
+    instrumentacion.contar("libros_guardados")
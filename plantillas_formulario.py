@@ -0,0 +1,193 @@
+# Description: Plantillas de coordenadas de los casilleros por versión de formulario (103/104), guardadas en disco
+import os
+import re
+import json
+import logging
+from collections import namedtuple
+
+from cache_pdf import cache_documentos
+from indice_formulario import IndiceFormulario, Casillero, obtener_indice, es_valor_del_casillero, patron_valor, \
+    tolerancia_linea
+from instrumentacion import instrumentacion, medido
+
+version_plantilla = 1  # Cambiar si cambia el formato de las plantillas guardadas en disco
+patron_obligacion = re.compile(r"OBLIGACIÓNTRIBUTARIA:(\d+)")
+tolerancia_etiqueta = 2  # Desplazamiento máximo (en puntos) del código respecto a su posición en la plantilla
+margen_valor = 40        # Holgura horizontal del bbox del valor (los montos cambian de largo)
+
+# Posición de un casillero en la plantilla: página, bbox del código y bbox del valor (x0, top, x1, bottom)
+PosicionCasillero = namedtuple("PosicionCasillero", ["pagina", "etiqueta", "valor"])
+
+
+# Función para calcular la huella de la versión del formulario: obligación tributaria + número de páginas
+# Solo usa la sonda de la primera página, que el descubrimiento de PDFs normalmente ya dejó en caché
+def huella_version(ruta_pdf):
+    primera = cache_documentos.sonda(ruta_pdf, max_paginas=1)
+    obligacion = patron_obligacion.search(primera[0]) if primera else None
+    if obligacion is None:
+        return None
+    return f"{obligacion.group(1)}-{cache_documentos.numero_paginas(ruta_pdf)}p"
+
+
+# Función para obtener el bbox de una palabra de pdfplumber
+def bbox_de(palabra):
+    return (palabra['x0'], palabra['top'], palabra['x1'], palabra['bottom'])
+
+
+# Función para quedarse con las palabras contenidas en un bbox (mismo criterio que `page.within_bbox`)
+def palabras_en_bbox(palabras, bbox):
+    x0, top, x1, bottom = bbox
+    return [
+        palabra for palabra in palabras
+        if palabra['x0'] >= x0 and palabra['x1'] <= x1 and palabra['top'] >= top and palabra['bottom'] <= bottom
+    ]
+
+
+# Plantillas por huella en memoria con una capa opcional en disco (un JSON por versión de formulario)
+class AlmacenPlantillas:
+    def __init__(self, directorio=None):
+        self.directorio = directorio
+        self.plantillas = {}  # huella -> {código: PosicionCasillero}
+
+    def ruta_en_disco(self, huella):
+        return os.path.join(self.directorio, f"{huella}.json")
+
+    def obtener(self, huella):
+        plantilla = self.plantillas.get(huella)
+        if plantilla is None and self.directorio and os.path.exists(self.ruta_en_disco(huella)):
+            try:
+                with open(self.ruta_en_disco(huella), encoding="utf-8") as archivo:
+                    contenido = json.load(archivo)
+                if contenido.get("version") == version_plantilla:
+                    plantilla = {
+                        codigo: PosicionCasillero(
+                            posicion["pagina"], tuple(posicion["etiqueta"]),
+                            tuple(posicion["valor"]) if posicion["valor"] else None
+                        )
+                        for codigo, posicion in contenido["casilleros"].items()
+                    }
+                    self.plantillas[huella] = plantilla
+            except Exception as e:
+                logging.warning(f"No se pudo leer la plantilla '{self.ruta_en_disco(huella)}': {e}")
+        return plantilla
+
+    # Agregar o actualizar posiciones; la plantilla solo se reescribe en disco si cambió algo
+    def actualizar(self, huella, posiciones):
+        plantilla = self.plantillas.setdefault(huella, {})
+        cambios = {codigo: posicion for codigo, posicion in posiciones.items() if plantilla.get(codigo) != posicion}
+        if not cambios:
+            return
+        plantilla.update(cambios)
+        instrumentacion.contar("plantilla_posiciones_aprendidas", len(cambios))
+        if not self.directorio:
+            return
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            ruta = self.ruta_en_disco(huella)
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            contenido = {
+                "version": version_plantilla,
+                "huella": huella,
+                "casilleros": {codigo: posicion._asdict() for codigo, posicion in sorted(plantilla.items())},
+            }
+            with open(temporal, "w", encoding="utf-8") as archivo:
+                json.dump(contenido, archivo, indent=1)
+            os.replace(temporal, ruta)
+        except Exception as e:
+            logging.warning(f"No se pudo guardar la plantilla '{huella}': {e}")
+
+    def limpiar(self):
+        self.plantillas.clear()
+
+
+# Almacén compartido por defecto; PLANTILLAS_FORMULARIO_DIR activa la capa en disco
+almacen_plantillas = AlmacenPlantillas(directorio=os.environ.get("PLANTILLAS_FORMULARIO_DIR"))
+
+
+# Función para aprender la posición de los casilleros encontrados por el índice (código y valor a su derecha)
+def posiciones_de_casilleros(ruta_pdf, casilleros):
+    paginas = sorted({casillero.pagina for casillero in casilleros.values()})
+    palabras_por_pagina = dict(zip(paginas, cache_documentos.palabras(ruta_pdf, paginas)))
+
+    posiciones = {}
+    for codigo, casillero in casilleros.items():
+        palabras = palabras_por_pagina[casillero.pagina]
+        for i, palabra in enumerate(palabras):
+            if palabra['text'] == codigo and palabra['x0'] == casillero.x0 and palabra['top'] == casillero.top:
+                siguiente = palabras[i + 1] if i + 1 < len(palabras) else None
+                valor = bbox_de(siguiente) if siguiente and es_valor_del_casillero(palabra, siguiente) else None
+                posiciones[codigo] = PosicionCasillero(casillero.pagina, bbox_de(palabra), valor)
+                break
+    return posiciones
+
+
+# Función para leer un casillero en su posición de la plantilla; None si el código no está donde se esperaba
+def leer_en_posicion(palabras, codigo, posicion):
+    if posicion.valor is None:
+        return None
+    x0, top, x1, bottom = posicion.etiqueta
+    zona_etiqueta = (x0 - tolerancia_etiqueta, top - tolerancia_etiqueta,
+                     x1 + tolerancia_etiqueta, bottom + tolerancia_etiqueta)
+    etiquetas = [palabra for palabra in palabras_en_bbox(palabras, zona_etiqueta) if palabra['text'] == codigo]
+    if not etiquetas:
+        return None
+    etiqueta = etiquetas[0]
+
+    # El valor se busca solo en la franja de columnas del valor aprendido, en la línea del código
+    zona_valor = (max(etiqueta['x1'], posicion.valor[0] - margen_valor), etiqueta['top'] - tolerancia_linea,
+                  posicion.valor[2] + margen_valor, etiqueta['bottom'] + tolerancia_linea)
+    valores = [palabra for palabra in palabras_en_bbox(palabras, zona_valor) if patron_valor.match(palabra['text'])]
+    if not valores:
+        return None
+    valor = min(valores, key=lambda palabra: palabra['x0'])
+    return Casillero(posicion.pagina, etiqueta['x0'], etiqueta['top'], valor['text'])
+
+
+# Función para buscar con el índice los códigos que la plantilla no resolvió
+# Solo se analizan las páginas ya cargadas y las que, según la sonda, contienen alguno de los códigos
+def buscar_fuera_de_plantilla(ruta_pdf, codigos, paginas_cargadas):
+    restantes = [numero for numero in range(cache_documentos.numero_paginas(ruta_pdf)) if numero not in paginas_cargadas]
+    sonda = cache_documentos.sonda_de_paginas(ruta_pdf, restantes)
+    candidatas = sorted(set(paginas_cargadas) | {
+        numero for numero, texto in sonda.items() if not texto or any(codigo in texto for codigo in codigos)
+    })
+    indice = IndiceFormulario(cache_documentos.palabras(ruta_pdf, candidatas))
+    return {
+        codigo: casillero._replace(pagina=candidatas[casillero.pagina])
+        for codigo, casillero in indice.buscar(codigos).items()
+    }
+
+
+# Función para ubicar los casilleros pedidos de un PDF usando la plantilla de su versión de formulario
+# El primer PDF de cada versión se indexa completo y sirve de referencia; los siguientes solo analizan
+# las páginas de los códigos pedidos, y lo que no coincide con la plantilla se busca con el índice
+@medido()
+def leer_casilleros(ruta_pdf, indices_buscados):
+    huella = huella_version(ruta_pdf)
+    plantilla = almacen_plantillas.obtener(huella) if huella else None
+    if plantilla is None:
+        casilleros = obtener_indice(ruta_pdf).buscar(indices_buscados)
+        if huella:
+            almacen_plantillas.actualizar(huella, posiciones_de_casilleros(ruta_pdf, casilleros))
+        return casilleros
+
+    codigos = list(dict.fromkeys(indices_buscados))
+    paginas = sorted({plantilla[codigo].pagina for codigo in codigos if codigo in plantilla})
+    palabras_por_pagina = dict(zip(paginas, cache_documentos.palabras(ruta_pdf, paginas)))
+
+    casilleros = {}
+    for codigo in codigos:
+        if codigo in plantilla:
+            casillero = leer_en_posicion(palabras_por_pagina[plantilla[codigo].pagina], codigo, plantilla[codigo])
+            if casillero is not None:
+                casilleros[codigo] = casillero
+
+    faltantes = [codigo for codigo in codigos if codigo not in casilleros]
+    instrumentacion.contar("plantilla_aciertos", len(casilleros))
+    instrumentacion.contar("plantilla_fallos", len(faltantes))
+    if faltantes:
+        encontrados = buscar_fuera_de_plantilla(ruta_pdf, faltantes, paginas)
+        casilleros.update(encontrados)
+        almacen_plantillas.actualizar(huella, posiciones_de_casilleros(ruta_pdf, encontrados))
+
+    return {codigo: casilleros[codigo] for codigo in indices_buscados if codigo in casilleros}
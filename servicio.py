@@ -0,0 +1,389 @@
+# Description: Servicio local (asyncio + HTTP) que recibe trabajos de extracción y los reparte en un pool de procesos
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from cache_pdf import clave_documento
+from descubrimiento import clasificar_pdf
+from extraccion_paralela import (
+    TrabajoExtraccion, ResultadoExtraccion, generar_trabajos, ejecutar_trabajo, agrupar_resultados
+)
+from extractores import extractores_por_formulario
+from instrumentacion import instrumentacion
+
+max_resultados_en_memoria = 2048  # PDFs ya extraídos que se devuelven sin volver a procesarlos
+max_cuerpo = 64 * 1024 * 1024     # Tamaño máximo de un PDF subido
+estados_http = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+# Inicializador de cada proceso del pool: importa pdfplumber y los extractores antes de recibir trabajos
+def iniciar_proceso(directorio_cache):
+    import pdfplumber  # noqa: F401
+    import cache_pdf
+    import plantillas_formulario
+    cache_pdf.cache_documentos.directorio = directorio_cache
+    # Las plantillas de los formularios se comparten entre procesos junto a la caché
+    if directorio_cache:
+        plantillas_formulario.almacen_plantillas.directorio = os.path.join(directorio_cache, "plantillas")
+
+
+# Un trabajo del servicio: los PDFs de un cliente (o uno subido) con su progreso y eventos
+class TrabajoServicio:
+    def __init__(self, parametros):
+        self.id = uuid.uuid4().hex[:12]
+        self.parametros = parametros
+        self.estado = "en_cola"
+        self.creado = time.time()
+        self.total = None
+        self.procesados = 0
+        self.errores = []
+        self.datos = None
+        self.eventos = []
+        self.cambio = asyncio.Condition()
+
+    async def emitir(self, tipo, **datos):
+        evento = {"tipo": tipo, "trabajo": self.id, "momento": round(time.time(), 3), **datos}
+        async with self.cambio:
+            self.eventos.append(evento)
+            self.cambio.notify_all()
+
+    def terminado(self):
+        return self.estado in ("terminado", "fallido")
+
+    def resumen(self):
+        return {
+            "id": self.id, "estado": self.estado, "parametros": self.parametros, "total": self.total,
+            "procesados": self.procesados, "errores": self.errores, "datos": self.datos,
+        }
+
+
+# Servicio: cola de trabajos, pool de procesos compartido y caché de resultados por documento
+class ServicioExtraccion:
+    def __init__(self, max_workers=None, trabajos_simultaneos=1, directorio_cache=None, directorio_subidas=None,
+                 directorio_salidas=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.trabajos_simultaneos = trabajos_simultaneos
+        self.directorio_cache = directorio_cache
+        self.directorio_subidas = directorio_subidas or tempfile.mkdtemp(prefix="subidas_pdf_")
+        self.directorio_salidas = directorio_salidas or "./salidas"
+        self.trabajos = {}
+        self.cola = asyncio.Queue()
+        self.resultados = OrderedDict()  # (clave del documento, formulario) -> (datos, declaración)
+        self.pool = None
+        self.tareas = []
+
+    async def iniciar(self):
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=iniciar_proceso, initargs=(self.directorio_cache,)
+        )
+        # Arranque en caliente: cada proceso importa pdfplumber antes del primer trabajo
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, int, 0) for _ in range(self.max_workers)))
+        self.tareas = [asyncio.create_task(self.consumir()) for _ in range(self.trabajos_simultaneos)]
+        logging.info(f"Servicio listo con {self.max_workers} procesos.")
+
+    async def detener(self):
+        for tarea in self.tareas:
+            tarea.cancel()
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def encolar(self, parametros):
+        trabajo = TrabajoServicio(parametros)
+        self.trabajos[trabajo.id] = trabajo
+        await trabajo.emitir("en_cola")
+        await self.cola.put(trabajo)
+        return trabajo
+
+    async def consumir(self):
+        while True:
+            trabajo = await self.cola.get()
+            try:
+                await self.procesar(trabajo)
+            except Exception as e:
+                logging.error(f"Error en el trabajo {trabajo.id}: {e}")
+                trabajo.estado = "fallido"
+                await trabajo.emitir("fallido", error=f"{type(e).__name__}: {e}")
+            finally:
+                self.cola.task_done()
+
+    # Función para armar la lista de PDFs de un trabajo (el descubrimiento lee la primera página: va en un hilo)
+    def planificar(self, parametros):
+        formularios = parametros.get("formularios") or tuple(extractores_por_formulario)
+        if parametros.get("archivo"):
+            registro = clasificar_pdf(parametros["archivo"], parametros.get("cliente"), parametros.get("formulario"))
+            if registro.formulario not in extractores_por_formulario or registro.mes is None:
+                raise ValueError("No se pudo determinar el formulario o el mes del PDF subido.")
+            trabajos = [TrabajoExtraccion(
+                registro.cliente, registro.formulario, registro.anio, registro.mes, registro.ruta_pdf
+            )]
+        else:
+            clientes = [parametros["cliente"]] if parametros.get("cliente") else None
+            trabajos = list(generar_trabajos(parametros["directorio"], formularios, clientes))
+
+        anio = parametros.get("anio")
+        if anio:
+            trabajos = [trabajo for trabajo in trabajos if trabajo.anio in (None, int(anio))]
+        return trabajos
+
+    async def extraer(self, trabajo_pdf):
+        clave = (clave_documento(trabajo_pdf.ruta_pdf), trabajo_pdf.formulario)
+        if clave in self.resultados:
+            self.resultados.move_to_end(clave)
+            instrumentacion.contar("resultados_reutilizados")
+            return (trabajo_pdf, *self.resultados[clave], None)
+
+        loop = asyncio.get_running_loop()
+        resultado = await loop.run_in_executor(self.pool, ejecutar_trabajo, trabajo_pdf, True)
+        instrumentacion.combinar(resultado.metricas)
+        if resultado.error is None:
+            self.resultados[clave] = (resultado.datos, resultado.declaracion)
+            while len(self.resultados) > max_resultados_en_memoria:
+                self.resultados.popitem(last=False)
+        return trabajo_pdf, resultado.datos, resultado.declaracion, resultado.error
+
+    async def procesar(self, trabajo):
+        trabajo.estado = "descubriendo"
+        await trabajo.emitir("descubriendo")
+        trabajos_pdf = await asyncio.to_thread(self.planificar, trabajo.parametros)
+
+        trabajo.estado = "extrayendo"
+        trabajo.total = len(trabajos_pdf)
+        await trabajo.emitir("extrayendo", total=trabajo.total)
+
+        resultados = []
+        for pendiente in asyncio.as_completed([self.extraer(trabajo_pdf) for trabajo_pdf in trabajos_pdf]):
+            trabajo_pdf, datos, declaracion, error = await pendiente
+            trabajo.procesados += 1
+            resultados.append(ResultadoExtraccion(*trabajo_pdf, datos, error, declaracion=declaracion))
+            if error:
+                trabajo.errores.append({"ruta_pdf": trabajo_pdf.ruta_pdf, "error": error})
+            await trabajo.emitir(
+                "pdf", ruta_pdf=trabajo_pdf.ruta_pdf, formulario=trabajo_pdf.formulario, mes=trabajo_pdf.mes,
+                procesados=trabajo.procesados, total=trabajo.total, error=error, datos=datos,
+            )
+
+        # Mismo formato que en test_vale.py: {cliente: {formulario: {mes: datos}}}
+        # Las versiones se eligen con la declaración leída en el pool: no se abre ningún PDF en el bucle de eventos
+        agrupados = agrupar_resultados(resultados)
+        trabajo.datos = {
+            cliente: {formulario: {str(mes): datos for mes, datos in meses.items()}
+                      for formulario, meses in formularios.items()}
+            for cliente, formularios in agrupados.items()
+        }
+        if trabajo.parametros.get("ruta_salida"):
+            await asyncio.to_thread(self.escribir_libro, trabajo.parametros, agrupados)
+
+        trabajo.estado = "terminado"
+        await trabajo.emitir("terminado", procesados=trabajo.procesados, errores=len(trabajo.errores))
+
+    # Función para escribir el libro de Excel de un trabajo con el diseño de la plantilla
+    def escribir_libro(self, parametros, agrupados):
+        from escritor_excel import SesionLibro
+        from diseno_plantilla import plan_de_plantilla, aplicar_diseno
+
+        ruta_plantilla = parametros.get("ruta_plantilla", "./pdf/plantilla_1.xlsx")
+        sesion = SesionLibro(ruta_plantilla, parametros["ruta_salida"])
+        planes = plan_de_plantilla(ruta_plantilla)
+        for datos_cliente in agrupados.values():
+            aplicar_diseno(planes, datos_cliente, sesion)
+        if not sesion.guardar():
+            raise RuntimeError(f"No se pudo guardar el libro '{parametros['ruta_salida']}'.")
+
+    # Función para ubicar el libro de salida pedido dentro de la carpeta de salidas (solo se usa el nombre del archivo)
+    def ruta_de_salida(self, ruta_salida):
+        if not ruta_salida:
+            return None
+        nombre = os.path.basename(ruta_salida)
+        if not nombre:
+            raise ValueError("'ruta_salida' no tiene nombre de archivo.")
+        os.makedirs(self.directorio_salidas, exist_ok=True)
+        return os.path.join(self.directorio_salidas, nombre if nombre.lower().endswith(".xlsx") else f"{nombre}.xlsx")
+
+    # Función para guardar un PDF subido y devolver los parámetros del trabajo
+    def guardar_subida(self, cuerpo, consulta):
+        if not cuerpo.startswith(b"%PDF"):
+            raise ValueError("El cuerpo no es un PDF.")
+        ruta_salida = self.ruta_de_salida(consulta.get("ruta_salida"))
+        nombre = os.path.basename(consulta.get("nombre", "subido.pdf")) or "subido.pdf"
+        directorio = os.path.join(self.directorio_subidas, uuid.uuid4().hex[:12])
+        os.makedirs(directorio)
+        ruta = os.path.join(directorio, nombre if nombre.lower().endswith(".pdf") else f"{nombre}.pdf")
+        with open(ruta, "wb") as archivo:
+            archivo.write(cuerpo)
+        return {
+            "archivo": ruta,
+            "cliente": consulta.get("cliente", "subidas"),
+            "formulario": consulta.get("formulario"),
+            "ruta_salida": ruta_salida,
+        }
+
+
+# Función para leer una petición HTTP/1.1: (método, ruta, consulta, encabezados, cuerpo)
+async def leer_peticion(reader):
+    linea = await reader.readline()
+    if not linea:
+        return None
+    metodo, objetivo, _ = linea.decode("latin-1").split(" ", 2)
+    encabezados = {}
+    while True:
+        linea = await reader.readline()
+        if linea in (b"\r\n", b"\n", b""):
+            break
+        nombre, _, valor = linea.decode("latin-1").partition(":")
+        encabezados[nombre.strip().lower()] = valor.strip()
+
+    largo = int(encabezados.get("content-length", 0))
+    if largo > max_cuerpo:
+        raise OverflowError(largo)
+    cuerpo = await reader.readexactly(largo) if largo else b""
+    partes = urlsplit(objetivo)
+    consulta = {nombre: valores[-1] for nombre, valores in parse_qs(partes.query).items()}
+    return metodo.upper(), partes.path.rstrip("/") or "/", consulta, encabezados, cuerpo
+
+
+async def responder_json(writer, estado, contenido):
+    cuerpo = json.dumps(contenido, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {estado} {estados_http.get(estado, '')}\r\nContent-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode("latin-1") + cuerpo
+    )
+    await writer.drain()
+
+
+# Función para transmitir los eventos de un trabajo como Server-Sent Events hasta que termine
+async def transmitir_eventos(writer, trabajo):
+    writer.write(
+        b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n"
+    )
+    enviados = 0
+    while True:
+        async with trabajo.cambio:
+            await trabajo.cambio.wait_for(lambda: len(trabajo.eventos) > enviados)
+            nuevos = trabajo.eventos[enviados:]
+        for evento in nuevos:
+            writer.write(f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n".encode("utf-8"))
+        enviados += len(nuevos)
+        await writer.drain()
+        if trabajo.terminado() and enviados == len(trabajo.eventos):
+            return
+
+
+# Rutas de la API:
+#   POST /trabajos             {"directorio", "cliente", "anio", "formularios", "ruta_salida"} -> {"id"}
+#   POST /subir?formulario=&cliente=&nombre=&ruta_salida=   (cuerpo: el PDF) -> {"id"}
+#   (ruta_salida es el nombre de un libro dentro de la carpeta de salidas del servicio)
+#   GET  /trabajos             lista de trabajos
+#   GET  /trabajos/<id>        estado y datos
+#   GET  /trabajos/<id>/eventos  progreso en vivo (SSE)
+#   GET  /metricas             tabla de instrumentación acumulada
+async def atender(servicio, reader, writer):
+    try:
+        try:
+            peticion = await leer_peticion(reader)
+        except OverflowError:
+            await responder_json(writer, 413, {"error": "El archivo es demasiado grande."})
+            return
+        if peticion is None:
+            return
+        metodo, ruta, consulta, _, cuerpo = peticion
+        partes = ruta.strip("/").split("/")
+
+        if ruta == "/salud":
+            await responder_json(writer, 200, {"estado": "ok", "trabajos": len(servicio.trabajos)})
+        elif ruta == "/metricas":
+            await responder_json(writer, 200, {"resumen": instrumentacion.resumen(),
+                                               "contadores": instrumentacion.contadores})
+        elif ruta == "/trabajos" and metodo == "POST":
+            parametros = json.loads(cuerpo or b"{}")
+            if not parametros.get("directorio") or not os.path.isdir(parametros["directorio"]):
+                await responder_json(writer, 400, {"error": "Falta 'directorio' o no existe."})
+                return
+            try:
+                parametros["ruta_salida"] = servicio.ruta_de_salida(parametros.get("ruta_salida"))
+            except ValueError as e:
+                await responder_json(writer, 400, {"error": str(e)})
+                return
+            trabajo = await servicio.encolar(parametros)
+            await responder_json(writer, 202, {"id": trabajo.id, "eventos": f"/trabajos/{trabajo.id}/eventos"})
+        elif ruta == "/subir" and metodo == "POST":
+            try:
+                parametros = servicio.guardar_subida(cuerpo, consulta)
+            except ValueError as e:
+                await responder_json(writer, 400, {"error": str(e)})
+                return
+            trabajo = await servicio.encolar(parametros)
+            await responder_json(writer, 202, {"id": trabajo.id, "eventos": f"/trabajos/{trabajo.id}/eventos"})
+        elif ruta == "/trabajos" and metodo == "GET":
+            await responder_json(writer, 200, [
+                {"id": trabajo.id, "estado": trabajo.estado, "procesados": trabajo.procesados, "total": trabajo.total}
+                for trabajo in servicio.trabajos.values()
+            ])
+        elif partes[0] == "trabajos" and len(partes) in (2, 3) and partes[1] in servicio.trabajos:
+            trabajo = servicio.trabajos[partes[1]]
+            if len(partes) == 3 and partes[2] == "eventos":
+                await transmitir_eventos(writer, trabajo)
+            elif len(partes) == 2:
+                await responder_json(writer, 200, trabajo.resumen())
+            else:
+                await responder_json(writer, 404, {"error": "Ruta no encontrada."})
+        else:
+            await responder_json(writer, 404, {"error": "Ruta no encontrada."})
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception as e:
+        logging.error(f"Error al atender la petición: {e}")
+        try:
+            await responder_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+async def ejecutar_servicio(host, puerto, max_workers, trabajos_simultaneos, directorio_cache, directorio_salidas):
+    servicio = ServicioExtraccion(max_workers, trabajos_simultaneos, directorio_cache,
+                                  directorio_salidas=directorio_salidas)
+    await servicio.iniciar()
+    servidor = await asyncio.start_server(lambda r, w: atender(servicio, r, w), host, puerto)
+    logging.info(f"Escuchando en http://{host}:{puerto}")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        await servicio.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio local de extracción de PDFs del SRI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="Procesos del pool (por defecto, uno por CPU)")
+    parser.add_argument("--trabajos-simultaneos", type=int, default=1)
+    parser.add_argument("--cache", default=os.environ.get("CACHE_PDF_DIR", ".cache_pdf"),
+                        help="Carpeta de la caché en disco compartida por los procesos")
+    parser.add_argument("--salidas", default=os.environ.get("SALIDAS_DIR", "./salidas"),
+                        help="Carpeta donde se escriben los libros pedidos con 'ruta_salida'")
+    argumentos = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(ejecutar_servicio(
+            argumentos.host, argumentos.puerto, argumentos.workers, argumentos.trabajos_simultaneos, argumentos.cache,
+            argumentos.salidas,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import pdfplumber
 import xlwings as xw
 import os
 import logging
-import re
+from tokenizador_sri import retenciones_de_texto, totales_de_texto
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -42,18 +42,10 @@ def extraer_codigos_retencion(pdf_path):
 
     with pdfplumber.open(pdf_path) as pdf:
         for pagina in pdf.pages:
-            texto = pagina.extract_text()
-            if "RESUMEN DE RETENCIONES - AGENTE DE RETENCION" in texto:
-                seccion = texto.split("RESUMEN DE RETENCIONES - AGENTE DE RETENCION")[1]
-                lineas = seccion.strip().split("\n")
-
-                for linea in lineas:
-                    match = re.match(r"^(\d{3}[A-Z]?)\s+.*?(\d+(?:,\d{3})*(?:\.\d+)?)\s+(\d+(?:,\d{3})*(?:\.\d+)?)$", linea.strip())
-                    if match:
-                        codigo = match.group(1)
-                        base = float(match.group(2).replace(",", ""))
-                        valor = float(match.group(3).replace(",", ""))
-                        codigos_retencion[codigo] = {"base": base, "valor": valor}
+            texto = pagina.extract_text() or ""
+            # Mismo tokenizador que extractores.py, así todos los scripts leen igual la sección
+            for fila in retenciones_de_texto(texto, "RESUMEN DE RETENCIONES - AGENTE DE RETENCION"):
+                codigos_retencion[fila.codigo] = {"base": fila.base, "valor": fila.valor}
 
     return codigos_retencion
 
@@ -63,21 +55,13 @@ def extraer_totales_compras(pdf_path):
 
     with pdfplumber.open(pdf_path) as pdf:
         for pagina in pdf.pages:
-            texto = pagina.extract_text()
-            if "COMPRAS" in texto:
-                seccion = texto.split("COMPRAS")[1]
-                lineas = seccion.strip().split("\n")
-
-                for linea in lineas:
-                    if "TOTAL:" in linea:
-                        numeros = re.findall(r"(\d{1,3}(?:,\d{3})*(?:\.\d+)|\d+\.\d+)", linea)
-                        if len(numeros) >= 4:
-                            totales = {
-                                "BI tarifa 0%": float(numeros[0].replace(",", "")),
-                                "BI tarifa diferente 0%": float(numeros[1].replace(",", "")),
-                                "BI No Objeto IVA": float(numeros[2].replace(",", ""))
-                            }
-                        break
+            numeros = totales_de_texto(pagina.extract_text() or "", "COMPRAS")
+            if numeros:
+                totales = {
+                    "BI tarifa 0%": numeros[0],
+                    "BI tarifa diferente 0%": numeros[1],
+                    "BI No Objeto IVA": numeros[2]
+                }
     return totales
 
 # Función para convertir el número de mes a la letra de columna correspondiente
@@ -0,0 +1,145 @@
+# Description: Pruebas del extractor de conciliaciones bancarias con un PDF de ejemplo por banco (python -m unittest)
+import os
+import unittest
+
+import pandas as pd
+
+from conciliacion_bancaria import (
+    extraer_movimientos, verificar_saldos, totales_mensuales, consolidar_bancos, solo_mes_del_archivo
+)
+
+directorio_impuestos = os.path.join(os.path.dirname(os.path.abspath(__file__)), "impuestos")
+directorio_conciliacion = os.path.join(directorio_impuestos, "Conciliación")
+
+
+# Función para la ruta de una conciliación de ejemplo: ruta_conciliacion("Pichincha", "Octubre 2024")
+def ruta_conciliacion(banco, mes):
+    return os.path.join(directorio_conciliacion, banco, f"Plasticos-{banco}-Conciliación {mes}.pdf")
+
+
+class PruebaConciliacionPorBanco(unittest.TestCase):
+    # banco, mes, filas (con el saldo inicial), saldo inicial y saldo final del "Total para <cuenta>" del PDF
+    ejemplos = [
+        ("Internacional", "Diciembre 2024", 7, 809.47, 1082.79),
+        ("Pichincha", "Octubre 2024", 10, 470.05, 62.28),
+        ("Produbanco", "Diciembre 2024", 33, 6324.42, 2475.81),
+    ]
+
+    def test_filas_y_saldos(self):
+        for banco, mes, filas, saldo_inicial, saldo_final in self.ejemplos:
+            with self.subTest(banco=banco):
+                movimientos = extraer_movimientos(ruta_conciliacion(banco, mes))
+                self.assertEqual(len(movimientos), filas)
+                self.assertEqual(movimientos["saldo_inicial"].sum(), 1)
+
+                totales = totales_mensuales(movimientos)
+                self.assertEqual(len(totales), 1)
+                self.assertEqual(totales.loc[0, "movimientos"], filas - 1)
+                self.assertAlmostEqual(totales.loc[0, "saldo_inicial"], saldo_inicial, places=2)
+                self.assertAlmostEqual(totales.loc[0, "saldo_final"], saldo_final, places=2)
+
+    def test_totales_sin_saldo_inicial(self):
+        # Totales del pie del PDF menos el saldo inicial, que el Libro Auxiliar suma a los débitos
+        movimientos = extraer_movimientos(ruta_conciliacion("Internacional", "Diciembre 2024"))
+        totales = totales_mensuales(movimientos)
+        self.assertEqual(str(totales.loc[0, "periodo"]), "2024-12")
+        self.assertAlmostEqual(totales.loc[0, "debitos"], 2418.91 - 809.47, places=2)
+        self.assertAlmostEqual(totales.loc[0, "creditos"], 1336.12, places=2)
+        self.assertTrue(verificar_saldos(movimientos)["saldo_ok"].all())
+
+    def test_textos_sin_ruido(self):
+        movimientos = extraer_movimientos(ruta_conciliacion("Pichincha", "Octubre 2024"))
+        inicial = movimientos[movimientos["saldo_inicial"]].iloc[0]
+        self.assertEqual((inicial["tercero"], inicial["descripcion"]), ("", "SALDO INICIAL"))
+        self.assertEqual(movimientos.loc[1, "tercero"], "PLASTICOS Y BROCHAS WILSO")
+        self.assertEqual(movimientos.loc[1, "referencia"], "CE10483")
+
+    def test_meses_con_lectura_dificil(self):
+        # Signos perdidos, saldos truncados e importes pegados a la descripción en el OCR; y Pichincha Septiembre
+        # sin título ni periodo. Saldo inicial, débitos, créditos y saldo final del "Total para <cuenta>" del PDF
+        ejemplos = [
+            ("Internacional", "Mayo 2024", 46.33, 5000.00, 5000.25, 46.08),
+            ("Produbanco", "Mayo 2024", 5750.30, 34947.90, 31552.10, 9146.10),
+            ("Pichincha", "Septiembre 2024", 63.99, 56054.00, 55647.94, 470.05),
+        ]
+        for banco, mes, saldo_inicial, debitos, creditos, saldo_final in ejemplos:
+            with self.subTest(banco=banco, mes=mes):
+                movimientos = extraer_movimientos(ruta_conciliacion(banco, mes))
+                self.assertTrue(verificar_saldos(movimientos)["saldo_ok"].all())
+
+                totales = totales_mensuales(movimientos)
+                self.assertEqual(len(totales), 1)
+                fila = totales.iloc[0]
+                self.assertAlmostEqual(fila["saldo_inicial"], saldo_inicial, places=2)
+                self.assertAlmostEqual(fila["debitos"], debitos, places=2)
+                self.assertAlmostEqual(fila["creditos"], creditos, places=2)
+                self.assertAlmostEqual(fila["saldo_final"], saldo_final, places=2)
+                self.assertAlmostEqual(
+                    fila["saldo_inicial"] + fila["debitos"] - fila["creditos"], fila["saldo_final"], places=2
+                )
+                self.assertTrue(fila["cuadra"])
+
+    def test_libro_de_varios_meses(self):
+        # El Libro Auxiliar de Internacional Septiembre va del 01/08 al 30/09: septiembre queda sin saldo inicial
+        # y no cuadra hasta que el último saldo de agosto pasa a ser su saldo inicial
+        movimientos = extraer_movimientos(ruta_conciliacion("Internacional", "Septiembre 2024"))
+        totales = totales_mensuales(movimientos)
+        septiembre = totales[totales["periodo"].astype(str) == "2024-09"].iloc[0]
+        self.assertTrue(pd.isna(septiembre["saldo_inicial"]))
+        self.assertFalse(septiembre["cuadra"])
+
+        totales = totales_mensuales(solo_mes_del_archivo(movimientos.assign(anio=2024, mes=9)))
+        self.assertEqual(totales["periodo"].astype(str).tolist(), ["2024-09"])
+        self.assertAlmostEqual(totales.loc[0, "saldo_inicial"], 70.41, places=2)
+        self.assertAlmostEqual(totales.loc[0, "saldo_final"], 67.57, places=2)
+        self.assertTrue(totales.loc[0, "cuadra"])
+
+    def test_pacifico_sin_libro_auxiliar(self):
+        # Las conciliaciones del Pacífico no traen Libro Auxiliar: no hay movimientos ni saldos que reportar
+        movimientos = extraer_movimientos(ruta_conciliacion("Pacífico", "Enero 2024"))
+        self.assertTrue(movimientos.empty)
+        self.assertTrue(totales_mensuales(movimientos).empty)
+
+
+class PruebaConsolidarBancos(unittest.TestCase):
+    def test_todos_los_meses_cuadran(self):
+        # Cada mes de cada banco: saldo inicial + débitos - créditos = saldo final, y cada fila con su anterior
+        movimientos = consolidar_bancos(directorio_impuestos)
+        self.assertTrue(verificar_saldos(movimientos)["saldo_ok"].all())
+        totales = totales_mensuales(movimientos)
+        self.assertEqual(sorted(totales["banco"].unique()), ["Internacional", "Pichincha", "Produbanco"])
+        self.assertFalse(totales["saldo_inicial"].isna().any())
+        self.assertTrue(totales["cuadra"].all(), totales[~totales["cuadra"]].to_string())
+
+
+class PruebaVerificarSaldos(unittest.TestCase):
+    def test_orden_por_fecha_desde_el_saldo_inicial(self):
+        # La fila del 05 quedó al final en el PDF; el empate del 10 conserva el orden del PDF
+        movimientos = pd.DataFrame({
+            "archivo": ["a.pdf"] * 5,
+            "fecha": pd.to_datetime(["2024-07-31", "2024-08-10", "2024-08-10", "2024-08-20", "2024-08-05"]),
+            "debito": [100.0, 0.0, 50.0, 0.0, 0.0],
+            "credito": [0.0, 30.0, 0.0, 5.0, 10.0],
+            "saldo": [100.0, 60.0, 110.0, 105.0, 90.0],
+            "saldo_inicial": [True, False, False, False, False],
+        })
+        verificados = verificar_saldos(movimientos)
+        self.assertEqual(verificados["saldo"].tolist(), [100.0, 90.0, 60.0, 110.0, 105.0])
+        self.assertTrue(verificados["saldo_ok"].all())
+
+    def test_mes_sin_saldo_inicial_no_cuadra(self):
+        movimientos = pd.DataFrame({
+            "archivo": ["a.pdf"] * 2,
+            "fecha": pd.to_datetime(["2024-08-05", "2024-08-10"]),
+            "debito": [50.0, 0.0],
+            "credito": [0.0, 30.0],
+            "saldo": [150.0, 120.0],
+            "saldo_inicial": [False, False],
+        })
+        totales = totales_mensuales(movimientos)
+        self.assertTrue(pd.isna(totales.loc[0, "saldo_inicial"]))
+        self.assertFalse(totales.loc[0, "cuadra"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+# Description: Tokenizador compartido de las líneas de tablas del SRI (talón resumen del ATS)
+import re
+from collections import namedtuple
+
+# Una fila de "RESUMEN DE RETENCIONES": código, concepto, número de registros, base imponible y valor retenido
+LineaRetencion = namedtuple("LineaRetencion", ["codigo", "descripcion", "registros", "base", "valor"])
+
+patron_codigo = re.compile(r"\d{3,4}[A-Z]?")
+marca_total = "TOTAL:"
+
+
+# Función para convertir un número del SRI a float según el formato de los separadores
+#   "sri":     1,234.56 (coma de miles, punto decimal); es el formato de los talones
+#   "europeo": 1.234,56 (punto de miles, coma decimal)
+#   "auto":    decide por el último separador (una coma seguida de 1 o 2 dígitos es decimal)
+def convertir_numero(texto, formato="sri"):
+    if formato == "auto":
+        coma, punto = texto.rfind(","), texto.rfind(".")
+        if coma > punto and len(texto) - coma - 1 in (1, 2):
+            formato = "europeo"
+        else:
+            formato = "sri"
+    if formato == "europeo":
+        return float(texto.replace(".", "").replace(",", "."))
+    return float(texto.replace(",", ""))
+
+
+# Función para recortar una sección: desde el encabezado hasta el final de la línea "TOTAL:" (o de la página)
+def texto_de_seccion(texto, encabezado):
+    inicio = texto.find(encabezado)
+    if inicio < 0:
+        return None
+    inicio += len(encabezado)
+    total = texto.find(marca_total, inicio)
+    if total < 0:
+        return texto[inicio:].strip()
+    fin = texto.find("\n", total)
+    return texto[inicio:fin if fin >= 0 else len(texto)].strip()
+
+
+# Función para obtener las líneas de una sección (el resto de la página no se recorre)
+def lineas_de_seccion(texto, encabezado):
+    seccion = texto_de_seccion(texto, encabezado)
+    return seccion.split("\n") if seccion else []
+
+
+# Función para saber si un token es un número del SRI (dígito inicial y solo dígitos, puntos y comas)
+# Acepta enteros: en las filas de retención la base o el valor pueden venir sin decimales
+def es_numero(token):
+    return token[:1].isdecimal() and token.replace(",", "").replace(".", "").isdecimal()
+
+
+# Función para saber si un token es un importe: un número con parte decimal según el formato de los separadores
+# Un entero (p. ej. el número de registros de la línea "TOTAL:") no es un importe
+def es_importe(token, formato="sri"):
+    if not es_numero(token):
+        return False
+    coma, punto = token.rfind(","), token.rfind(".")
+    if max(coma, punto) in (-1, len(token) - 1):
+        return False
+    if formato == "europeo":
+        return coma > punto
+    if formato == "auto":
+        return punto > coma or len(token) - coma - 1 in (1, 2)
+    return punto > coma
+
+
+# Función para separar una línea de retención en sus campos en una sola pasada (None si no es una fila de datos)
+def tokenizar_retencion(linea, formato="sri"):
+    # Descarte rápido de encabezados y conceptos partidos en dos líneas: las filas empiezan con el código
+    if not linea[:1].isdecimal():
+        return None
+    tokens = linea.split()
+    # Código, al menos una palabra de concepto/registros, base y valor
+    if len(tokens) < 4 or not es_numero(tokens[-1]) or not es_numero(tokens[-2]):
+        return None
+    if not patron_codigo.fullmatch(tokens[0]):
+        return None
+
+    medio = tokens[1:-2]
+    registros = None
+    if medio[-1].isdecimal():
+        registros = int(medio.pop())
+    return LineaRetencion(
+        tokens[0], " ".join(medio), registros, convertir_numero(tokens[-2], formato),
+        convertir_numero(tokens[-1], formato)
+    )
+
+
+# Generador de las filas de retención de una página (se detiene en el TOTAL de la sección)
+def retenciones_de_texto(texto, encabezado, formato="sri"):
+    for linea in lineas_de_seccion(texto, encabezado):
+        fila = tokenizar_retencion(linea, formato)
+        if fila is not None:
+            yield fila
+
+
+# Función para leer los números de la línea "TOTAL:" de una sección ([] si no está o tiene menos de `minimo`)
+def totales_de_texto(texto, encabezado, minimo=4, formato="sri"):
+    seccion = texto_de_seccion(texto, encabezado)
+    if not seccion:
+        return []
+    total = seccion.rfind(marca_total)
+    if total < 0:
+        return []
+    # Se leen los importes de la línea que contiene "TOTAL:" (con parte decimal, como el patrón \d+\.\d+ de antes)
+    linea = seccion[seccion.rfind("\n", 0, total) + 1:]
+    numeros = [token for token in linea.split() if es_importe(token, formato)]
+    if len(numeros) < minimo:
+        return []
+    return [convertir_numero(numero, formato) for numero in numeros]